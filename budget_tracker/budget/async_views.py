@@ -0,0 +1,134 @@
+"""
+Async versions of the reporting views, served when running under ASGI.
+
+Django's async ORM still runs every query on the single thread shared by
+``thread_sensitive`` calls, so independent queries would execute one after
+another. ``gather_queries`` instead runs each function in its own worker
+thread, and therefore on its own database connection, and awaits them
+together. Set ``BUDGET_ASYNC_CONCURRENT_QUERIES`` to False to run them
+sequentially on the request's connection, as tests must: rows written
+inside a test transaction are invisible to other connections.
+"""
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .cache import acached_response
+from .models import UserProfile
+from .serializers import FinancialSummarySerializer, UserProfileSerializer
+from .summary import (
+    actual_amounts, budget_amounts, category_totals, compare_budgets,
+    expense_categories, monthly_trend, summarize
+)
+from .views import BudgetComparisonView, FinancialSummaryView, ProfileView
+
+
+def in_own_connection(func):
+    # Worker threads are reused, so treat each call like a request and let
+    # CONN_MAX_AGE decide whether the thread's connection is kept
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return wrapper
+
+
+async def gather_queries(*calls):
+    """Run the zero-argument callables ``calls`` and return their results in order."""
+    if not getattr(settings, 'BUDGET_ASYNC_CONCURRENT_QUERIES', True):
+        return [await sync_to_async(call)() for call in calls]
+    return await asyncio.gather(*(
+        sync_to_async(in_own_connection(call), thread_sensitive=False)() for call in calls
+    ))
+
+
+class AsyncAPIView(APIView):
+    """
+    ``APIView`` whose handlers are coroutines.
+
+    Authentication, permissions and the other ``initial()`` checks are
+    synchronous in DRF, so they run in a worker thread before the handler is
+    awaited.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def options(self, request, *args, **kwargs):
+        return super().options(request, *args, **kwargs)
+
+
+class AsyncFinancialSummaryView(AsyncAPIView, FinancialSummaryView):
+    async def get(self, request):
+        params = self.parse_params(request)
+        if isinstance(params, Response):
+            return params
+        user = request.user
+
+        async def compute():
+            # Category totals feed the income, expense and breakdown figures
+            category_rows, trend = await gather_queries(
+                lambda: category_totals(user, params['start_date'], params['end_date']),
+                lambda: monthly_trend(user, params['today'], params['trend_months'])
+            )
+            return FinancialSummarySerializer(summarize(category_rows, trend)).data
+
+        return Response(await acached_response('summary', user.id, params, compute))
+
+
+class AsyncBudgetComparisonView(AsyncAPIView, BudgetComparisonView):
+    async def get(self, request):
+        params = self.parse_params(request)
+        if isinstance(params, Response):
+            return params
+        user = request.user
+        first_month, last_month = params['from'], params['to']
+
+        async def compute():
+            categories, budgets, actuals = await gather_queries(
+                lambda: expense_categories(user),
+                lambda: budget_amounts(user, first_month, last_month),
+                lambda: actual_amounts(user, first_month, last_month)
+            )
+            return compare_budgets(first_month, last_month, categories, budgets, actuals)
+
+        return Response(await acached_response('budget-comparison', user.id, params, compute))
+
+
+class AsyncProfileView(AsyncAPIView, ProfileView):
+    async def get(self, request):
+        # Profiles live on the user's shard, so the user can't be joined in
+        user_profile, created = await UserProfile.objects.aget_or_create(user=request.user)
+        user_profile.user = request.user
+        serializer = UserProfileSerializer(user_profile)
+        return Response(serializer.data)
+
+    async def put(self, request):
+        return await sync_to_async(self.update_profile)(request)
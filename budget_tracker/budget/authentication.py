@@ -0,0 +1,154 @@
+"""
+Token authentication with a two-tier cache in front of the database.
+
+``TokenAuthentication`` joins ``authtoken_token`` and ``auth_user`` on every
+request. ``CachedTokenAuthentication`` keeps a minimal user record per token
+key in a bounded in-process LRU and, optionally, in the shared Django cache,
+so a warm request authenticates without touching the database.
+
+Records are dropped when their token is deleted or their user is saved, on
+this process's LRU and on the shared tier. Other processes' LRUs only
+notice once the entry expires, so ``BUDGET_TOKEN_CACHE_TIMEOUT`` bounds how
+long a revoked token can keep working there.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import get_cache
+
+TOKEN_KEY = 'budget:token:{digest}'
+
+# Loaded with the token; anything else is fetched lazily on first access and
+# ``save()`` only writes these fields. ``Model.from_db`` expects them in the
+# model's field order.
+USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {'id', 'username', 'email', 'is_active', 'is_staff', 'is_superuser'}
+)
+
+
+def token_cache_timeout():
+    return getattr(settings, 'BUDGET_TOKEN_CACHE_TIMEOUT', 60)
+
+
+def token_cache_max_size():
+    return getattr(settings, 'BUDGET_TOKEN_CACHE_MAX_SIZE', 10000)
+
+
+def token_cache_shared():
+    return getattr(settings, 'BUDGET_TOKEN_CACHE_SHARED', False)
+
+
+def shared_key(key):
+    # Token keys are credentials, keep them out of the shared cache's key space
+    return TOKEN_KEY.format(digest=hashlib.sha256(key.encode()).hexdigest())
+
+
+class LRUCache:
+    """Thread-safe mapping with a maximum size and per-entry expiry."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout, max_size):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+local_tokens = LRUCache()
+
+
+def get_user_record(key):
+    """Return the cached ``USER_FIELDS`` values for token ``key``, or ``None``."""
+    record = local_tokens.get(key)
+    if record is None and token_cache_shared():
+        record = get_cache().get(shared_key(key))
+        if record is not None:
+            local_tokens.set(key, record, token_cache_timeout(), token_cache_max_size())
+    return record
+
+
+def set_user_record(key, record):
+    timeout = token_cache_timeout()
+    local_tokens.set(key, record, timeout, token_cache_max_size())
+    if token_cache_shared():
+        get_cache().set(shared_key(key), record, timeout=timeout)
+
+
+def invalidate_token(key):
+    local_tokens.delete(key)
+    if token_cache_shared():
+        get_cache().delete(shared_key(key))
+
+
+def invalidate_user_tokens(user_id):
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+def user_from_record(record):
+    return User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, record)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for ``TokenAuthentication``; a timeout of 0 turns
+    the cache off.
+    """
+
+    def authenticate_credentials(self, key):
+        if not token_cache_timeout():
+            return super().authenticate_credentials(key)
+
+        record = get_user_record(key)
+        if record is None:
+            try:
+                record = Token.objects.filter(key=key).values_list(
+                    *(f'user__{field}' for field in USER_FIELDS)
+                ).get()
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            set_user_record(key, record)
+
+        user = user_from_record(record)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        token = Token.from_db(DEFAULT_DB_ALIAS, ('key', 'user_id'), (key, user.id))
+        token.user = user
+        return (user, token)
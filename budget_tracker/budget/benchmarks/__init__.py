@@ -0,0 +1,44 @@
+"""
+Benchmarks for the API.
+
+Micro-benchmarks run with ``manage.py run_benchmarks``: each is a function
+returning a list of ``BenchmarkResult``, registered in ``get_benchmarks``
+under the name used on the command line.
+
+``manage.py benchmark_endpoints`` times every endpoint against a seeded
+user (``seed``) and compares the results with stored baselines
+(``endpoints``).
+"""
+from collections import namedtuple
+
+# ``queries`` is None when they happen in another process; ``p99_ms`` is only
+# reported by load tests
+BenchmarkResult = namedtuple(
+    'BenchmarkResult', ['name', 'iterations', 'seconds', 'queries', 'p99_ms'], defaults=(None,)
+)
+
+
+def per_call_us(result):
+    return result.seconds / result.iterations * 1_000_000
+
+
+def per_call_queries(result):
+    return result.queries / result.iterations
+
+
+def get_benchmarks():
+    from .auth import bench_token_auth
+    from .concurrency import bench_sqlite_concurrency
+    from .forecast import bench_forecast
+    from .money import bench_money
+    from .renderers import bench_renderers
+    from .servers import bench_asgi_vs_wsgi
+
+    return {
+        'token-auth': bench_token_auth,
+        'asgi-vs-wsgi': bench_asgi_vs_wsgi,
+        'sqlite-concurrency': bench_sqlite_concurrency,
+        'forecast': bench_forecast,
+        'renderers': bench_renderers,
+        'money': bench_money,
+    }
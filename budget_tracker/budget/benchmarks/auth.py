@@ -0,0 +1,38 @@
+import uuid
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from ..authentication import CachedTokenAuthentication, local_tokens
+from . import BenchmarkResult
+
+
+def time_authentication(name, authenticator, request, iterations):
+    with CaptureQueriesContext(connection) as queries:
+        start = perf_counter()
+        for _ in range(iterations):
+            authenticator.authenticate(request)
+        elapsed = perf_counter() - start
+    return BenchmarkResult(name, iterations, elapsed, len(queries))
+
+
+def bench_token_auth(iterations=2000):
+    """Authenticate the same token repeatedly with and without the token cache."""
+    with transaction.atomic():
+        user = User.objects.create_user(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+        token = Token.objects.create(user=user)
+        request = APIRequestFactory().get('/api/transactions/', HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        local_tokens.clear()
+        results = [
+            time_authentication('TokenAuthentication', TokenAuthentication(), request, iterations),
+            time_authentication('CachedTokenAuthentication', CachedTokenAuthentication(), request, iterations),
+        ]
+        local_tokens.clear()
+        transaction.set_rollback(True)
+    return results
@@ -0,0 +1,143 @@
+"""
+Read/write throughput of SQLite behind several gunicorn worker processes,
+with SQLite's defaults (``plain``) and the production profile from
+settings (WAL, pragmas, ``BEGIN IMMEDIATE``).
+
+Each profile gets a freshly migrated database in a temporary directory,
+seeded through the API. Clients then mix transaction creates with list
+and summary reads; requests failing with a server error, typically
+"database is locked", are counted rather than raised.
+"""
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from time import perf_counter
+
+from django.conf import settings
+
+from . import BenchmarkResult
+from .servers import free_port, percentile, wait_for_port
+
+PROFILES = ('plain', 'production')
+READS = (
+    '/api/transactions/',
+    '/api/summary/?start_date=2025-01-01&end_date=2025-12-31&trend_months=12',
+)
+
+
+def request(connection, method, path, token=None, body=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Token {token}'
+    connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def seed(port, transactions=5000):
+    """Create a user with categories and a year of transactions through the API, return their token."""
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    status, body = request(connection, 'POST', '/api/signup/', body={
+        'username': 'concurrency', 'email': 'concurrency@example.com', 'password': 'benchmark-password'
+    })
+    if status != 201:
+        raise RuntimeError(f"Signup failed with status {status}: {body[:200]}")
+    token = json.loads(body)['token']
+    categories = []
+    for i in range(8):
+        status, body = request(connection, 'POST', '/api/categories/', token, {
+            'name': f'Category {i}', 'type': 'income' if i == 0 else 'expense'
+        })
+        categories.append(json.loads(body)['id'])
+    status, body = request(connection, 'POST', '/api/transactions/bulk/', token, {'create': [
+        {'amount': f'{i % 200 + 1}.00', 'category': categories[i % 8],
+         'date': (date(2025, 1, 1) + timedelta(days=i % 365)).isoformat(), 'description': f'Seed {i}'}
+        for i in range(transactions)
+    ]})
+    if status != 200:
+        raise RuntimeError(f"Seeding failed with status {status}: {body[:200]}")
+    connection.close()
+    return token, categories
+
+
+def load(port, token, categories, iterations, concurrency, write_every):
+    """Return ``{'reads': latencies, 'writes': latencies}``, failures per kind and the wall time."""
+    per_client = max(1, iterations // concurrency)
+
+    def client(index):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        latencies = {'reads': [], 'writes': []}
+        failed = {'reads': 0, 'writes': 0}
+        for i in range(per_client):
+            start = perf_counter()
+            if (index + i) % write_every == 0:
+                status, _ = request(connection, 'POST', '/api/transactions/', token, {
+                    'amount': '9.99', 'category': categories[1 + i % 7], 'date': '2025-06-15',
+                    'description': f'Load {index}-{i}'
+                })
+                kind = 'writes'
+            else:
+                status, _ = request(connection, 'GET', READS[(index + i) % len(READS)], token)
+                kind = 'reads'
+            if status >= 500:
+                failed[kind] += 1
+            elif status >= 400:
+                raise RuntimeError(f"Unexpected status {status}")
+            else:
+                latencies[kind].append(perf_counter() - start)
+        connection.close()
+        return latencies, failed
+
+    start = perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    elapsed = perf_counter() - start
+    return (
+        {kind: [latency for latencies, _ in results for latency in latencies[kind]] for kind in ('reads', 'writes')},
+        {kind: sum(failed[kind] for _, failed in results) for kind in ('reads', 'writes')},
+        elapsed,
+    )
+
+
+def bench_sqlite_concurrency(iterations=2000, workers=4, concurrency=16, write_every=5):
+    """Reads/sec and writes/sec, with p99 latency, for each SQLite profile."""
+    results = []
+    for profile in PROFILES:
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                **os.environ,
+                'SQLITE_PATH': os.path.join(directory, 'db.sqlite3'),
+                'BUDGET_SQLITE_PROFILE': profile,
+                'SECURE_SSL_REDIRECT': 'False',
+                'BUDGET_RESPONSE_CACHE_TIMEOUT': '0',
+            }
+            env.pop('DATABASE_URL', None)
+            subprocess.run(
+                [sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=settings.BASE_DIR, env=env, check=True
+            )
+            port = free_port()
+            process = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', 'budget_tracker.wsgi:application',
+                 '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'critical'],
+                cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                wait_for_port(port, process)
+                token, categories = seed(port)
+                load(port, token, categories, concurrency * 4, concurrency, write_every)
+                latencies, failed, elapsed = load(port, token, categories, iterations, concurrency, write_every)
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+
+        for kind in ('reads', 'writes'):
+            results.append(BenchmarkResult(
+                f'{profile} {kind} ({workers} workers, {failed[kind]} failed)', len(latencies[kind]), elapsed, None,
+                p99_ms=percentile(latencies[kind], 0.99) * 1000 if latencies[kind] else 0
+            ))
+    return results
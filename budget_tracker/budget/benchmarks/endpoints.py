@@ -0,0 +1,220 @@
+"""
+Latency, query count and peak memory of every API endpoint.
+
+``run_endpoint_benchmarks`` calls each endpoint in ``budget/urls.py`` as a
+seeded benchmark user, authenticating with their token as a real client
+would. Writes are rolled back, files go to a temporary ``MEDIA_ROOT`` and
+the response cache is off, so every call does its full work and the
+seeded data never changes.
+
+Results can be stored as baselines (``baselines.json`` next to this
+module, keyed by data size) and compared against them: a slower median
+or any extra query beyond the allowed slack counts as a regression.
+"""
+import json
+import os
+import secrets
+import tempfile
+import tracemalloc
+from collections import namedtuple
+from datetime import date
+from statistics import median
+from time import perf_counter
+
+from dateutil.relativedelta import relativedelta
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ..authentication import local_tokens
+from ..jobs import run_export
+from ..models import Budget, Category, ImportJob, Job, Transaction
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+# ``data`` is the query string for GETs and the JSON body for POSTs; a
+# callable gets the call number so writes can use unique values
+EndpointCall = namedtuple('EndpointCall', ['label', 'url_name', 'method', 'path', 'data'], defaults=(None,))
+
+
+def endpoint_calls(user, password):
+    """The calls to time for ``user``, who signs in with ``password``, covering every named route of the budget app."""
+    category = Category.objects.filter(user=user, type='expense').order_by('id').first()
+    latest = Transaction.objects.filter(user=user).order_by('-date', '-id').first()
+    budget = Budget.objects.filter(user=user).order_by('id').first()
+    job = ImportJob.objects.filter(user=user).first() or ImportJob.objects.create(
+        user=user, format='csv', status='completed'
+    )
+    this_month = date.today().replace(day=1)
+    year_ago = this_month - relativedelta(months=11)
+    export = Job.objects.filter(user=user, kind='export', status='completed').exclude(file='').first()
+    if export is None:
+        export = Job.objects.create(
+            user=user, kind='export', params={'start_date': year_ago.isoformat()}, status='completed', progress=1
+        )
+        export.result = run_export(export, lambda fraction: None)
+        export.save()
+
+    def bulk(i):
+        return {'create': [
+            {'amount': '12.34', 'category': category.id, 'date': latest.date.isoformat(), 'description': f'Bulk {i}-{n}'}
+            for n in range(50)
+        ]}
+
+    return [
+        EndpointCall('api-root', 'api-root', 'get', reverse('api-root')),
+        EndpointCall('category-list', 'category-list', 'get', reverse('category-list')),
+        EndpointCall('category-detail', 'category-detail', 'get', reverse('category-detail', args=[category.id])),
+        EndpointCall('transaction-list', 'transaction-list', 'get', reverse('transaction-list')),
+        EndpointCall('transaction-list last page', 'transaction-list', 'get', reverse('transaction-list'), {'page': 'last'}),
+        EndpointCall('transaction-list cursor', 'transaction-list', 'get', reverse('transaction-list'),
+                     {'pagination': 'cursor', 'page_size': 100}),
+        EndpointCall('transaction-list filtered', 'transaction-list', 'get', reverse('transaction-list'),
+                     {'category': category.id, 'start_date': year_ago.isoformat()}),
+        EndpointCall('transaction-list search', 'transaction-list', 'get', reverse('transaction-list'),
+                     {'search': 'corner mark'}),
+        EndpointCall('transaction-detail', 'transaction-detail', 'get', reverse('transaction-detail', args=[latest.id])),
+        EndpointCall('transaction-create', 'transaction-list', 'post', reverse('transaction-list'), lambda i: {
+            'amount': '9.99', 'category': category.id, 'date': latest.date.isoformat(), 'description': f'Benchmark {i}'
+        }),
+        EndpointCall('transaction-bulk', 'transaction-bulk', 'post', reverse('transaction-bulk'), bulk),
+        EndpointCall('transaction-export', 'transaction-export', 'get', reverse('transaction-export'),
+                     {'start_date': year_ago.isoformat()}),
+        EndpointCall('budget-list', 'budget-list', 'get', reverse('budget-list')),
+        EndpointCall('budget-detail', 'budget-detail', 'get', reverse('budget-detail', args=[budget.id])),
+        EndpointCall('import-list', 'import-list', 'get', reverse('import-list')),
+        EndpointCall('import-detail', 'import-detail', 'get', reverse('import-detail', args=[job.id])),
+        EndpointCall('job-create', 'job-list', 'post', reverse('job-list'), {
+            'kind': 'summary', 'params': {'start_date': year_ago.isoformat(), 'trend_months': 12}
+        }),
+        EndpointCall('job-list', 'job-list', 'get', reverse('job-list')),
+        EndpointCall('job-detail', 'job-detail', 'get', reverse('job-detail', args=[export.id])),
+        EndpointCall('job-download', 'job-download', 'get', reverse('job-download', args=[export.id])),
+        EndpointCall('financial-summary', 'financial-summary', 'get', reverse('financial-summary'),
+                     {'start_date': year_ago.isoformat(), 'end_date': date.today().isoformat(), 'trend_months': 12}),
+        EndpointCall('budget-comparison', 'budget-comparison', 'get', reverse('budget-comparison'),
+                     {'from': year_ago.strftime('%Y-%m'), 'to': this_month.strftime('%Y-%m')}),
+        EndpointCall('cache-stats', 'cache-stats', 'get', reverse('cache-stats')),
+        EndpointCall('signup', 'signup', 'post', reverse('signup'), lambda i: {
+            'username': f'{user.username}-signup-{i}', 'email': f'{user.username}-signup-{i}@example.com',
+            'password': password
+        }),
+        EndpointCall('login', 'login', 'post', reverse('login'), {'email': user.email, 'password': password}),
+        EndpointCall('profile', 'profile', 'get', reverse('profile')),
+        EndpointCall('predict-expenses', 'predict-expenses', 'get', reverse('predict-expenses'), {'months': 6}),
+        EndpointCall('get-records', 'get-records', 'get', reverse('get-records'),
+                     {'group_by': 'month,category', 'aggregates': 'sum,count,avg'}),
+        EndpointCall('series', 'series', 'get', reverse('series'), {
+            'granularity': 'day', 'start_date': (this_month - relativedelta(years=5)).isoformat(), 'by_category': 'true'
+        }),
+    ]
+
+
+def call_endpoint(client, call, number):
+    data = call.data(number) if callable(call.data) else call.data
+    if call.method == 'get':
+        response = client.get(call.path, data, secure=True)
+    else:
+        response = client.post(call.path, data, format='json', secure=True)
+    # Streaming bodies are produced while they are read, so read them
+    if response.streaming:
+        b''.join(response.streaming_content)
+    if response.status_code >= 400:
+        raise RuntimeError(f"{call.label} returned {response.status_code}")
+    return response
+
+
+def measure(client, call, iterations):
+    call_endpoint(client, call, 0)
+
+    with CaptureQueriesContext(connection) as queries:
+        call_endpoint(client, call, 1)
+    # Read now, the next request resets the connection's query log
+    query_count = len(queries)
+
+    timings = []
+    for number in range(2, iterations + 2):
+        start = perf_counter()
+        call_endpoint(client, call, number)
+        timings.append(perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        call_endpoint(client, call, iterations + 2)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'median_ms': round(median(timings) * 1000, 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3),
+        'queries': query_count,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_endpoint_benchmarks(user, iterations=10, labels=None):
+    """Return ``{label: metrics}`` for every endpoint call, or only those in ``labels``."""
+    client = APIClient()
+    results = {}
+    # Files the calls write (the export job's, uploaded statements) would outlive the rollback
+    with tempfile.TemporaryDirectory() as media_root, override_settings(
+        MEDIA_ROOT=media_root, BUDGET_RESPONSE_CACHE_TIMEOUT=0, BUDGET_IMPORT_IN_BACKGROUND=False
+    ), transaction.atomic():
+        # A throwaway password and token, rolled back with everything else;
+        # cache-stats is admin only
+        password = secrets.token_urlsafe(16)
+        user.set_password(password)
+        user.is_staff = True
+        user.save(update_fields=['password', 'is_staff'])
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        try:
+            for call in endpoint_calls(user, password):
+                if labels is None or call.label in labels:
+                    results[call.label] = measure(client, call, iterations)
+        finally:
+            transaction.set_rollback(True)
+            local_tokens.clear()
+    return results
+
+
+def load_baselines(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(size, results, path=BASELINE_PATH):
+    baselines = load_baselines(path)
+    baselines[size] = results
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def find_regressions(results, baseline, latency_threshold=1.5, min_delta_ms=1.0, query_slack=0):
+    """
+    Compare ``results`` to ``baseline`` (both ``{label: metrics}``).
+
+    A call regresses when its median is over ``latency_threshold`` times the
+    baseline and at least ``min_delta_ms`` slower, which keeps timer noise
+    on sub-millisecond calls out, or when it runs more than ``query_slack``
+    extra queries.
+    """
+    regressions = []
+    for label, metrics in results.items():
+        expected = baseline.get(label)
+        if expected is None:
+            continue
+        slower = metrics['median_ms'] - expected['median_ms']
+        if metrics['median_ms'] > expected['median_ms'] * latency_threshold and slower >= min_delta_ms:
+            regressions.append(
+                f"{label}: median {metrics['median_ms']:.2f} ms vs baseline {expected['median_ms']:.2f} ms"
+            )
+        if metrics['queries'] > expected['queries'] + query_slack:
+            regressions.append(f"{label}: {metrics['queries']} queries vs baseline {expected['queries']}")
+    return regressions
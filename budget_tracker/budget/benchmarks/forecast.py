@@ -0,0 +1,20 @@
+from time import perf_counter
+
+import numpy as np
+
+from ..forecasting import fit, forecast_expenses
+from . import BenchmarkResult
+
+
+def bench_forecast(iterations=200, categories=100, months=120):
+    """Fit and project every model for ``categories`` series of ``months`` months."""
+    rng = np.random.default_rng(0)
+    season = 1 + 0.3 * np.sin(np.arange(months) * 2 * np.pi / 12)
+    matrix = rng.gamma(2.0, 150.0, (categories, 1)) * season + rng.normal(0, 20, (categories, months))
+    matrix = np.maximum(matrix, 0)
+
+    start = perf_counter()
+    for _ in range(iterations):
+        forecast_expenses(fit(matrix), horizon=12)
+    elapsed = perf_counter() - start
+    return [BenchmarkResult(f'{categories} categories x {months} months', iterations, elapsed, 0)]
@@ -0,0 +1,77 @@
+"""
+Amounts stored as ``DecimalField`` (the layout before integer cents) against
+``MoneyField`` cents, on an in-memory SQLite table of ``rows`` transactions.
+
+``aggregate`` sums the amounts per category and month and converts the
+sums the way Django does for each field; ``serialize`` reads every amount
+and formats it as the API does. The decimal sums are floating point
+sums on SQLite, so the result names also count the ones that are off.
+"""
+import sqlite3
+from random import Random
+from time import perf_counter
+
+from django.db import models
+from django.db.backends.sqlite3.base import DatabaseOperations
+from django.db.models.expressions import Col
+
+from ..models import MoneyField, from_cents
+from ..serializers import format_money
+from . import BenchmarkResult
+
+AGGREGATE = 'SELECT category, month, SUM(amount) FROM amounts GROUP BY category, month'
+
+
+def layouts():
+    """``(name, column type, cents to stored value, stored value to Decimal)`` for each layout."""
+    # What Django's SQLite backend does for a decimal column
+    column = Col('amounts', models.DecimalField(max_digits=10, decimal_places=2))
+    decimal_converter = DatabaseOperations(None).get_decimalfield_converter(column)
+    money = MoneyField()
+    return [
+        ('decimal', 'decimal', lambda cents: str(from_cents(cents)),
+         lambda value: decimal_converter(value, column, None)),
+        ('cents', 'bigint', int, lambda value: money.from_db_value(value, None, None)),
+    ]
+
+
+def create_table(column_type, store, rows, seed=0):
+    """The table and the exact sums ``AGGREGATE`` should return."""
+    random = Random(seed)
+    database = sqlite3.connect(':memory:')
+    database.execute(
+        f'CREATE TABLE amounts (id integer PRIMARY KEY, category integer, month integer, amount {column_type})'
+    )
+    data = [(i % 40, i % 120, random.randrange(1, 500000)) for i in range(rows)]
+    database.executemany(
+        'INSERT INTO amounts (category, month, amount) VALUES (?, ?, ?)',
+        ((category, month, store(cents)) for category, month, cents in data)
+    )
+    expected = {}
+    for category, month, cents in data:
+        expected[(category, month)] = expected.get((category, month), 0) + cents
+    return database, {key: from_cents(total) for key, total in expected.items()}
+
+
+def bench_money(iterations=5, rows=200000):
+    """Time to aggregate and to serialize ``rows`` amounts in each storage layout."""
+    results = []
+    for name, column_type, store, convert in layouts():
+        database, expected = create_table(column_type, store, rows)
+
+        start = perf_counter()
+        for _ in range(iterations):
+            sums = {(category, month): convert(total) for category, month, total in database.execute(AGGREGATE)}
+        elapsed = perf_counter() - start
+        wrong = sum(1 for key, total in sums.items() if total != expected[key])
+        results.append(BenchmarkResult(
+            f'aggregate {name} ({wrong} of {len(sums)} sums off)', iterations, elapsed, iterations
+        ))
+
+        start = perf_counter()
+        for _ in range(iterations):
+            [format_money(convert(amount)) for (amount,) in database.execute('SELECT amount FROM amounts')]
+        elapsed = perf_counter() - start
+        results.append(BenchmarkResult(f'serialize {name} ({rows} rows)', iterations, elapsed, iterations))
+        database.close()
+    return results
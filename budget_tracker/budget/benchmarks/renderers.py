@@ -0,0 +1,64 @@
+import gzip
+from datetime import date, timedelta
+from decimal import Decimal
+from time import perf_counter
+
+from rest_framework.renderers import JSONRenderer
+
+from ..renderers import MessagePackRenderer
+from . import BenchmarkResult
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def transaction_rows(count):
+    # Shaped like a page of TransactionValuesSerializer output
+    return [
+        {
+            'id': 100000 + i,
+            'amount': f'{(i * 37) % 5000 / 100:.2f}',
+            'category': i % 12,
+            'category_name': f'Category {i % 12}',
+            'category_type': 'income' if i % 12 == 0 else 'expense',
+            'description': f'Card payment {i}',
+            'date': (date(2025, 1, 1) + timedelta(days=i % 365)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def comparison_rows(count):
+    # budget_comparison rows carry Decimals, which JSON turns into floats
+    return [
+        {
+            'category_id': i % 12, 'category_name': f'Category {i % 12}',
+            'budget_amount': Decimal('500.00'), 'actual_amount': Decimal(i % 700) + Decimal('0.25'),
+            'difference': Decimal('500.00') - Decimal(i % 700) - Decimal('0.25'), 'year': 2025, 'month': i % 12 + 1,
+        }
+        for i in range(count)
+    ]
+
+
+def sizes(body):
+    encoded = [f'{len(body) / 1024:.1f}', f'gzip {len(gzip.compress(body, 6)) / 1024:.1f}']
+    if brotli is not None:
+        encoded.append(f'br {len(brotli.compress(body, quality=5)) / 1024:.1f}')
+    return ' / '.join(encoded) + ' KB'
+
+
+def bench_renderers(iterations=200, rows=1000):
+    """Render ``rows`` list rows with each renderer; reports time per render and body sizes."""
+    results = []
+    for payload_name, payload in (('transactions', transaction_rows(rows)), ('comparison', comparison_rows(rows))):
+        for renderer in (JSONRenderer(), MessagePackRenderer()):
+            start = perf_counter()
+            for _ in range(iterations):
+                body = renderer.render(payload)
+            elapsed = perf_counter() - start
+            results.append(BenchmarkResult(
+                f'{payload_name} {renderer.format} ({sizes(body)})', iterations, elapsed, 0
+            ))
+    return results
@@ -0,0 +1,111 @@
+"""
+Synthetic users for the endpoint benchmarks.
+
+``seed_user`` creates ``benchmark-<size>`` with a realistic spread of
+categories, budgets and transactions over several years, and is
+idempotent: an existing user of the right size is reused. The user has an
+unusable password and no token, so it can't be signed in to; the
+endpoint benchmarks give it both inside a transaction they roll back.
+"""
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .. import rollups
+from ..models import Budget, Category, Transaction, UserProfile
+
+SIZES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+SEED_BATCH_SIZE = 5000
+
+INCOME_CATEGORIES = ('Salary', 'Bonus', 'Freelance', 'Interest', 'Dividends', 'Refunds', 'Gifts', 'Rental income')
+EXPENSE_CATEGORIES = (
+    'Rent', 'Groceries', 'Restaurants', 'Coffee', 'Transport', 'Fuel', 'Parking', 'Utilities', 'Internet',
+    'Phone', 'Insurance', 'Health', 'Pharmacy', 'Gym', 'Clothing', 'Electronics', 'Books', 'Streaming',
+    'Games', 'Travel', 'Hotels', 'Flights', 'Gifts given', 'Charity', 'Education', 'Childcare', 'Pets',
+    'Home repair', 'Furniture', 'Garden', 'Taxes', 'Fees',
+)
+MERCHANTS = (
+    'Corner Market', 'City Transit', 'Northwind Energy', 'Blue Bottle', 'Mega Mart', 'Shell', 'Netflix',
+    'Amazon', 'Pharmacy Plus', 'Metro Gym', 'Book Nook', 'Pet World', 'Airline Co', 'Grand Hotel', 'Payroll',
+)
+
+
+def size_to_count(size):
+    """Accept one of ``SIZES`` or a plain number of transactions."""
+    if str(size).lower() in SIZES:
+        return SIZES[str(size).lower()]
+    return int(size)
+
+
+def seed_username(count):
+    return f'benchmark-{count}'
+
+
+def seed_user(size, years=5, end=None, reseed=False):
+    """Return the benchmark user holding ``size`` transactions."""
+    count = size_to_count(size)
+    username = seed_username(count)
+    user = User.objects.filter(username=username).first()
+    if user is not None and not reseed and Transaction.objects.filter(user=user).count() == count:
+        return user
+    if user is not None:
+        user.delete()
+
+    end = end or date.today()
+    start = end - timedelta(days=365 * years)
+    days = (end - start).days
+    rng = random.Random(count)
+
+    with transaction.atomic():
+        user = User.objects.create_user(username=username, email=f'{username}@example.com', password=None)
+        UserProfile.objects.create(user=user)
+        income = Category.objects.bulk_create(
+            Category(user=user, name=name, type='income') for name in INCOME_CATEGORIES
+        )
+        expenses = Category.objects.bulk_create(
+            Category(user=user, name=name, type='expense') for name in EXPENSE_CATEGORIES
+        )
+
+        Budget.objects.bulk_create(
+            (
+                Budget(user=user, category=category, amount=Decimal(rng.randrange(50, 2000)),
+                       month=f'{month:02d}', year=year)
+                for category in expenses
+                for year in range(start.year, end.year + 1)
+                for month in range(1, 13)
+            ),
+            batch_size=SEED_BATCH_SIZE
+        )
+
+        batch = []
+        for i in range(count):
+            # One income row for every nine expenses, expenses mostly small with a long tail
+            if i % 10 == 0:
+                category = rng.choice(income)
+                cents = rng.randrange(50000, 500000)
+            else:
+                category = rng.choice(expenses)
+                cents = min(int(rng.lognormvariate(7.5, 1.1)), 9_999_999)
+            instance = Transaction(
+                user=user,
+                category=category,
+                amount=Decimal(cents) / 100,
+                description=f'{rng.choice(MERCHANTS)} {rng.randrange(10000)}',
+                date=start + timedelta(days=rng.randrange(days + 1)),
+            )
+            instance.refresh_import_hash()
+            batch.append(instance)
+            if len(batch) == SEED_BATCH_SIZE:
+                Transaction.objects.bulk_create(batch)
+                batch = []
+        Transaction.objects.bulk_create(batch)
+        rollups.rebuild(user)
+
+    return user
@@ -0,0 +1,147 @@
+"""
+Load test of the reporting endpoints under uvicorn (ASGI, async views)
+and gunicorn (WSGI, sync views).
+
+Both servers are started against the configured database with a throwaway
+user holding a year of transactions, then hit by ``concurrency`` keep-alive
+clients. The user is deleted afterwards.
+"""
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+
+from .. import rollups
+from ..models import Budget, Category, Transaction
+from . import BenchmarkResult
+
+ENDPOINTS = (
+    '/api/summary/?trend_months=12',
+    '/api/budget-comparison/?from=2025-01&to=2025-12',
+    '/api/profile/',
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not start listening on port {port}")
+
+
+def server_command(kind, port, concurrency):
+    if kind == 'asgi':
+        return [sys.executable, '-m', 'uvicorn', 'budget_tracker.asgi:application',
+                '--port', str(port), '--log-level', 'warning', '--no-access-log']
+    return [sys.executable, '-m', 'gunicorn', 'budget_tracker.wsgi:application', '--bind', f'127.0.0.1:{port}',
+            '--threads', str(concurrency), '--log-level', 'warning']
+
+
+def create_fixtures():
+    user = User.objects.create_user(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+    token = Token.objects.create(user=user)
+    categories = [
+        Category.objects.create(user=user, name=f'Category {i}', type='income' if i == 0 else 'expense')
+        for i in range(8)
+    ]
+    transactions = Transaction.objects.bulk_create(
+        Transaction(user=user, category=categories[i % 8], amount=Decimal(i % 200 + 1),
+                    date=date(2025, 1, 1) + timedelta(days=i % 365))
+        for i in range(5000)
+    )
+    delta = rollups.RollupDelta()
+    for instance in transactions:
+        delta.add(user.id, instance.category_id, instance.date, instance.amount)
+    delta.apply()
+    Budget.objects.bulk_create(
+        Budget(user=user, category=category, amount=Decimal('500.00'), month=f'{month:02d}', year=2025)
+        for category in categories[1:] for month in range(1, 13)
+    )
+    return user, token.key
+
+
+def load(port, token, iterations, concurrency):
+    """Return the latency in seconds of each request and the total wall time."""
+    per_client = max(1, iterations // concurrency)
+
+    def client(index):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        latencies = []
+        for i in range(per_client):
+            start = perf_counter()
+            connection.request('GET', ENDPOINTS[(index + i) % len(ENDPOINTS)], headers={
+                'Authorization': f'Token {token}',
+            })
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError(f"Unexpected status {response.status}")
+            latencies.append(perf_counter() - start)
+        connection.close()
+        return latencies
+
+    start = perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = [latency for result in pool.map(client, range(concurrency)) for latency in result]
+    return latencies, perf_counter() - start
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_asgi_vs_wsgi(iterations=2000, concurrency=16):
+    """Requests/sec and p99 latency of the reporting endpoints on each server."""
+    user, token = create_fixtures()
+    env = {
+        **os.environ,
+        'SECURE_SSL_REDIRECT': 'False',
+        # Every request must reach the view, not the response cache
+        'BUDGET_RESPONSE_CACHE_TIMEOUT': '0',
+    }
+    results = []
+    try:
+        for kind in ('wsgi', 'asgi'):
+            port = free_port()
+            process = subprocess.Popen(
+                server_command(kind, port, concurrency), cwd=settings.BASE_DIR, env=env,
+                stdout=subprocess.DEVNULL
+            )
+            try:
+                wait_for_port(port, process)
+                load(port, token, concurrency * 4, concurrency)
+                latencies, elapsed = load(port, token, iterations, concurrency)
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+            results.append(BenchmarkResult(
+                f'{kind} ({concurrency} clients)', len(latencies), elapsed, None,
+                p99_ms=percentile(latencies, 0.99) * 1000
+            ))
+    finally:
+        user.delete()
+    return results
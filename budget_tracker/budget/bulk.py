@@ -0,0 +1,157 @@
+"""
+Batched create/update/delete of a user's transactions.
+
+Every referenced category and transaction is loaded up front with one query
+each, all items are validated before anything is written, and the writes
+go out as ``bulk_create``/``bulk_update``/a single ``DELETE`` inside one
+database transaction together with the matching rollup changes.
+"""
+from django.db import router, transaction
+from django.utils import timezone
+
+from .models import Category, Transaction
+from .cache import schedule_version_bump
+from .rollups import RollupDelta
+from .serializers import TransactionBulkItemSerializer
+
+MAX_BULK_ITEMS = 5000
+BULK_BATCH_SIZE = 500
+UPDATABLE_FIELDS = ('amount', 'category', 'description', 'date')
+
+
+def as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class BulkTransactionWriter:
+    def __init__(self, user, create=(), update=(), delete=()):
+        self.user = user
+        self.create_items = list(create)
+        self.update_items = list(update)
+        self.delete_ids = list(delete)
+        self.errors = {'create': [], 'update': [], 'delete': []}
+
+    def __len__(self):
+        return len(self.create_items) + len(self.update_items) + len(self.delete_ids)
+
+    def validate(self):
+        """Validate every item, returning ``True`` when nothing was rejected."""
+        category_ids = {as_int(item.get('category')) for item in self.create_items + self.update_items}
+        self.categories = Category.objects.filter(user=self.user, id__in=category_ids - {None}).in_bulk()
+
+        target_ids = [as_int(item.get('id')) for item in self.update_items]
+        self.existing = Transaction.objects.filter(
+            user=self.user, id__in=[pk for pk in target_ids if pk is not None] + self.delete_ids
+        ).in_bulk()
+
+        self.creates = [
+            data for data in (
+                self.validate_item('create', index, item, partial=False)
+                for index, item in enumerate(self.create_items)
+            ) if data is not None
+        ]
+
+        self.updates = []
+        seen = set(self.delete_ids)
+        for index, item in enumerate(self.update_items):
+            data = self.validate_item('update', index, item, partial=True)
+            if data is None:
+                continue
+            if 'id' not in data:
+                self.add_error('update', index, {'id': ['This field is required.']})
+            elif data['id'] not in self.existing:
+                self.add_error('update', index, {'id': ['Transaction not found.']})
+            elif data['id'] in seen:
+                self.add_error('update', index, {'id': ['Transaction appears more than once in this request.']})
+            else:
+                seen.add(data['id'])
+                self.updates.append(data)
+
+        deleted = set()
+        for index, transaction_id in enumerate(self.delete_ids):
+            if transaction_id not in self.existing:
+                self.add_error('delete', index, {'id': ['Transaction not found.']})
+            elif transaction_id in deleted:
+                self.add_error('delete', index, {'id': ['Transaction appears more than once in this request.']})
+            deleted.add(transaction_id)
+
+        return not any(self.errors.values())
+
+    def validate_item(self, action, index, item, partial):
+        serializer = TransactionBulkItemSerializer(data=item, partial=partial)
+        if not serializer.is_valid():
+            self.add_error(action, index, serializer.errors)
+            return None
+        data = serializer.validated_data
+        if 'category' in data:
+            if data['category'] not in self.categories:
+                self.add_error(action, index, {'category': ['Category not found.']})
+                return None
+            data['category'] = self.categories[data['category']]
+        return data
+
+    def add_error(self, action, index, errors):
+        self.errors[action].append({'index': index, 'errors': errors})
+
+    def save(self):
+        """Write the validated items and return the per-item results."""
+        delta = RollupDelta()
+        with transaction.atomic(using=router.db_for_write(Transaction, instance=self.user)):
+            created = [
+                Transaction(
+                    user=self.user,
+                    amount=data['amount'],
+                    category=data['category'],
+                    description=data.get('description', ''),
+                    date=data.get('date') or timezone.now().date()
+                )
+                for data in self.creates
+            ]
+            for instance in created:
+                instance.refresh_import_hash()
+            Transaction.objects.bulk_create(created, batch_size=BULK_BATCH_SIZE)
+            for instance in created:
+                delta.add(instance.user_id, instance.category_id, instance.date, instance.amount)
+
+            updated = []
+            fields = set()
+            for data in self.updates:
+                instance = self.existing[data['id']]
+                delta.remove(instance.user_id, instance.category_id, instance.date, instance.amount)
+                for field in UPDATABLE_FIELDS:
+                    if field in data:
+                        setattr(instance, field, data[field])
+                        fields.add(field)
+                instance.refresh_import_hash()
+                delta.add(instance.user_id, instance.category_id, instance.date, instance.amount)
+                updated.append(instance)
+            if fields:
+                Transaction.objects.bulk_update(updated, sorted(fields | {'import_hash'}), batch_size=BULK_BATCH_SIZE)
+
+            if self.delete_ids:
+                for transaction_id in self.delete_ids:
+                    instance = self.existing[transaction_id]
+                    delta.remove(instance.user_id, instance.category_id, instance.date, instance.amount)
+                Transaction.objects.filter(user=self.user, id__in=self.delete_ids).delete()
+
+            delta.apply()
+            # bulk_create/bulk_update send no signals
+            schedule_version_bump(self.user.id)
+
+        return {
+            'create': [
+                {'index': index, 'id': instance.id, 'status': 'created'}
+                for index, instance in enumerate(created)
+            ],
+            'update': [
+                {'index': index, 'id': instance.id, 'status': 'updated'}
+                for index, instance in enumerate(updated)
+            ],
+            'delete': [
+                {'index': index, 'id': transaction_id, 'status': 'deleted'}
+                for index, transaction_id in enumerate(self.delete_ids)
+            ],
+        }
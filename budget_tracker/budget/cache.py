@@ -0,0 +1,141 @@
+"""
+Per-user versioned response cache.
+
+Each user has a data version kept in Django's cache. Any write to one of
+their categories, transactions or budgets replaces the version once the
+database transaction commits, and cached responses are keyed by
+(endpoint, user, version, parameters). An entry can therefore never be
+served after the data it was computed from has changed: the new version
+simply misses. A version evicted from the cache is recreated with a fresh
+value, which has the same effect.
+
+The version is a ``time.time_ns()`` timestamp, so it also tells when the
+user's data last changed.
+"""
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+VERSION_KEY = 'budget:data-version:{user_id}'
+RESPONSE_KEY = 'budget:response:{name}:{user_id}:{version}:{params}'
+STATS_KEY = 'budget:response-cache:{stat}'
+
+
+def get_cache():
+    return caches[getattr(settings, 'BUDGET_CACHE_ALIAS', 'default')]
+
+
+def response_timeout():
+    return getattr(settings, 'BUDGET_RESPONSE_CACHE_TIMEOUT', 0)
+
+
+def get_data_version(user_id):
+    cache = get_cache()
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_data_version(user_id):
+    get_cache().set(VERSION_KEY.format(user_id=user_id), time.time_ns(), timeout=None)
+
+
+class VersionBump:
+    """``on_commit`` callback replacing one user's data version."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.pending = True
+
+    def __call__(self):
+        self.pending = False
+        bump_data_version(self.user_id)
+
+
+def schedule_version_bump(user_id, using=None):
+    """
+    Bump ``user_id``'s data version once the current transaction commits,
+    or straight away in autocommit mode. Repeated calls within one
+    transaction register a single callback.
+    """
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block:
+        for _, callback, _ in connection.run_on_commit:
+            if isinstance(callback, VersionBump) and callback.pending and callback.user_id == user_id:
+                return
+    transaction.on_commit(VersionBump(user_id), using=using)
+
+
+def record_stat(stat):
+    cache = get_cache()
+    key = STATS_KEY.format(stat=stat)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def cache_stats():
+    cache = get_cache()
+    hits = cache.get(STATS_KEY.format(stat='hits'), 0)
+    misses = cache.get(STATS_KEY.format(stat='misses'), 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+    }
+
+
+def response_key(name, user_id, params):
+    digest = hashlib.sha1(repr(sorted(params.items())).encode()).hexdigest()
+    return RESPONSE_KEY.format(name=name, user_id=user_id, version=get_data_version(user_id), params=digest)
+
+
+def cached_response(name, user_id, params, compute):
+    """
+    Return the cached result of ``compute()`` for this endpoint, user and
+    parameters, computing and storing it on a miss.
+    """
+    timeout = response_timeout()
+    if not timeout:
+        return compute()
+
+    cache = get_cache()
+    key = response_key(name, user_id, params)
+    value = cache.get(key)
+    if value is not None:
+        record_stat('hits')
+        return value
+
+    record_stat('misses')
+    value = compute()
+    cache.set(key, value, timeout=timeout)
+    return value
+
+
+async def acached_response(name, user_id, params, compute):
+    """``cached_response`` for async views; ``compute`` is a coroutine function."""
+    timeout = response_timeout()
+    if not timeout:
+        return await compute()
+
+    cache = get_cache()
+    key = await sync_to_async(response_key)(name, user_id, params)
+    value = await cache.aget(key)
+    if value is not None:
+        await sync_to_async(record_stat)('hits')
+        return value
+
+    await sync_to_async(record_stat)('misses')
+    value = await compute()
+    await cache.aset(key, value, timeout=timeout)
+    return value
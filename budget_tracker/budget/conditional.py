@@ -0,0 +1,117 @@
+"""
+Conditional GET support for the budget API.
+
+ETags and ``Last-Modified`` come from the per-user data version kept by
+``budget.cache``, so they cost one cache lookup instead of running the
+query and hashing the rendered body. A matching ``If-None-Match`` is
+answered with 304 from ``initial()``, before the handler touches the
+database. Views whose defaults depend on the date (the current month,
+today) add their resolved parameters with ``conditional_params``, so
+their validators change at midnight as well. Like the response cache,
+this is only correct when every process shares the data versions, so it
+is off unless ``BUDGET_CONDITIONAL_GET`` is set.
+"""
+import hashlib
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .cache import get_data_version
+
+
+CONTENT_CODINGS = ('gzip', 'br')
+
+
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+
+
+def compute_etag(user_id, version, request, params=None):
+    accepted = getattr(request, 'accepted_media_type', '')
+    resolved = sorted(params.items()) if params is not None else ''
+    digest = hashlib.sha1(
+        f"{user_id}|{version}|{request.get_full_path()}|{accepted}|{resolved}".encode()
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def matching_etag(request, etag):
+    """
+    The entry of the request's ``If-None-Match`` that matches ``etag``, or
+    ``None``. Weak comparison, as RFC 9110 asks for GET.
+    """
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return None
+    etags = parse_etags(header)
+    if '*' in etags:
+        return etag
+    for candidate in etags:
+        if strip_coding(candidate.removeprefix('W/')) == etag:
+            return candidate
+    return None
+
+
+def strip_coding(etag):
+    # CompressionMiddleware tags compressed representations as "<etag>-<coding>"
+    for coding in CONTENT_CODINGS:
+        suffix = f'-{coding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def conditional_get_enabled():
+    return getattr(settings, 'BUDGET_CONDITIONAL_GET', False)
+
+
+class ConditionalGetMixin:
+    """Adds ETag/Last-Modified to GET responses and answers ``If-None-Match`` with 304."""
+    conditional_methods = ('GET', 'HEAD')
+
+    def conditional_params(self, request):
+        """Resolved request parameters the response depends on beyond the URL, or ``None``."""
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = None
+        self.matched_etag = None
+        if conditional_get_enabled() and request.method in self.conditional_methods and request.user.is_authenticated:
+            version = get_data_version(request.user.id)
+            params = self.conditional_params(request)
+            self.etag = compute_etag(request.user.id, version, request, params)
+            modified = version // 1_000_000_000
+            if params is not None:
+                # The defaults moved on at midnight even if the data didn't
+                midnight = datetime.combine(timezone.now().date(), time.min, tzinfo=dt_timezone.utc)
+                modified = max(modified, int(midnight.timestamp()))
+            self.last_modified = http_date(modified)
+            self.matched_etag = matching_etag(request, self.etag)
+            if self.matched_etag is not None:
+                raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'etag', None) and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            # A 304 names the representation the client has, compressed ones included
+            if response.status_code == status.HTTP_304_NOT_MODIFIED and self.matched_etag:
+                response['ETag'] = self.matched_etag
+            else:
+                response['ETag'] = self.etag
+            response['Last-Modified'] = self.last_modified
+            # Responses are per user, make browsers revalidate instead of reusing them blindly
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Authorization', 'Accept'))
+        return response
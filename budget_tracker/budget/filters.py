@@ -0,0 +1,48 @@
+"""
+Transaction list filters, shared by the list and export endpoints and by
+export jobs, which only have the query parameters to go on.
+"""
+from django.db import connections
+
+from .search import search_transactions
+
+
+def filter_transactions(queryset, params, rank_search=True):
+    """
+    Apply the list query parameters to ``queryset`` and order it, newest
+    first or, for a search, best matches first when ``rank_search`` is set.
+    """
+    # Filter by date range if provided
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+
+    # Filter by category if provided
+    category_id = params.get('category')
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+
+    # Filter by amount range if provided
+    min_amount = params.get('min_amount')
+    max_amount = params.get('max_amount')
+    if min_amount:
+        queryset = queryset.filter(amount__gte=min_amount)
+    if max_amount:
+        queryset = queryset.filter(amount__lte=max_amount)
+
+    # Filter by transaction type if provided
+    transaction_type = params.get('transaction_type')
+    if transaction_type:
+        queryset = queryset.filter(category__type=transaction_type)
+
+    # Full-text search over descriptions
+    text = params.get('search')
+    if text is not None:
+        queryset = search_transactions(queryset, text, connections[queryset.db])
+        if rank_search:
+            return queryset.order_by('search_rank', '-date', '-id')
+
+    return queryset.order_by('-date', '-id')
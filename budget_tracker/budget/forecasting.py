@@ -0,0 +1,269 @@
+"""
+Per-category expense forecasts.
+
+Monthly expense totals per category come from the monthly rollups in a
+single query and are laid out as a ``categories x months`` NumPy matrix.
+Every model is then fitted to all rows at once: loops only ever run over
+time steps or smoothing parameters, never over categories.
+
+Models:
+
+- ``exponential_smoothing``: simple exponential smoothing, with the
+  smoothing factor picked per category from a grid by one-step-ahead error.
+- ``seasonal_naive``: next year repeats the last twelve months.
+- ``linear_trend``: least-squares line through the history.
+
+``auto`` picks, per category, the model with the lowest residual error.
+Bands are normal prediction intervals around each forecast, floored at 0.
+"""
+from statistics import NormalDist
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+from .cache import cached_response
+from .models import MonthlyRollup
+from .rollups import month_range_filter
+from .summary import month_starts
+
+MODELS = ('exponential_smoothing', 'seasonal_naive', 'linear_trend')
+METHODS = ('auto',) + MODELS
+SEASON_LENGTH = 12
+SMOOTHING_FACTORS = np.linspace(0.05, 1.0, 20)
+
+DEFAULT_HORIZON = 3
+MAX_HORIZON = 24
+DEFAULT_HISTORY_MONTHS = 36
+MIN_HISTORY_MONTHS = 3
+MAX_HISTORY_MONTHS = 120
+
+
+def expense_history(user, today, history_months=DEFAULT_HISTORY_MONTHS):
+    """
+    Return ``(first_month, category_ids, category_names, matrix)`` for the
+    ``history_months`` whole months before the month of ``today``.
+
+    Months without spending are zero. Leading months in which no category
+    has any spending are dropped, so a new user's history starts with their
+    first transaction.
+    """
+    last_month = today.replace(day=1) - relativedelta(months=1)
+    first_month = last_month - relativedelta(months=history_months - 1)
+
+    rows = list(MonthlyRollup.objects.filter(
+        month_range_filter(first_month, last_month),
+        user=user,
+        category__user=user,
+        category__type='expense'
+    ).order_by('category_id').values_list('category_id', 'category__name', 'year', 'month', 'total'))
+
+    names = dict((row[0], row[1]) for row in rows)
+    category_ids = list(names)
+    matrix = np.zeros((len(category_ids), history_months))
+    if rows:
+        category_index = {category_id: index for index, category_id in enumerate(category_ids)}
+        _, _, years, months, totals = zip(*rows)
+        row_indexes = np.fromiter((category_index[row[0]] for row in rows), dtype=np.intp, count=len(rows))
+        columns = (np.array(years) - first_month.year) * 12 + np.array(months) - first_month.month
+        np.add.at(matrix, (row_indexes, columns), np.array(totals, dtype=float))
+
+        active = np.flatnonzero(matrix.any(axis=0))
+        if active.size:
+            matrix = matrix[:, active[0]:]
+            first_month += relativedelta(months=int(active[0]))
+
+    return first_month, category_ids, [names[category_id] for category_id in category_ids], matrix
+
+
+def fit_exponential_smoothing(matrix):
+    periods = matrix.shape[1]
+    # One level per (smoothing factor, category)
+    level = np.tile(matrix[:, 0], (len(SMOOTHING_FACTORS), 1))
+    squared_error = np.zeros_like(level)
+    factors = SMOOTHING_FACTORS[:, None]
+    for t in range(1, periods):
+        error = matrix[:, t] - level
+        squared_error += error ** 2
+        level += factors * error
+
+    best = squared_error.argmin(axis=0)
+    columns = np.arange(matrix.shape[0])
+    return {
+        'level': level[best, columns],
+        'alpha': SMOOTHING_FACTORS[best],
+        'sigma': np.sqrt(squared_error[best, columns] / max(periods - 1, 1)),
+    }
+
+
+def fit_seasonal_naive(matrix):
+    periods = matrix.shape[1]
+    if periods <= SEASON_LENGTH:
+        # Not a full season to repeat plus one to measure the error against
+        return None
+    residuals = matrix[:, SEASON_LENGTH:] - matrix[:, :-SEASON_LENGTH]
+    return {
+        'last_season': matrix[:, -SEASON_LENGTH:],
+        'sigma': np.sqrt((residuals ** 2).mean(axis=1)),
+    }
+
+
+def fit_linear_trend(matrix):
+    periods = matrix.shape[1]
+    if periods < 3:
+        return None
+    t = np.arange(periods)
+    t_mean = t.mean()
+    t_spread = ((t - t_mean) ** 2).sum()
+    y_mean = matrix.mean(axis=1)
+    slope = (matrix - y_mean[:, None]) @ (t - t_mean) / t_spread
+    intercept = y_mean - slope * t_mean
+    residuals = matrix - (intercept[:, None] + slope[:, None] * t)
+    return {
+        'intercept': intercept,
+        'slope': slope,
+        'sigma': np.sqrt((residuals ** 2).sum(axis=1) / (periods - 2)),
+        'periods': periods,
+        't_mean': t_mean,
+        't_spread': t_spread,
+    }
+
+
+FITTERS = {
+    'exponential_smoothing': fit_exponential_smoothing,
+    'seasonal_naive': fit_seasonal_naive,
+    'linear_trend': fit_linear_trend,
+}
+
+
+def fit(matrix):
+    """Fit every model that the history is long enough for."""
+    fitted = {name: fitter(matrix) for name, fitter in FITTERS.items()}
+    return {name: params for name, params in fitted.items() if params is not None}
+
+
+def project(name, params, horizon):
+    """Return ``(forecast, spread)`` arrays of shape ``categories x horizon``."""
+    steps = np.arange(1, horizon + 1)
+    if name == 'exponential_smoothing':
+        forecast = np.repeat(params['level'][:, None], horizon, axis=1)
+        spread = params['sigma'][:, None] * np.sqrt(1 + (steps - 1) * params['alpha'][:, None] ** 2)
+    elif name == 'seasonal_naive':
+        forecast = params['last_season'][:, (steps - 1) % SEASON_LENGTH]
+        spread = params['sigma'][:, None] * np.sqrt((steps - 1) // SEASON_LENGTH + 1)
+    else:
+        t = params['periods'] - 1 + steps
+        forecast = params['intercept'][:, None] + params['slope'][:, None] * t
+        spread = params['sigma'][:, None] * np.sqrt(
+            1 + 1 / params['periods'] + (t - params['t_mean']) ** 2 / params['t_spread']
+        )
+    return forecast, spread
+
+
+def forecast_expenses(fitted, horizon, method='auto', confidence=0.95):
+    """
+    Return ``(models, forecast, lower, upper)`` for the fitted models: the
+    model used per category and three ``categories x horizon`` arrays.
+    """
+    names = [name for name in MODELS if name in fitted]
+    if method != 'auto':
+        names = [method] if method in fitted else names[:1]
+    projections = [project(name, fitted[name], horizon) for name in names]
+    forecasts = np.stack([forecast for forecast, _ in projections])
+    spreads = np.stack([spread for _, spread in projections])
+
+    # Per category, the model with the smallest residual error
+    best = np.stack([fitted[name]['sigma'] for name in names]).argmin(axis=0)
+    columns = np.arange(forecasts.shape[1])
+    forecast = forecasts[best, columns]
+    spread = spreads[best, columns]
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return (
+        [names[index] for index in best],
+        np.maximum(forecast, 0),
+        np.maximum(forecast - z * spread, 0),
+        np.maximum(forecast + z * spread, 0),
+    )
+
+
+def build_forecast(history, fitted, today, horizon, method='auto', confidence=0.95):
+    """Build the ``/predict-expenses/`` payload from ``expense_history`` output and its fitted models."""
+    first_month, category_ids, category_names, matrix = history
+    months = [month.strftime('%Y-%m') for month in month_starts(today.replace(day=1), horizon)]
+    payload = {
+        'method': method,
+        'confidence': confidence,
+        'history': {
+            'from': first_month.strftime('%Y-%m'),
+            'to': (first_month + relativedelta(months=matrix.shape[1] - 1)).strftime('%Y-%m'),
+            'months': matrix.shape[1],
+        },
+        'months': months,
+        'categories': [],
+        'total': [{'month': month, 'amount': '0.00'} for month in months],
+    }
+    if not category_ids:
+        return payload
+
+    models, forecast, lower, upper = forecast_expenses(fitted, horizon, method, confidence)
+    for index, category_id in enumerate(category_ids):
+        payload['categories'].append({
+            'category_id': category_id,
+            'category_name': category_names[index],
+            'model': models[index],
+            'forecast': [
+                {
+                    'month': month,
+                    'amount': f'{forecast[index, step]:.2f}',
+                    'lower': f'{lower[index, step]:.2f}',
+                    'upper': f'{upper[index, step]:.2f}',
+                }
+                for step, month in enumerate(months)
+            ],
+        })
+    payload['total'] = [
+        {'month': month, 'amount': f'{amount:.2f}'} for month, amount in zip(months, forecast.sum(axis=0))
+    ]
+    return payload
+
+
+def forecast_params(params):
+    """Validate forecast query parameters, raising ``ValueError`` on bad input."""
+    # Forecast horizon and the length of history the models are fitted to
+    limits = {
+        'months': (DEFAULT_HORIZON, 1, MAX_HORIZON),
+        'history_months': (DEFAULT_HISTORY_MONTHS, MIN_HISTORY_MONTHS, MAX_HISTORY_MONTHS),
+    }
+    values = {}
+    for name, (default, low, high) in limits.items():
+        try:
+            values[name] = int(params.get(name, default))
+        except ValueError:
+            values[name] = None
+        if values[name] is None or not low <= values[name] <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+
+    values['method'] = params.get('method', 'auto')
+    if values['method'] not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}")
+
+    try:
+        values['confidence'] = float(params.get('confidence', 0.95))
+    except ValueError:
+        values['confidence'] = 0
+    if not 0 < values['confidence'] < 1:
+        raise ValueError("confidence must be between 0 and 1")
+    return values
+
+
+def expense_forecast(user, today, months, history_months, method='auto', confidence=0.95):
+    """The ``/predict-expenses/`` payload for ``user``."""
+    # Fitted models depend only on the history, so every horizon and band shares them
+    def fit_history():
+        history = expense_history(user, today, history_months)
+        return history, fit(history[3])
+
+    history, fitted = cached_response('forecast-fit', user.id, {
+        'month': today.replace(day=1), 'history_months': history_months
+    }, fit_history)
+    return build_forecast(history, fitted, today, months, method, confidence)
@@ -0,0 +1,285 @@
+"""
+Streaming import of bank statements.
+
+CSV and OFX files are parsed one row at a time and written in fixed-size
+``bulk_create`` chunks, so memory use does not depend on the size of the
+statement. Rows are mapped to the user's categories by ``CategoryMatcher``
+and skipped when a transaction with the same fingerprint (date, amount and
+description) already existed before the import started. Each chunk is
+committed together with the job's counters, so an import that is run
+again after its worker died carries on after the rows it already
+processed.
+"""
+import csv
+import io
+import logging
+import re
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .cache import schedule_version_bump
+from .models import Category, ImportJob, Transaction
+from .rollups import RollupDelta
+from .sharding import use_shard
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_AMOUNT = Decimal('99999999.99')
+
+StatementRow = namedtuple('StatementRow', ['date', 'amount', 'description', 'category'])
+
+CSV_COLUMNS = {
+    'date': ('date', 'transaction date', 'posted', 'posting date'),
+    'amount': ('amount',),
+    'debit': ('debit', 'withdrawal', 'money out'),
+    'credit': ('credit', 'deposit', 'money in'),
+    'description': ('description', 'memo', 'name', 'payee', 'details'),
+    'category': ('category',),
+}
+
+OFX_TOKEN = re.compile(r'<(/?)(\w+)>([^<\r\n]*)')
+
+
+def open_text(stream):
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+
+
+def parse_amount(value):
+    amount = Decimal(value.strip().replace(',', '')).quantize(Decimal('0.01'))
+    if abs(amount) > MAX_AMOUNT:
+        raise ValueError(f"Amount out of range: {value}")
+    return amount
+
+
+def iter_csv_rows(stream, date_format='%Y-%m-%d'):
+    """
+    Yield a ``StatementRow`` per CSV line, or ``None`` for lines that can't be parsed.
+
+    The header names the columns; a signed ``amount`` column or separate
+    ``debit``/``credit`` columns are accepted. Negative amounts are money out.
+    """
+    reader = csv.reader(open_text(stream))
+    header = [name.strip().lower() for name in next(reader, [])]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in header:
+                columns[field] = header.index(alias)
+                break
+    if 'date' not in columns or not ('amount' in columns or 'debit' in columns or 'credit' in columns):
+        raise ValueError("CSV needs a date column and an amount or debit/credit column")
+
+    def cell(values, field):
+        index = columns.get(field)
+        return values[index].strip() if index is not None and index < len(values) else ''
+
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        try:
+            if 'amount' in columns:
+                amount = parse_amount(cell(values, 'amount'))
+            else:
+                amount = parse_amount(cell(values, 'credit') or '0') - parse_amount(cell(values, 'debit') or '0')
+            yield StatementRow(
+                date=datetime.strptime(cell(values, 'date'), date_format).date(),
+                amount=amount,
+                description=cell(values, 'description'),
+                category=cell(values, 'category'),
+            )
+        except (ValueError, InvalidOperation):
+            yield None
+
+
+def iter_ofx_rows(stream):
+    """
+    Yield a ``StatementRow`` per ``<STMTTRN>`` block of an OFX file, or ``None``
+    for blocks that can't be parsed. Handles both SGML (OFX 1.x) and XML files.
+    """
+    fields = None
+    for line in open_text(stream):
+        for closing, tag, value in OFX_TOKEN.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if fields is not None:
+                    yield parse_ofx_transaction(fields)
+                fields = None if closing else {}
+            elif fields is not None and not closing:
+                fields[tag] = value.strip()
+    if fields is not None:
+        yield parse_ofx_transaction(fields)
+
+
+def parse_ofx_transaction(fields):
+    try:
+        return StatementRow(
+            date=datetime.strptime(fields['DTPOSTED'][:8], '%Y%m%d').date(),
+            amount=parse_amount(fields['TRNAMT']),
+            description=fields.get('NAME') or fields.get('MEMO', ''),
+            category='',
+        )
+    except (KeyError, ValueError, InvalidOperation):
+        return None
+
+
+def iter_rows(format, stream, date_format='%Y-%m-%d'):
+    if format == 'ofx':
+        return iter_ofx_rows(stream)
+    return iter_csv_rows(stream, date_format)
+
+
+def validate_rules(rules):
+    """Raise ``ValueError`` unless ``rules`` is a list of well-formed mapping rules."""
+    if not isinstance(rules, list):
+        raise ValueError("Rules must be a list")
+    for rule in rules:
+        if not isinstance(rule, dict) or 'category' not in rule or not ('contains' in rule or 'pattern' in rule):
+            raise ValueError("Each rule needs a category and either 'contains' or 'pattern'")
+        if rule.get('direction') not in (None, 'in', 'out'):
+            raise ValueError("Rule direction must be 'in' or 'out'")
+        if 'pattern' in rule:
+            try:
+                re.compile(rule['pattern'])
+            except re.error as e:
+                raise ValueError(f"Invalid pattern {rule['pattern']!r}: {e}")
+
+
+class CategoryMatcher:
+    """
+    Picks the category for a statement row.
+
+    Rules are tried in order, each ``{"contains": text}`` or ``{"pattern": regex}``
+    matched case-insensitively against the description, optionally limited
+    to money ``"direction": "in"`` or ``"out"``, and naming a category by id or
+    name. Rows no rule matches fall back to the statement's own category
+    column, then to ``default_category``.
+    """
+
+    def __init__(self, user, rules=(), default_category=None):
+        categories = list(Category.objects.filter(user=user))
+        self.by_id = {category.id: category for category in categories}
+        self.by_name = {category.name.lower(): category for category in categories}
+        self.default_category = default_category
+        self.rules = []
+        for rule in rules:
+            category = self.lookup(rule['category'])
+            if category is None:
+                raise ValueError(f"Unknown category in import rule: {rule['category']!r}")
+            pattern = rule['pattern'] if 'pattern' in rule else re.escape(rule['contains'])
+            self.rules.append((re.compile(pattern, re.IGNORECASE), rule.get('direction'), category))
+
+    def lookup(self, value):
+        if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+            return self.by_id.get(int(value))
+        return self.by_name.get(str(value).strip().lower())
+
+    def match(self, row):
+        direction = 'out' if row.amount < 0 else 'in'
+        for pattern, rule_direction, category in self.rules:
+            if rule_direction in (None, direction) and pattern.search(row.description):
+                return category
+        if row.category:
+            category = self.lookup(row.category)
+            if category is not None:
+                return category
+        return self.default_category
+
+
+def run_import(job, stream, chunk_size=IMPORT_CHUNK_SIZE, on_chunk=None):
+    """
+    Import every row of ``stream`` for ``job``, recording progress after
+    each chunk and then calling ``on_chunk()`` if given. Rows an earlier
+    run already processed are skipped.
+    """
+    # Everything happens on the shard holding the job
+    with use_shard(job._state.db):
+        ImportJob.objects.filter(pk=job.pk).update(status='running')
+        try:
+            matcher = CategoryMatcher(job.user, job.rules, job.default_category)
+            # Only rows that existed before this import count as duplicates
+            if job.baseline_id is None:
+                job.baseline_id = Transaction.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+                ImportJob.objects.filter(pk=job.pk).update(baseline_id=job.baseline_id)
+            baseline_id = job.baseline_id
+            rows = islice(iter_rows(job.format, stream, job.date_format), job.rows_processed, None)
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                import_chunk(job, chunk, matcher, baseline_id)
+                if on_chunk is not None:
+                    on_chunk()
+        except Exception as e:
+            logger.exception("Import %s failed", job.pk)
+            ImportJob.objects.filter(pk=job.pk).update(status='failed', error=str(e), finished_at=timezone.now())
+        else:
+            ImportJob.objects.filter(pk=job.pk).update(status='completed', finished_at=timezone.now())
+        job.refresh_from_db()
+    return job
+
+
+def import_chunk(job, chunk, matcher, baseline_id):
+    invalid = unmatched = 0
+    candidates = []
+    for row in chunk:
+        if row is None:
+            invalid += 1
+            continue
+        category = matcher.match(row)
+        if category is None:
+            unmatched += 1
+            continue
+        instance = Transaction(
+            user=job.user,
+            category=category,
+            amount=abs(row.amount),
+            description=row.description[:255],
+            date=row.date
+        )
+        instance.refresh_import_hash()
+        candidates.append(instance)
+
+    existing = set(
+        Transaction.objects.filter(
+            user=job.user,
+            id__lte=baseline_id,
+            import_hash__in={instance.import_hash for instance in candidates}
+        ).values_list('import_hash', flat=True)
+    )
+    new = [instance for instance in candidates if instance.import_hash not in existing]
+
+    delta = RollupDelta()
+    for instance in new:
+        delta.add(instance.user_id, instance.category_id, instance.date, instance.amount)
+    with transaction.atomic(using=job._state.db):
+        Transaction.objects.bulk_create(new)
+        delta.apply()
+        schedule_version_bump(job.user_id, using=job._state.db)
+        ImportJob.objects.filter(pk=job.pk).update(
+            rows_processed=F('rows_processed') + len(chunk),
+            rows_imported=F('rows_imported') + len(new),
+            rows_duplicate=F('rows_duplicate') + len(candidates) - len(new),
+            rows_unmatched=F('rows_unmatched') + unmatched,
+            rows_invalid=F('rows_invalid') + invalid,
+        )
+
+
+def run_uploaded_import(job_id, using=DEFAULT_DB_ALIAS, progress=None):
+    """Import the statement uploaded for a job, reporting the share of the file read to ``progress``."""
+    job = ImportJob.objects.using(using).select_related('default_category').get(pk=job_id)
+    with job.file.open('rb') as uploaded:
+        def on_chunk():
+            # The text wrapper closes the file once it has read it all
+            if progress is not None and uploaded.size and not uploaded.file.closed:
+                progress(uploaded.file.tell() / uploaded.size)
+
+        run_import(job, uploaded.file, on_chunk=on_chunk)
@@ -0,0 +1,375 @@
+"""
+Background jobs stored in the database.
+
+Slow work (multi-year summaries, forecasts, exports and statement imports)
+is queued as a ``Job`` row and run by ``manage.py runworker``, a pool of
+worker processes polling the table, so no broker is needed and web
+workers only ever insert a row. Clients submit jobs to ``/api/jobs/`` and
+poll them for their status, progress and result.
+
+A worker claims the oldest due job inside a transaction (skipping rows
+other workers have locked, where the database supports it) and holds it
+for ``BUDGET_JOB_LEASE`` seconds, renewed by a heartbeat thread every
+third of the lease for as long as the job runs. A job whose lease runs
+out, because its worker died, is handed to another worker. Failures are retried with exponential backoff until
+``max_attempts`` is reached. Each user has at most
+``BUDGET_JOB_USER_CONCURRENCY`` jobs running at once and
+``BUDGET_JOB_USER_QUEUE_LIMIT`` waiting or running.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, close_old_connections, connections, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cache import cached_response
+from .exporters import EXPORT_FORMATS, blocks, csv_lines, export_rows, ndjson_lines
+from .filters import filter_transactions
+from .forecasting import expense_forecast, forecast_params
+from .importers import run_uploaded_import
+from .models import Job, Transaction
+from .serializers import FinancialSummarySerializer
+from .series import build_series, series_params
+from .sharding import shard_for_user, use_shard
+from .summary import budget_comparison, build_financial_summary, comparison_params, summary_params
+
+logger = logging.getLogger(__name__)
+
+UNFINISHED = ('pending', 'running')
+CLAIM_BATCH = 10
+EXPORT_PROGRESS_ROWS = 10000
+
+# ``validate(params, today)`` raises ``ValueError``; ``run(job, progress)`` returns the result.
+# Only ``public`` kinds can be submitted through the API.
+JobKind = namedtuple('JobKind', ['validate', 'run', 'public'])
+
+
+class QueueFull(Exception):
+    pass
+
+
+def lease_seconds():
+    return getattr(settings, 'BUDGET_JOB_LEASE', 300)
+
+
+def user_concurrency():
+    return getattr(settings, 'BUDGET_JOB_USER_CONCURRENCY', 2)
+
+
+def user_queue_limit():
+    return getattr(settings, 'BUDGET_JOB_USER_QUEUE_LIMIT', 20)
+
+
+def retry_delay(attempts):
+    """Seconds before retrying a job that has failed ``attempts`` times."""
+    return getattr(settings, 'BUDGET_JOB_RETRY_DELAY', 30) * 2 ** (attempts - 1)
+
+
+def run_summary(job, progress):
+    params = summary_params(job.params, timezone.now().date())
+    return cached_response('summary', job.user_id, params, lambda: FinancialSummarySerializer(
+        build_financial_summary(
+            job.user, params['start_date'], params['end_date'], params['today'], params['trend_months']
+        )
+    ).data)
+
+
+def run_budget_comparison(job, progress):
+    params = comparison_params(job.params, timezone.now().date())
+    return cached_response(
+        'budget-comparison', job.user_id, params, lambda: budget_comparison(job.user, params['from'], params['to'])
+    )
+
+
+def run_series(job, progress):
+    params = series_params(job.params, timezone.now().date())
+    return cached_response('series', job.user_id, params, lambda: build_series(job.user, **params))
+
+
+def run_forecast(job, progress):
+    return expense_forecast(job.user, timezone.now().date(), **forecast_params(job.params))
+
+
+def validate_export(params, today):
+    export_format = params.get('export_format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"export_format must be one of {', '.join(EXPORT_FORMATS)}")
+
+
+def run_export(job, progress):
+    """Write the filtered transactions to the job's file."""
+    export_format = job.params.get('export_format', 'csv')
+    queryset = filter_transactions(
+        Transaction.objects.filter(user=job.user).select_related('category'), job.params
+    )
+    total = queryset.count()
+
+    def counted(rows):
+        for count, row in enumerate(rows, 1):
+            if count % EXPORT_PROGRESS_ROWS == 0:
+                progress(count / total)
+            yield row
+
+    lines = ndjson_lines if export_format == 'ndjson' else csv_lines
+    with tempfile.TemporaryFile() as output:
+        for block in blocks(lines(counted(export_rows(queryset)))):
+            output.write(block)
+        output.seek(0)
+        job.file.save(f'transactions-{job.pk}.{export_format}', File(output), save=False)
+    return {'rows': total, 'export_format': export_format}
+
+
+def run_statement_import(job, progress):
+    # The user may have moved since the job was queued; the import job keeps its id
+    run_uploaded_import(job.params['import_job'], shard_for_user(job.user_id), progress=progress)
+    return {'import_job': job.params['import_job']}
+
+
+def no_params(params, today):
+    pass
+
+
+KINDS = {
+    'summary': JobKind(summary_params, run_summary, True),
+    'budget-comparison': JobKind(comparison_params, run_budget_comparison, True),
+    'series': JobKind(series_params, run_series, True),
+    'forecast': JobKind(lambda params, today: forecast_params(params), run_forecast, True),
+    'export': JobKind(validate_export, run_export, True),
+    'import': JobKind(no_params, run_statement_import, False),
+}
+
+
+def enqueue(user_id, kind, params=None):
+    return Job.objects.create(user_id=user_id, kind=kind, params=params or {})
+
+
+def submit(user, kind, params):
+    """
+    Validate and queue a job for ``user``. Raises ``ValueError`` for bad
+    input and ``QueueFull`` when the user has too many unfinished jobs.
+    """
+    job_kind = KINDS.get(kind)
+    if job_kind is None or not job_kind.public:
+        raise ValueError(f"kind must be one of {', '.join(name for name, k in KINDS.items() if k.public)}")
+    if not isinstance(params, dict):
+        raise ValueError("params must be an object")
+    # Values arrive the way the matching endpoint's query string would have them
+    params = {name: str(value) for name, value in params.items()}
+    job_kind.validate(params, timezone.now().date())
+    if Job.objects.filter(user=user, status__in=UNFINISHED).count() >= user_queue_limit():
+        raise QueueFull(f"At most {user_queue_limit()} jobs can be waiting or running at once")
+    return enqueue(user.id, kind, params)
+
+
+def start_import(import_job):
+    """Queue an uploaded statement for the workers, or import it now when background imports are off."""
+    if not getattr(settings, 'BUDGET_IMPORT_IN_BACKGROUND', True):
+        run_uploaded_import(import_job.pk, import_job._state.db)
+        return
+    enqueue(import_job.user_id, 'import', {'import_job': import_job.pk})
+
+
+def claim(worker):
+    """Take the next due job for ``worker``, or return ``None``."""
+    now = timezone.now()
+    limit = user_concurrency()
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        busy = list(
+            Job.objects.filter(status='running', lease_expires__gt=now).values('user_id')
+            .annotate(running=Count('id')).filter(running__gte=limit).values_list('user_id', flat=True)
+        )
+        candidates = Job.objects.select_for_update(skip_locked=True).filter(
+            Q(status='pending', run_after__lte=now) | Q(status='running', lease_expires__lte=now)
+        ).exclude(user_id__in=busy).order_by('run_after', 'id')[:CLAIM_BATCH]
+        for job in candidates:
+            # Locking the user serializes claims of their jobs, so two workers
+            # can't both take the last free slot
+            list(User.objects.select_for_update().filter(pk=job.user_id).values_list('pk'))
+            if Job.objects.filter(user_id=job.user_id, status='running', lease_expires__gt=now).count() >= limit:
+                continue
+            if job.attempts >= job.max_attempts:
+                # Its last worker died
+                job.status = 'failed'
+                job.error = job.error or 'The worker running this job stopped responding'
+                job.finished_at = now
+                job.save(update_fields=['status', 'error', 'finished_at'])
+                continue
+            job.status = 'running'
+            job.attempts += 1
+            job.worker = worker
+            job.started_at = now
+            job.lease_expires = now + timedelta(seconds=lease_seconds())
+            job.save(update_fields=['status', 'attempts', 'worker', 'started_at', 'lease_expires'])
+            return job
+    return None
+
+
+def update_claimed(job, **fields):
+    """Update ``job`` unless its lease ran out and another worker took it over."""
+    return Job.objects.filter(pk=job.pk, status='running', worker=job.worker, attempts=job.attempts).update(**fields)
+
+
+class Progress:
+    """Reports a running job's progress, at most once a second."""
+
+    def __init__(self, job):
+        self.job = job
+        self.reported = 0
+
+    def __call__(self, fraction):
+        now = time.monotonic()
+        if now - self.reported < 1:
+            return
+        self.reported = now
+        update_claimed(self.job, progress=min(max(fraction, 0), 1))
+
+
+@contextmanager
+def lease_heartbeat(job):
+    """Renew ``job``'s lease from a thread while the block runs, however long it takes."""
+    stop = threading.Event()
+
+    def renew():
+        try:
+            while not stop.wait(lease_seconds() / 3):
+                try:
+                    if not update_claimed(job, lease_expires=timezone.now() + timedelta(seconds=lease_seconds())):
+                        # Another worker took the job over
+                        break
+                except DatabaseError:
+                    # Typically a locked SQLite database, the next beat tries again
+                    logger.exception("Could not renew the lease of job %s", job.pk)
+        finally:
+            # The thread's own connections
+            connections.close_all()
+
+    heartbeat = threading.Thread(target=renew, name=f'job-{job.pk}-heartbeat', daemon=True)
+    heartbeat.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        heartbeat.join()
+
+
+def execute(job):
+    """Run a claimed job and record its outcome."""
+    job_kind = KINDS.get(job.kind)
+    if job_kind is None:
+        update_claimed(job, status='failed', error=f"Unknown job kind '{job.kind}'", finished_at=timezone.now())
+        return
+    try:
+        with lease_heartbeat(job), use_shard(shard_for_user(job.user_id)):
+            result = job_kind.run(job, Progress(job))
+    except Exception as e:
+        logger.exception("Job %s failed on attempt %s", job.pk, job.attempts)
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            update_claimed(
+                job, status='pending', error=str(e), lease_expires=None, worker='',
+                run_after=now + timedelta(seconds=retry_delay(job.attempts))
+            )
+        else:
+            update_claimed(job, status='failed', error=str(e), lease_expires=None, finished_at=now)
+        return
+    # Stored the way the matching endpoint would have rendered it
+    result = json.loads(json.dumps(result, cls=JSONEncoder))
+    update_claimed(
+        job, status='completed', progress=1, result=result, file=job.file.name or '', error='',
+        lease_expires=None, finished_at=timezone.now()
+    )
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def work(stop, burst=False, poll_interval=1.0):
+    """
+    Run jobs until ``stop`` is set or, with ``burst``, until none is due.
+    Returns the number of jobs run.
+    """
+    worker = worker_name()
+    count = 0
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            job = claim(worker)
+        except DatabaseError:
+            # Typically a locked SQLite database, try again on the next poll
+            logger.exception("Could not claim a job")
+            job = None
+        if job is None:
+            if burst:
+                break
+            stop.wait(poll_interval)
+            continue
+        execute(job)
+        count += 1
+    close_old_connections()
+    return count
+
+
+def stop_on_signals(stop):
+    """Set ``stop`` on SIGINT and SIGTERM, returning the handlers it replaced."""
+    return {signum: signal.signal(signum, lambda *args: stop.set()) for signum in (signal.SIGINT, signal.SIGTERM)}
+
+
+def worker_process(stop, burst, poll_interval):
+    stop_on_signals(stop)
+    work(stop, burst, poll_interval)
+
+
+def run_pool(processes, burst=False, poll_interval=1.0):
+    """
+    Run ``work`` in ``processes`` forked worker processes, replacing any that
+    die, until SIGINT or SIGTERM asks them to finish their current job.
+    """
+    context = multiprocessing.get_context('fork')
+    stop = context.Event()
+    # Children must open their own connections
+    connections.close_all()
+
+    def start():
+        process = context.Process(target=worker_process, args=(stop, burst, poll_interval), daemon=False)
+        process.start()
+        return process
+
+    pool = [start() for _ in range(processes)]
+    stop_on_signals(stop)
+    while pool:
+        for index, process in enumerate(pool):
+            process.join(timeout=poll_interval / len(pool))
+            if process.is_alive():
+                continue
+            if stop.is_set() or (burst and process.exitcode == 0):
+                pool[index] = None
+            else:
+                logger.warning("Worker %s exited with %s, restarting it", process.pid, process.exitcode)
+                pool[index] = start()
+        pool = [process for process in pool if process is not None]
+
+
+def run_in_process(burst=False, poll_interval=1.0):
+    stop = threading.Event()
+    previous = stop_on_signals(stop)
+    try:
+        return work(stop, burst, poll_interval)
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from budget.benchmarks.endpoints import (
+    BASELINE_PATH, find_regressions, load_baselines, run_endpoint_benchmarks, save_baselines
+)
+from budget.benchmarks.seed import SIZES, seed_user, size_to_count
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every API endpoint for a seeded user of the given size, report latency, queries and "
+        "peak memory, and fail when latency or query counts regress past the stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', default='10k',
+            help=f"Transactions in the seeded user: {', '.join(SIZES)} or a number (default: 10k)."
+        )
+        parser.add_argument('--iterations', type=int, default=10, help="Timed calls per endpoint.")
+        parser.add_argument('--only', nargs='*', help="Only run these endpoint labels.")
+        parser.add_argument('--reseed', action='store_true', help="Recreate the benchmark user.")
+        parser.add_argument(
+            '--allow-write', action='store_true',
+            help="Seed the benchmark user into the configured database even though DEBUG is off."
+        )
+        parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON file.")
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help="Store the results as the baseline for this size instead of comparing."
+        )
+        parser.add_argument(
+            '--latency-threshold', type=float, default=1.5,
+            help="Fail when a median is more than this many times the baseline (default: 1.5)."
+        )
+        parser.add_argument(
+            '--min-delta-ms', type=float, default=1.0,
+            help="Ignore latency regressions smaller than this many milliseconds (default: 1)."
+        )
+        parser.add_argument('--query-slack', type=int, default=0, help="Extra queries allowed per call.")
+
+    def handle(self, *args, **options):
+        try:
+            count = size_to_count(options['size'])
+        except ValueError:
+            raise CommandError(f"Unknown size '{options['size']}'")
+        size = str(count)
+        if not settings.DEBUG and not options['allow_write']:
+            raise CommandError(
+                "This seeds a benchmark user into the configured database; point it at a scratch database "
+                "and pass --allow-write, or set DEBUG"
+            )
+
+        self.stdout.write(f"Seeding {count} transactions...")
+        user = seed_user(count, reseed=options['reseed'])
+        results = run_endpoint_benchmarks(user, options['iterations'], options['only'])
+
+        baseline = load_baselines(options['baseline']).get(size, {})
+        self.stdout.write(f"{'endpoint':<30} {'median ms':>10} {'p95 ms':>10} {'queries':>8} {'peak KB':>10} {'baseline ms':>12}")
+        for label, metrics in results.items():
+            expected = baseline.get(label, {}).get('median_ms')
+            self.stdout.write(
+                f"{label:<30} {metrics['median_ms']:>10.2f} {metrics['p95_ms']:>10.2f} {metrics['queries']:>8} "
+                f"{metrics['peak_kb']:>10.1f} {expected if expected is not None else '-':>12}"
+            )
+
+        if options['save_baseline']:
+            save_baselines(size, results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline for {size} transactions"))
+            return
+
+        regressions = find_regressions(
+            results, baseline, options['latency_threshold'], options['min_delta_ms'], options['query_slack']
+        )
+        for regression in regressions:
+            self.stderr.write(regression)
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s) against the baseline")
+        if baseline:
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+        else:
+            self.stdout.write(f"No baseline for {size} transactions; run with --save-baseline to create one")
@@ -0,0 +1,70 @@
+import json
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from budget.importers import IMPORT_CHUNK_SIZE, CategoryMatcher, run_import, validate_rules
+from budget.models import ImportJob
+from budget.sharding import shard_for_user, use_shard
+
+
+class Command(BaseCommand):
+    help = "Import a CSV or OFX bank statement for a user, streaming it in fixed-size chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ofx'], help="Defaults to the file extension.")
+        parser.add_argument('--rules', help="JSON file with category mapping rules.")
+        parser.add_argument('--default-category', help="Name of the category for rows no rule matches.")
+        parser.add_argument('--date-format', default='%Y-%m-%d', help="strptime format of CSV dates.")
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist")
+
+        with use_shard(shard_for_user(user.id)):
+            self.import_statement(user, options)
+
+    def import_statement(self, user, options):
+        path = options['path']
+        format = options['format'] or ('ofx' if path.lower().endswith(('.ofx', '.qfx')) else 'csv')
+
+        rules = []
+        if options['rules']:
+            with open(options['rules']) as rules_file:
+                rules = json.load(rules_file)
+        try:
+            validate_rules(rules)
+            matcher = CategoryMatcher(user, rules)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        default_category = None
+        if options['default_category']:
+            default_category = matcher.lookup(options['default_category'])
+            if default_category is None:
+                raise CommandError(f"Category '{options['default_category']}' does not exist")
+
+        job = ImportJob.objects.create(
+            user=user,
+            source_name=os.path.basename(path),
+            format=format,
+            rules=rules,
+            default_category=default_category,
+            date_format=options['date_format']
+        )
+        with open(path, 'rb') as statement:
+            job = run_import(job, statement, chunk_size=options['chunk_size'])
+
+        summary = (
+            f"{job.rows_processed} rows: {job.rows_imported} imported, {job.rows_duplicate} duplicate, "
+            f"{job.rows_unmatched} unmatched, {job.rows_invalid} invalid"
+        )
+        if job.status == 'failed':
+            raise CommandError(f"Import {job.pk} failed after {summary}: {job.error}")
+        self.stdout.write(self.style.SUCCESS(f"Import {job.pk} completed. {summary}"))
@@ -0,0 +1,47 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from budget import rollups
+from budget.sharding import shard_aliases, shard_for_user, use_shard
+
+
+class Command(BaseCommand):
+    help = "Rebuild the monthly transaction rollups from scratch, or verify them against the raw transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only process the user with this username.")
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Report rollups that disagree with the transactions instead of rebuilding them."
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+
+        # Each shard holds the rollups of its own users
+        aliases = [shard_for_user(user.id)] if user else shard_aliases()
+        if options['verify']:
+            mismatches = []
+            for alias in aliases:
+                with use_shard(alias):
+                    mismatches += rollups.verify(user)
+            for (user_id, category_id, year, month), stored, expected in mismatches:
+                self.stdout.write(
+                    f"user={user_id} category={category_id} {year}-{month:02d}: "
+                    f"stored={stored} expected={expected}"
+                )
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} rollup(s) out of date")
+            self.stdout.write(self.style.SUCCESS("All rollups match the transactions"))
+            return
+
+        count = 0
+        for alias in aliases:
+            with use_shard(alias):
+                count += rollups.rebuild(user)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} rollup(s)"))
@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from budget.sharding import move_user, plan_rebalance, shard_aliases, shard_for_user, shard_loads
+
+
+class Command(BaseCommand):
+    help = (
+        "Move a user's data to another shard, or move users until the shards hold similar numbers of "
+        "transactions. Users keep reading while they move; their writes are refused until it is done. "
+        "Each move waits twice for --wait seconds, so a rebalance is long-running: run it in the background."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Username of the user to move.")
+        parser.add_argument('--to', help="Alias of the shard to move the user to.")
+        parser.add_argument('--rebalance', action='store_true', help="Even out the shards.")
+        parser.add_argument('--dry-run', action='store_true', help="Only print the moves a rebalance would make.")
+        parser.add_argument(
+            '--wait', type=float,
+            help="Seconds to let other processes notice each step, BUDGET_SHARD_CACHE_TIMEOUT by default."
+        )
+
+    def handle(self, *args, **options):
+        if options['rebalance'] == bool(options['user']):
+            raise CommandError("Pass either --user with --to, or --rebalance")
+
+        if options['user']:
+            if options['to'] not in shard_aliases():
+                raise CommandError(f"--to must be one of {', '.join(shard_aliases())}")
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+            moves = [(user.id, shard_for_user(user.id), options['to'])]
+        else:
+            moves = plan_rebalance(shard_loads())
+            if not moves:
+                self.stdout.write(self.style.SUCCESS("The shards are balanced"))
+                return
+
+        for user_id, source, target in moves:
+            if options['dry_run']:
+                self.stdout.write(f"user={user_id} {source} -> {target}")
+                continue
+            counts = move_user(user_id, target, wait=options['wait'])
+            copied = ', '.join(f"{count} {name}" for name, count in counts.items()) or 'nothing to move'
+            self.stdout.write(self.style.SUCCESS(f"Moved user={user_id} to {target}: {copied}"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from budget.benchmarks import get_benchmarks, per_call_queries, per_call_us
+
+
+class Command(BaseCommand):
+    help = "Run the API micro-benchmarks and report time and queries per call."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Benchmarks to run (default: all).")
+        parser.add_argument('--iterations', type=int, help="Calls per measurement.")
+
+    def handle(self, *args, **options):
+        benchmarks = get_benchmarks()
+        names = options['names'] or list(benchmarks)
+        unknown = set(names) - set(benchmarks)
+        if unknown:
+            raise CommandError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}. Choose from {', '.join(benchmarks)}")
+
+        kwargs = {'iterations': options['iterations']} if options['iterations'] else {}
+        for name in names:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for result in benchmarks[name](**kwargs):
+                if result.p99_ms is not None:
+                    line = f"  {result.name:<52} {result.iterations / result.seconds:>10.1f} req/s p99 {result.p99_ms:.1f} ms"
+                else:
+                    line = f"  {result.name:<52} {per_call_us(result):>10.1f} us/call"
+                if result.queries is not None:
+                    line += f" {per_call_queries(result):>6.2f} queries/call"
+                self.stdout.write(line)
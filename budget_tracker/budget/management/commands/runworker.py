@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from budget.cache import get_cache, response_timeout
+from budget.conditional import conditional_get_enabled
+from budget.jobs import run_in_process, run_pool
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs in a pool of worker processes until stopped with SIGINT or SIGTERM."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help="Worker processes, BUDGET_JOB_WORKERS by default. 1 runs jobs in this process."
+        )
+        parser.add_argument('--burst', action='store_true', help="Exit once no job is due.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls when idle.")
+
+    def handle(self, *args, **options):
+        processes = options['processes'] or getattr(settings, 'BUDGET_JOB_WORKERS', 2)
+        if processes < 1:
+            raise CommandError("--processes must be at least 1")
+        # Imports bump data versions in the worker's cache, which the web processes never read
+        if isinstance(get_cache(), LocMemCache) and (response_timeout() or conditional_get_enabled()):
+            raise CommandError(
+                "Workers can't invalidate cached responses or ETags held in a per-process cache: set REDIS_URL, "
+                "or turn off BUDGET_RESPONSE_CACHE_TIMEOUT and BUDGET_CONDITIONAL_GET"
+            )
+        if processes == 1:
+            count = run_in_process(options['burst'], options['poll_interval'])
+            self.stdout.write(self.style.SUCCESS(f"Ran {count} job(s)"))
+        else:
+            run_pool(processes, options['burst'], options['poll_interval'])
@@ -0,0 +1,248 @@
+"""
+Request metrics in the Prometheus text format.
+
+``MetricsMiddleware`` (in ``budget.middleware``) records, per route, the
+request latency, the number and total time of database queries, the
+response size and the status code. ``metrics_view`` serves them at
+``/metrics/``.
+
+Queries are timed by an execute wrapper installed on every database
+connection when it opens; it reports to the request running in the
+current context, so queries that async views run in worker threads are
+counted too. Metrics are kept per process: with several workers each
+scrape sees the worker that answered it.
+
+When ``BUDGET_SLOW_REQUEST_MS`` is set, requests slower than that are
+logged to ``budget.slow_requests`` with their slowest statements.
+"""
+import logging
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from .cache import cache_stats
+
+logger = logging.getLogger('budget.slow_requests')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+current_request = ContextVar('budget_request_metrics', default=None)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    escaped = (
+        str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self.lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            lines.append(f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.labelnames = labelnames
+        # labels -> [count per bucket (not cumulative), sum]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * len(self.buckets), 0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            values = sorted((labels, list(counts), total) for labels, (counts, total) in self.values.items())
+        names = self.labelnames + ('le',)
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = format_labels(names, labels + (format_value(float(bound)),))
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            label_text = format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {format_value(total)}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+ROUTE_LABELS = ('method', 'route')
+
+REQUESTS = Counter(
+    'budget_http_requests_total', 'Requests by route and status code.', ROUTE_LABELS + ('status',)
+)
+LATENCY = Histogram(
+    'budget_http_request_duration_seconds', 'Time to produce the response.', LATENCY_BUCKETS, ROUTE_LABELS
+)
+QUERIES = Histogram(
+    'budget_http_request_db_queries', 'Database queries per request.', QUERY_BUCKETS, ROUTE_LABELS
+)
+DB_TIME = Histogram(
+    'budget_http_request_db_duration_seconds', 'Time spent in database queries per request.',
+    LATENCY_BUCKETS, ROUTE_LABELS
+)
+RESPONSE_SIZE = Histogram(
+    'budget_http_response_size_bytes', 'Response body size, streaming responses excluded.',
+    SIZE_BUCKETS, ROUTE_LABELS
+)
+SLOW_REQUESTS = Counter(
+    'budget_http_slow_requests_total', 'Requests over BUDGET_SLOW_REQUEST_MS.', ROUTE_LABELS
+)
+METRICS = (REQUESTS, LATENCY, QUERIES, DB_TIME, RESPONSE_SIZE, SLOW_REQUESTS)
+
+
+class RequestMetrics:
+    """Database work done while handling one request."""
+
+    def __init__(self, keep_sql=False):
+        self.keep_sql = keep_sql
+        # (seconds, sql) when keeping SQL, otherwise seconds; appends are thread safe
+        self.queries = []
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    @property
+    def db_seconds(self):
+        if self.keep_sql:
+            return sum(seconds for seconds, _ in self.queries)
+        return sum(self.queries)
+
+    def slowest_queries(self, limit):
+        """The ``limit`` statements with the most total time, as ``(seconds, calls, sql)``."""
+        grouped = {}
+        for seconds, sql in self.queries:
+            total, calls = grouped.get(sql, (0, 0))
+            grouped[sql] = (total + seconds, calls + 1)
+        ranked = sorted(((total, calls, sql) for sql, (total, calls) in grouped.items()), reverse=True)
+        return ranked[:limit]
+
+
+def time_query(execute, sql, params, many, context):
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = perf_counter() - start
+        metrics.queries.append((elapsed, sql) if metrics.keep_sql else elapsed)
+
+
+def install_query_timer(connection):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def slow_request_threshold():
+    """Seconds after which a request is logged as slow, or ``None`` when disabled."""
+    threshold = getattr(settings, 'BUDGET_SLOW_REQUEST_MS', 0)
+    return threshold / 1000 if threshold else None
+
+
+def route_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+def record_request(request, response, seconds, metrics):
+    labels = (request.method, route_label(request))
+    REQUESTS.inc(labels + (str(response.status_code),))
+    LATENCY.observe(seconds, labels)
+    QUERIES.observe(metrics.query_count, labels)
+    DB_TIME.observe(metrics.db_seconds, labels)
+    if not response.streaming:
+        RESPONSE_SIZE.observe(len(response.content), labels)
+
+    threshold = slow_request_threshold()
+    if threshold is not None and seconds >= threshold:
+        SLOW_REQUESTS.inc(labels)
+        log_slow_request(request, response, seconds, metrics)
+
+
+def log_slow_request(request, response, seconds, metrics):
+    lines = [
+        f"{request.method} {request.get_full_path()} -> {response.status_code} in {seconds * 1000:.1f} ms, "
+        f"{metrics.query_count} queries in {metrics.db_seconds * 1000:.1f} ms"
+    ]
+    for total, calls, sql in metrics.slowest_queries(getattr(settings, 'BUDGET_SLOW_REQUEST_QUERIES', 5)):
+        lines.append(f"  {total * 1000:.1f} ms x{calls}: {sql}")
+    logger.warning('\n'.join(lines))
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+
+    # The response cache counts are shared by every process using the cache
+    stats = cache_stats()
+    for stat in ('hits', 'misses'):
+        name = f'budget_response_cache_{stat}_total'
+        lines += [
+            f'# HELP {name} Response cache {stat}.',
+            f'# TYPE {name} counter',
+            f'{name} {stats[stat]}',
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    # Scrapers authenticate with a bearer token; staff sessions can always read them, and
+    # without a token nobody else can unless DEBUG is on
+    token = getattr(settings, 'BUDGET_METRICS_TOKEN', '')
+    if token:
+        allowed = constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
+    else:
+        allowed = settings.DEBUG
+    if not (allowed or request.user.is_staff):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,157 @@
+import re
+import zlib
+from time import perf_counter
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .metrics import RequestMetrics, current_request, record_request, slow_request_threshold
+from .sharding import active_request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ACCEPT_ENCODING_ITEM = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*')
+
+# Already compressed, another pass only costs CPU
+INCOMPRESSIBLE_TYPES = ('image/', 'video/', 'audio/', 'application/zip', 'application/gzip', 'font/woff')
+
+
+def accepted_encodings(header):
+    """Map each coding in an ``Accept-Encoding`` header to its q-value."""
+    encodings = {}
+    for item in header.split(','):
+        match = ACCEPT_ENCODING_ITEM.fullmatch(item)
+        if match:
+            try:
+                encodings[match.group(1).lower()] = float(match.group(2) or 1)
+            except ValueError:
+                continue
+    return encodings
+
+
+def choose_encoding(header):
+    """Pick ``br`` or ``gzip`` for an ``Accept-Encoding`` header, or ``None``."""
+    encodings = accepted_encodings(header)
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best = None
+    for encoding in candidates:
+        quality = encodings.get(encoding, encodings.get('*', 0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def compressor(encoding):
+    """Return ``(compress, flush)`` callables for a streaming ``encoding`` compressor."""
+    if encoding == 'br':
+        stream = brotli.Compressor(quality=getattr(settings, 'BUDGET_BROTLI_QUALITY', 5))
+        return stream.process, stream.finish
+    stream = zlib.compressobj(getattr(settings, 'BUDGET_GZIP_LEVEL', 6), zlib.DEFLATED, 31)
+    return stream.compress, stream.flush
+
+
+def compress_stream(chunks, encoding):
+    compress, flush = compressor(encoding)
+    for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield flush()
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with brotli or gzip, as negotiated by ``Accept-Encoding``.
+
+    Bodies smaller than ``BUDGET_COMPRESSION_MIN_SIZE`` bytes are sent as
+    they are; streaming responses are always compressed since their size
+    isn't known up front. The coding is appended to the ETag (``"...-br"``)
+    so ``budget.conditional`` can still match it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return response
+        if response.get('Content-Type', '').startswith(INCOMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < getattr(settings, 'BUDGET_COMPRESSION_MIN_SIZE', 1024):
+            return response
+
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                async def compressed():
+                    compress, flush = compressor(encoding)
+                    async for chunk in response.streaming_content:
+                        data = compress(chunk)
+                        if data:
+                            yield data
+                    yield flush()
+                response.streaming_content = compressed()
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            compress, flush = compressor(encoding)
+            compressed = compress(response.content) + flush()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.endswith('"'):
+            response['ETag'] = f'{etag[:-1]}-{encoding}"'
+        response['Content-Encoding'] = encoding
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Records latency, database queries, response size and status per route
+    for ``/metrics/``. Goes first so the time includes the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # SQL text is only kept when slow requests are logged
+        metrics = RequestMetrics(keep_sql=slow_request_threshold() is not None)
+        token = current_request.set(metrics)
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        record_request(request, response, perf_counter() - start, metrics)
+        return response
+
+
+class ShardMiddleware:
+    """
+    Makes the request available to ``ShardRouter``, which routes to the
+    shard of whoever it ends up authenticated as.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = active_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            active_request.reset(token)
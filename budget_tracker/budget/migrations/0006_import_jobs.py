@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:36
+
+import hashlib
+from datetime import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# A copy as of this migration, so later changes to the app's fingerprint can't change what it does
+def transaction_fingerprint(date, amount, description):
+    if isinstance(date, datetime):
+        date = date.date()
+    normalized = ' '.join((description or '').lower().split())
+    return hashlib.sha1(f"{date.isoformat()}|{amount:.2f}|{normalized}".encode()).hexdigest()
+
+
+def populate_import_hashes(apps, schema_editor):
+    Transaction = apps.get_model('budget', 'Transaction')
+    db_alias = schema_editor.connection.alias
+    batch = []
+    for transaction in Transaction.objects.using(db_alias).only('date', 'amount', 'description').iterator(chunk_size=2000):
+        transaction.import_hash = transaction_fingerprint(transaction.date, transaction.amount, transaction.description)
+        batch.append(transaction)
+        if len(batch) == 2000:
+            Transaction.objects.using(db_alias).bulk_update(batch, ['import_hash'])
+            batch = []
+    Transaction.objects.using(db_alias).bulk_update(batch, ['import_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0005_composite_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(blank=True, upload_to='imports/')),
+                ('source_name', models.CharField(blank=True, max_length=255)),
+                ('format', models.CharField(choices=[('csv', 'CSV'), ('ofx', 'OFX')], max_length=3)),
+                ('rules', models.JSONField(blank=True, default=list)),
+                ('date_format', models.CharField(default='%Y-%m-%d', max_length=32)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('rows_processed', models.IntegerField(default=0)),
+                ('rows_imported', models.IntegerField(default=0)),
+                ('rows_duplicate', models.IntegerField(default=0)),
+                ('rows_unmatched', models.IntegerField(default=0)),
+                ('rows_invalid', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='import_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.RunPython(populate_import_hashes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'import_hash'], name='budget_txn_user_hash_idx'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='default_category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='budget.category'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:20
+
+import sqlite3
+
+from django.db import migrations
+
+# The index as of this migration; budget.search may move on without changing history
+SQLITE_INSTALL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS budget_transaction_fts USING fts5(
+        description, content='budget_transaction', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS budget_transaction_fts_insert AFTER INSERT ON budget_transaction BEGIN
+        INSERT INTO budget_transaction_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS budget_transaction_fts_delete AFTER DELETE ON budget_transaction BEGIN
+        INSERT INTO budget_transaction_fts(budget_transaction_fts, rowid, description)
+            VALUES ('delete', old.id, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS budget_transaction_fts_update AFTER UPDATE OF description ON budget_transaction
+    BEGIN
+        INSERT INTO budget_transaction_fts(budget_transaction_fts, rowid, description)
+            VALUES ('delete', old.id, old.description);
+        INSERT INTO budget_transaction_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+    "INSERT INTO budget_transaction_fts(budget_transaction_fts) VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_insert",
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_delete",
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_update",
+    "DROP TABLE IF EXISTS budget_transaction_fts",
+]
+
+POSTGRES_INSTALL = [
+    "ALTER TABLE budget_transaction ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """CREATE OR REPLACE FUNCTION budget_transaction_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('pg_catalog.english', coalesce(NEW.description, ''));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS budget_transaction_search_vector ON budget_transaction",
+    """CREATE TRIGGER budget_transaction_search_vector
+        BEFORE INSERT OR UPDATE OF description ON budget_transaction
+        FOR EACH ROW EXECUTE FUNCTION budget_transaction_search_vector()""",
+    """UPDATE budget_transaction SET search_vector = to_tsvector('pg_catalog.english', coalesce(description, ''))
+        WHERE search_vector IS NULL""",
+    """CREATE INDEX IF NOT EXISTS budget_txn_search_idx ON budget_transaction USING GIN (search_vector)""",
+]
+POSTGRES_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS budget_transaction_search_vector ON budget_transaction",
+    "DROP FUNCTION IF EXISTS budget_transaction_search_vector()",
+    "DROP INDEX IF EXISTS budget_txn_search_idx",
+    "ALTER TABLE budget_transaction DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def sqlite_has_fts5():
+    connection = sqlite3.connect(':memory:')
+    try:
+        connection.execute('CREATE VIRTUAL TABLE probe USING fts5(text)')
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        connection.close()
+
+
+def run_statements(connection, sqlite_statements, postgres_statements):
+    if connection.vendor == 'postgresql':
+        statements = postgres_statements
+    elif connection.vendor == 'sqlite' and sqlite_has_fts5():
+        statements = sqlite_statements
+    else:
+        statements = []
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def install(apps, schema_editor):
+    run_statements(schema_editor.connection, SQLITE_INSTALL, POSTGRES_INSTALL)
+
+
+def uninstall(apps, schema_editor):
+    run_statements(schema_editor.connection, SQLITE_UNINSTALL, POSTGRES_UNINSTALL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0006_import_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,165 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:20
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+import budget.models
+
+BATCH_SIZE = 1000
+CENT = Decimal('0.01')
+# (model, decimal field, temporary integer cents field)
+AMOUNT_FIELDS = [
+    ('transaction', 'amount', 'amount_cents'),
+    ('budget', 'amount', 'amount_cents'),
+    ('monthlyrollup', 'total', 'total_cents'),
+]
+
+
+# Copies as of this migration, so later changes to the app's helpers can't change what it does
+def to_cents(amount):
+    return int(Decimal(amount).quantize(CENT).scaleb(2))
+
+
+def from_cents(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+SQLITE_SEARCH_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS budget_transaction_fts_insert AFTER INSERT ON budget_transaction BEGIN
+        INSERT INTO budget_transaction_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS budget_transaction_fts_delete AFTER DELETE ON budget_transaction BEGIN
+        INSERT INTO budget_transaction_fts(budget_transaction_fts, rowid, description)
+            VALUES ('delete', old.id, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS budget_transaction_fts_update AFTER UPDATE OF description ON budget_transaction
+    BEGIN
+        INSERT INTO budget_transaction_fts(budget_transaction_fts, rowid, description)
+            VALUES ('delete', old.id, old.description);
+        INSERT INTO budget_transaction_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+    "INSERT INTO budget_transaction_fts(budget_transaction_fts) VALUES ('rebuild')",
+]
+
+
+def reinstall_search_index(apps, schema_editor):
+    # SQLite rebuilds the transaction table to change its columns, dropping the index triggers
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'budget_transaction_fts'")
+        if cursor.fetchone() is None:
+            return
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            cursor.execute(statement)
+
+
+def copy_amounts(apps, schema_editor, forwards):
+    alias = schema_editor.connection.alias
+    for model_name, decimal_field, cents_field in AMOUNT_FIELDS:
+        model = apps.get_model('budget', model_name)
+        source, target = (decimal_field, cents_field) if forwards else (cents_field, decimal_field)
+        convert = to_cents if forwards else from_cents
+        last = 0
+        while True:
+            rows = list(
+                model.objects.using(alias).filter(pk__gt=last).order_by('pk').values_list('pk', source)[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+            model.objects.using(alias).bulk_update(
+                [model(pk=pk, **{target: convert(value)}) for pk, value in rows], [target]
+            )
+            last = rows[-1][0]
+
+
+def amounts_to_cents(apps, schema_editor):
+    copy_amounts(apps, schema_editor, forwards=True)
+
+
+def cents_to_amounts(apps, schema_editor):
+    copy_amounts(apps, schema_editor, forwards=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0009_jobs'),
+    ]
+
+    operations = [
+        # Runs last when unapplying, after the table rebuilds below
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.AddField(
+            model_name='transaction',
+            name='amount_cents',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='amount_cents',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='monthlyrollup',
+            name='total_cents',
+            field=models.BigIntegerField(default=0),
+        ),
+        # A default lets unapplying add the decimal columns back to existing rows
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='budget',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(amounts_to_cents, cents_to_amounts),
+        migrations.RemoveField(
+            model_name='transaction',
+            name='amount',
+        ),
+        migrations.RemoveField(
+            model_name='budget',
+            name='amount',
+        ),
+        migrations.RemoveField(
+            model_name='monthlyrollup',
+            name='total',
+        ),
+        migrations.RenameField(
+            model_name='transaction',
+            old_name='amount_cents',
+            new_name='amount',
+        ),
+        migrations.RenameField(
+            model_name='budget',
+            old_name='amount_cents',
+            new_name='amount',
+        ),
+        migrations.RenameField(
+            model_name='monthlyrollup',
+            old_name='total_cents',
+            new_name='total',
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=budget.models.MoneyField(),
+        ),
+        migrations.AlterField(
+            model_name='budget',
+            name='amount',
+            field=budget.models.MoneyField(),
+        ),
+        migrations.AlterField(
+            model_name='monthlyrollup',
+            name='total',
+            field=budget.models.MoneyField(default=0, max_digits=14),
+        ),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0010_integer_cents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='baseline_id',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,7 +1,81 @@
+import hashlib
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django import forms
+from django.core import exceptions
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+CENT = Decimal('0.01')
+
+
+def transaction_fingerprint(date, amount, description):
+    """Stable hash of the fields that identify a transaction when importing statements."""
+    if isinstance(date, datetime):
+        date = date.date()
+    normalized = ' '.join((description or '').lower().split())
+    return hashlib.sha1(f"{date.isoformat()}|{amount:.2f}|{normalized}".encode()).hexdigest()
+
+def to_cents(amount):
+    return int(Decimal(amount).quantize(CENT).scaleb(2))
+
+def from_cents(cents):
+    return Decimal(cents).scaleb(-2)
+
+class MoneyField(models.BigIntegerField):
+    """
+    An amount stored as a whole number of cents.
+
+    Values are two-place ``Decimal``s in Python, so code and the API see the
+    same amounts as with a ``DecimalField``, while the database filters and
+    sums exact integers. ``max_digits`` only bounds validation.
+    """
+    def __init__(self, *args, max_digits=10, **kwargs):
+        self.max_digits = max_digits
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.max_digits != 10:
+            kwargs['max_digits'] = self.max_digits
+        return name, path, args, kwargs
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        try:
+            return Decimal(str(value)).quantize(CENT)
+        except InvalidOperation:
+            raise exceptions.ValidationError(
+                self.error_messages['invalid'], code='invalid', params={'value': value}
+            )
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None:
+            return None
+        return to_cents(self.to_python(value))
+
+    def from_db_value(self, value, expression, connection):
+        # Averages come back as fractional cents
+        return None if value is None else from_cents(value)
+
+    def validate(self, value, model_instance):
+        super().validate(value, model_instance)
+        if value is not None and abs(value) >= Decimal(10) ** (self.max_digits - 2):
+            raise exceptions.ValidationError(
+                f"Ensure that there are no more than {self.max_digits} digits in total.", code='max_digits'
+            )
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{
+            'form_class': forms.DecimalField, 'max_digits': self.max_digits, 'decimal_places': 2, **kwargs
+        })
+
+# Users live on the default database and their data on their shard (see
+# budget.sharding), so the database can't enforce the keys pointing at them
 class Category(models.Model):
     CATEGORY_TYPE_CHOICES = [
         ('income', 'Income'),
@@ -10,7 +84,7 @@ class Category(models.Model):
     
     name = models.CharField(max_length=100)
     type = models.CharField(max_length=10, choices=CATEGORY_TYPE_CHOICES)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='categories')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='categories', db_constraint=False)
     
     def __str__(self):
         return f"{self.name} ({self.get_type_display()})"
@@ -19,19 +93,37 @@ class Category(models.Model):
         verbose_name_plural = "Categories"
 
 class Transaction(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions')
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions', db_constraint=False)
+    amount = MoneyField()
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='transactions')
     description = models.CharField(max_length=255, blank=True)
     date = models.DateField(default=timezone.now)
+    import_hash = models.CharField(max_length=40, blank=True, default='', editable=False)
     
     def __str__(self):
         return f"{self.category.name}: {self.amount} on {self.date}"
 
+    def refresh_import_hash(self):
+        self.import_hash = transaction_fingerprint(self.date, self.amount, self.description)
+
+    def save(self, *args, **kwargs):
+        self.refresh_import_hash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'date', 'amount', 'description'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'import_hash'}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='budget_txn_user_date_idx'),
+            models.Index(fields=['user', 'category', 'date'], name='budget_txn_user_cat_date_idx'),
+            models.Index(fields=['user', 'import_hash'], name='budget_txn_user_hash_idx'),
+        ]
+
 class Budget(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets', db_constraint=False)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='budgets')
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = MoneyField()
     month = models.CharField(max_length=2)
     year = models.IntegerField()
     
@@ -40,10 +132,113 @@ class Budget(models.Model):
     
     class Meta:
         unique_together = ['user', 'category', 'month', 'year']
+        indexes = [
+            models.Index(fields=['user', 'year', 'month'], name='budget_budget_user_period_idx'),
+        ]
 
 class UserProfile(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, db_constraint=False)
     member_since = models.DateField(auto_now_add=True)
 
     def __str__(self):
         return self.user.username
+
+class MonthlyRollup(models.Model):
+    """Running per-month totals of a user's transactions in one category."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_rollups', db_constraint=False)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='monthly_rollups')
+    year = models.IntegerField()
+    month = models.PositiveSmallIntegerField()
+    total = MoneyField(max_digits=14, default=0)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.category.name} {self.month:02d}/{self.year}: {self.total} ({self.count})"
+
+    class Meta:
+        unique_together = ['user', 'category', 'year', 'month']
+        indexes = [
+            models.Index(fields=['user', 'year', 'month'], name='budget_rollup_user_period_idx'),
+        ]
+
+class ImportJob(models.Model):
+    """Progress and outcome of a bank statement import."""
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('ofx', 'OFX'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='import_jobs', db_constraint=False)
+    file = models.FileField(upload_to='imports/', blank=True)
+    source_name = models.CharField(max_length=255, blank=True)
+    format = models.CharField(max_length=3, choices=FORMAT_CHOICES)
+    rules = models.JSONField(default=list, blank=True)
+    default_category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    date_format = models.CharField(max_length=32, default='%Y-%m-%d')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    rows_processed = models.IntegerField(default=0)
+    rows_imported = models.IntegerField(default=0)
+    rows_duplicate = models.IntegerField(default=0)
+    rows_unmatched = models.IntegerField(default=0)
+    rows_invalid = models.IntegerField(default=0)
+    # Last transaction id before the first attempt; a retried import keeps counting duplicates against it
+    baseline_id = models.BigIntegerField(null=True, blank=True, editable=False)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.source_name or self.format} import ({self.get_status_display()})"
+
+class UserShard(models.Model):
+    """The database holding a user's data; users without one use the default database."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='shard')
+    alias = models.CharField(max_length=64)
+    # Writes are refused while the user's data is copied to another shard
+    moving = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.user_id} on {self.alias}{' (moving)' if self.moving else ''}"
+
+
+class Job(models.Model):
+    """Background work run by ``manage.py runworker``; see ``budget.jobs``."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=32)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    progress = models.FloatField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    file = models.FileField(upload_to='jobs/', blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    # Pending jobs wait until then; running ones belong to `worker` until their lease expires
+    run_after = models.DateTimeField(default=timezone.now)
+    lease_expires = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} job {self.pk} ({self.get_status_display()})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='budget_job_status_run_idx'),
+            models.Index(fields=['user', 'status'], name='budget_job_user_status_idx'),
+        ]
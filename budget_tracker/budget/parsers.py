@@ -0,0 +1,16 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .renderers import decode_ext, msgpack
+
+
+class MessagePackParser(BaseParser):
+    """Parses ``application/msgpack`` request bodies written by ``MessagePackRenderer`` or any other encoder."""
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        assert msgpack is not None, 'MessagePackParser requires the msgpack package'
+        try:
+            return msgpack.unpackb(stream.read(), ext_hook=decode_ext, raw=False, strict_map_key=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
@@ -0,0 +1,58 @@
+"""
+Query-plan checks used by the test suite to catch missing indexes.
+
+``full_table_scans`` runs EXPLAIN on a queryset and reports every table the
+database would read in full. SQLite and PostgreSQL are supported; on
+PostgreSQL sequential scans are discouraged for the duration of the EXPLAIN
+so the small tables of a test database don't hide a missing index.
+"""
+import re
+
+from django.db import connections, transaction
+
+SQLITE_SCAN = re.compile(r'\bSCAN (\w+)')
+POSTGRES_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def explain(queryset):
+    """Return the database's query plan for ``queryset`` as text."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.explain()
+    with transaction.atomic(using=queryset.db):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def full_table_scans(queryset, tables=None):
+    """
+    Tables that ``queryset`` scans in full rather than through an index.
+
+    ``tables`` limits the check to the given table names; by default every
+    table in the plan is considered.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        pattern = SQLITE_SCAN
+    elif vendor == 'postgresql':
+        pattern = POSTGRES_SEQ_SCAN
+    else:
+        raise NotImplementedError(f"Query plan checks are not supported on {vendor}")
+
+    scanned = pattern.findall(explain(queryset))
+    if tables is not None:
+        scanned = [table for table in scanned if table in tables]
+    return scanned
+
+
+class QueryPlanAssertionsMixin:
+    """TestCase mixin adding ``assertNoFullTableScan``."""
+
+    def assertNoFullTableScan(self, queryset, tables=None):
+        scanned = full_table_scans(queryset, tables)
+        if scanned:
+            self.fail(
+                f"Query falls back to a full scan of {', '.join(scanned)}:\n"
+                f"{queryset.query}\n\n{explain(queryset)}"
+            )
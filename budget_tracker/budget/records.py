@@ -0,0 +1,154 @@
+"""
+Aggregated transaction records for charts and tables.
+
+A request picks filters, zero or more group-by dimensions and a set of
+aggregates; the result is computed in one ``GROUP BY`` query and returned
+column by column::
+
+    {"fields": ["month", "sum", "count"],
+     "columns": {"month": ["2025-01-01", ...], "sum": ["120.00", ...], "count": [4, ...]},
+     "rows": 12}
+"""
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Avg, Count, DateField, Max, Min, Q, Sum
+from django.db.models.functions import Trunc
+
+from .models import MoneyField
+
+GROUPINGS = ('day', 'week', 'month', 'category')
+AGGREGATES = {
+    'sum': lambda: Sum('amount'),
+    'count': lambda: Count('id'),
+    # Over integer cents the average would otherwise come back as a float
+    'avg': lambda: Avg('amount', output_field=MoneyField()),
+    'min': lambda: Min('amount'),
+    'max': lambda: Max('amount'),
+}
+DEFAULT_AGGREGATES = ('sum', 'count')
+MONEY = Decimal('0.01')
+# The largest amount the cents column holds
+MAX_AMOUNT = Decimal(MoneyField.MAX_BIGINT).scaleb(-2)
+
+
+def split(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+def parse_date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+
+def parse_amount(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"{name} must be a number")
+    # Decimal also parses NaN and Infinity, and the cents column can't hold every finite amount
+    if not amount.is_finite():
+        raise ValueError(f"{name} must be a number")
+    if abs(amount) > MAX_AMOUNT:
+        raise ValueError(f"{name} is out of range")
+    return amount
+
+
+def records_filter(params):
+    """Build the ``Q`` for the request's filters, raising ``ValueError`` on bad input."""
+    condition = Q()
+
+    # Filter by date range if provided
+    start_date = parse_date(params, 'start_date')
+    end_date = parse_date(params, 'end_date')
+    if start_date:
+        condition &= Q(date__gte=start_date)
+    if end_date:
+        condition &= Q(date__lte=end_date)
+
+    # Filter by one or more categories, comma separated
+    categories = split(params.get('category'))
+    if categories:
+        if not all(category.isdigit() for category in categories):
+            raise ValueError("category must be a comma separated list of ids")
+        condition &= Q(category_id__in=[int(category) for category in categories])
+
+    # Filter by category type if provided
+    category_type = params.get('type')
+    if category_type:
+        if category_type not in ('income', 'expense'):
+            raise ValueError("type must be 'income' or 'expense'")
+        condition &= Q(category__type=category_type)
+
+    # Filter by amount range if provided
+    min_amount = parse_amount(params, 'min_amount')
+    max_amount = parse_amount(params, 'max_amount')
+    if min_amount is not None:
+        condition &= Q(amount__gte=min_amount)
+    if max_amount is not None:
+        condition &= Q(amount__lte=max_amount)
+
+    # Filter by description text if provided
+    text = params.get('q')
+    if text:
+        condition &= Q(description__icontains=text)
+
+    return condition
+
+
+def query_records(queryset, params):
+    """
+    Run the aggregate query described by ``params`` over ``queryset`` and
+    return the columnar payload. Raises ``ValueError`` on bad input.
+    """
+    group_by = split(params.get('group_by'))
+    unknown = [name for name in group_by if name not in GROUPINGS]
+    if unknown or len(set(group_by)) != len(group_by):
+        raise ValueError(f"group_by must be a comma separated list of {', '.join(GROUPINGS)}")
+    aggregates = split(params.get('aggregates')) or list(DEFAULT_AGGREGATES)
+    unknown = [name for name in aggregates if name not in AGGREGATES]
+    if unknown or len(set(aggregates)) != len(aggregates):
+        raise ValueError(f"aggregates must be a comma separated list of {', '.join(AGGREGATES)}")
+
+    fields = []
+    values = []
+    periods = {}
+    for name in group_by:
+        if name == 'category':
+            fields += ['category', 'category_name']
+            values += ['category_id', 'category__name']
+        else:
+            periods[name] = Trunc('date', name, output_field=DateField())
+            fields.append(name)
+            values.append(name)
+    fields += aggregates
+
+    annotations = {name: AGGREGATES[name]() for name in aggregates}
+    queryset = queryset.filter(records_filter(params)).annotate(**periods)
+    if values:
+        rows = list(
+            queryset.values(*values).annotate(**annotations).order_by(*values).values_list(*values, *aggregates)
+        )
+    else:
+        rows = [tuple(queryset.aggregate(**annotations).values())]
+
+    columns = {name: [format_value(name, row[index]) for row in rows] for index, name in enumerate(fields)}
+    return {'fields': fields, 'columns': columns, 'rows': len(rows)}
+
+
+def format_value(name, value):
+    if value is None:
+        return None
+    if name in ('sum', 'avg', 'min', 'max'):
+        return f'{Decimal(value).quantize(MONEY):.2f}'
+    if name in ('day', 'week', 'month'):
+        return value.isoformat()
+    return value
@@ -0,0 +1,61 @@
+"""
+MessagePack rendering for API responses.
+
+Requested with ``Accept: application/msgpack``. Values MessagePack has no
+type for are written as extension types so they survive the round trip
+exactly: ``Decimal`` as its string form (no float rounding), ``date`` and
+``datetime`` as ISO 8601 strings. Anything else goes through DRF's JSON
+encoder fallbacks (lazy strings, UUIDs, timedeltas, ...).
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+EXT_DECIMAL = 1
+EXT_DATE = 2
+EXT_DATETIME = 3
+
+json_fallback = JSONEncoder().default
+
+
+def encode_ext(value):
+    if isinstance(value, Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(value).encode('ascii'))
+    # datetime is a subclass of date, so it goes first
+    if isinstance(value, datetime):
+        return msgpack.ExtType(EXT_DATETIME, value.isoformat().encode('ascii'))
+    if isinstance(value, date):
+        return msgpack.ExtType(EXT_DATE, value.isoformat().encode('ascii'))
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return json_fallback(value)
+
+
+def decode_ext(code, data):
+    if code == EXT_DECIMAL:
+        return Decimal(data.decode('ascii'))
+    if code == EXT_DATE:
+        return date.fromisoformat(data.decode('ascii'))
+    if code == EXT_DATETIME:
+        return datetime.fromisoformat(data.decode('ascii'))
+    return msgpack.ExtType(code, data)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        assert msgpack is not None, 'MessagePackRenderer requires the msgpack package'
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_ext, use_bin_type=True, datetime=False)
@@ -0,0 +1,187 @@
+"""
+Maintenance of the ``MonthlyRollup`` table.
+
+Rollups hold the sum and count of a user's transactions per category and
+calendar month. Writers apply signed deltas inside the same database
+transaction as the change they describe; ``rebuild`` and ``verify``
+recompute everything from the raw ``Transaction`` rows.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .models import MoneyField, MonthlyRollup, Transaction
+
+INLINE_DELTA_LIMIT = 4
+BATCH_SIZE = 1000
+
+
+def rollup_key(user_id, category_id, day):
+    return (user_id, category_id, day.year, day.month)
+
+
+def month_range_filter(first_month, last_month):
+    """Q object selecting rollup rows between two first-of-month dates inclusive."""
+    return (
+        (Q(year__gt=first_month.year) | Q(year=first_month.year, month__gte=first_month.month)) &
+        (Q(year__lt=last_month.year) | Q(year=last_month.year, month__lte=last_month.month))
+    )
+
+
+def apply_deltas(deltas):
+    """
+    Apply ``{(user_id, category_id, year, month): (amount, count)}`` to the
+    rollup table. Must be called inside the transaction that made the change.
+
+    A handful of keys are updated in place with ``F()`` expressions; larger
+    batches lock the affected rows, then go out as one ``bulk_update`` and
+    one ``bulk_create``.
+    """
+    deltas = {key: value for key, value in deltas.items() if value[0] or value[1]}
+    if len(deltas) <= INLINE_DELTA_LIMIT:
+        for key, (amount, count) in deltas.items():
+            add_to_rollup(key, amount, count)
+        return
+
+    existing = {
+        (row.user_id, row.category_id, row.year, row.month): row
+        for row in MonthlyRollup.objects.select_for_update().filter(
+            user_id__in={key[0] for key in deltas},
+            category_id__in={key[1] for key in deltas},
+            year__in={key[2] for key in deltas},
+        )
+    }
+    changed = []
+    missing = []
+    for key, (amount, count) in deltas.items():
+        row = existing.get(key)
+        if row is None:
+            user_id, category_id, year, month = key
+            missing.append(MonthlyRollup(
+                user_id=user_id, category_id=category_id, year=year, month=month, total=amount, count=count
+            ))
+        else:
+            row.total += amount
+            row.count += count
+            changed.append(row)
+    MonthlyRollup.objects.bulk_update(changed, ['total', 'count'], batch_size=BATCH_SIZE)
+    try:
+        with transaction.atomic(using=router.db_for_write(MonthlyRollup)):
+            MonthlyRollup.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+    except IntegrityError:
+        # Another writer created some of the rows first, add onto theirs
+        for row in missing:
+            add_to_rollup((row.user_id, row.category_id, row.year, row.month), row.total, row.count)
+
+
+def add_to_rollup(key, amount, count):
+    user_id, category_id, year, month = key
+    lookup = {'user_id': user_id, 'category_id': category_id, 'year': year, 'month': month}
+    # Sent as cents, like the column it is added to
+    delta = Value(amount, output_field=MoneyField())
+    updated = MonthlyRollup.objects.filter(**lookup).update(
+        total=F('total') + delta, count=F('count') + count
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic(using=router.db_for_write(MonthlyRollup)):
+            MonthlyRollup.objects.create(total=amount, count=count, **lookup)
+    except IntegrityError:
+        MonthlyRollup.objects.filter(**lookup).update(
+            total=F('total') + delta, count=F('count') + count
+        )
+
+
+class RollupDelta:
+    """Accumulates the rollup changes caused by a batch of transaction writes."""
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: [0, 0])
+
+    def add(self, user_id, category_id, day, amount):
+        delta = self.deltas[rollup_key(user_id, category_id, day)]
+        delta[0] += amount
+        delta[1] += 1
+
+    def remove(self, user_id, category_id, day, amount):
+        delta = self.deltas[rollup_key(user_id, category_id, day)]
+        delta[0] -= amount
+        delta[1] -= 1
+
+    def apply(self):
+        apply_deltas({key: tuple(value) for key, value in self.deltas.items()})
+        self.deltas.clear()
+
+
+def record_created(instance):
+    delta = RollupDelta()
+    delta.add(instance.user_id, instance.category_id, instance.date, instance.amount)
+    delta.apply()
+
+
+def record_updated(previous, instance):
+    """``previous`` is a ``(user_id, category_id, date, amount)`` tuple taken before the save."""
+    delta = RollupDelta()
+    delta.remove(*previous)
+    delta.add(instance.user_id, instance.category_id, instance.date, instance.amount)
+    delta.apply()
+
+
+def record_deleted(instance):
+    delta = RollupDelta()
+    delta.remove(instance.user_id, instance.category_id, instance.date, instance.amount)
+    delta.apply()
+
+
+def expected_rollups(user=None):
+    """Rollup values recomputed from the raw transactions, keyed like ``apply_deltas``."""
+    queryset = Transaction.objects.all()
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    rows = queryset.annotate(
+        year=ExtractYear('date'), month=ExtractMonth('date')
+    ).values('user_id', 'category_id', 'year', 'month').annotate(
+        total=Sum('amount'), count=Count('id')
+    ).order_by()
+    return {
+        (row['user_id'], row['category_id'], row['year'], row['month']): (row['total'], row['count'])
+        for row in rows.iterator()
+    }
+
+
+def rebuild(user=None, batch_size=BATCH_SIZE):
+    """Replace the rollups of ``user`` (or of everyone) with freshly computed ones."""
+    with transaction.atomic(using=router.db_for_write(MonthlyRollup)):
+        existing = MonthlyRollup.objects.all()
+        if user is not None:
+            existing = existing.filter(user=user)
+        existing.delete()
+        rollups = [
+            MonthlyRollup(user_id=user_id, category_id=category_id, year=year, month=month, total=total, count=count)
+            for (user_id, category_id, year, month), (total, count) in expected_rollups(user).items()
+        ]
+        MonthlyRollup.objects.bulk_create(rollups, batch_size=batch_size)
+    return len(rollups)
+
+
+def verify(user=None):
+    """Return ``(key, stored, expected)`` for every rollup that disagrees with the raw data."""
+    expected = expected_rollups(user)
+    stored_rows = MonthlyRollup.objects.all()
+    if user is not None:
+        stored_rows = stored_rows.filter(user=user)
+    stored = {
+        (user_id, category_id, year, month): (total, count)
+        for user_id, category_id, year, month, total, count in stored_rows.values_list(
+            'user_id', 'category_id', 'year', 'month', 'total', 'count'
+        ).iterator()
+        if count or total
+    }
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        if expected.get(key) != stored.get(key):
+            mismatches.append((key, stored.get(key), expected.get(key)))
+    return mismatches
@@ -0,0 +1,115 @@
+"""
+Shard and read replica routing.
+
+``ShardRouter`` sends user data to the user's shard (see
+``budget.sharding``) and leaves everything on the default database to
+``ReplicaRouter``, which is listed after it.
+
+Queries go to the primary (``default``) unless the current request has
+opted in with ``ReplicaReadMixin``, which the reporting views and the
+list/retrieve actions of the data viewsets use. Even then a user whose
+data changed in the last ``BUDGET_REPLICA_STICKINESS`` seconds stays on
+the primary, so they see their own writes while the replicas catch up.
+The user's data version (see ``budget.cache``) is the time of their last
+committed write, so no extra bookkeeping is needed.
+
+Replica aliases are listed in ``BUDGET_REPLICA_ALIASES``; with none
+configured everything runs on the primary.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .cache import get_data_version
+from .models import UserShard
+from .sharding import SHARDED_MODELS, ShardMoving, current_placement, is_sharded, user_placement
+
+use_replica = ContextVar('budget_use_replica', default=False)
+
+
+def replica_aliases():
+    return getattr(settings, 'BUDGET_REPLICA_ALIASES', [])
+
+
+def recently_written(user_id):
+    window = getattr(settings, 'BUDGET_REPLICA_STICKINESS', 5)
+    return time.time_ns() - get_data_version(user_id) < window * 1_000_000_000
+
+
+def hinted_placement(hints):
+    instance = hints.get('instance')
+    if instance is not None:
+        user_id = instance.pk if isinstance(instance, User) else getattr(instance, 'user_id', None)
+        if user_id is not None:
+            return user_placement(user_id)
+    return current_placement()
+
+
+class ShardRouter:
+    def db_for_read(self, model, **hints):
+        # The directory must not lag behind on a replica
+        if model is UserShard:
+            return DEFAULT_DB_ALIAS
+        if model not in SHARDED_MODELS or not is_sharded():
+            return None
+        placement = hinted_placement(hints)
+        # The default shard may read from the replicas
+        if placement is None or placement.alias == DEFAULT_DB_ALIAS:
+            return None
+        return placement.alias
+
+    def db_for_write(self, model, **hints):
+        if model not in SHARDED_MODELS or not is_sharded():
+            return None
+        placement = hinted_placement(hints)
+        if placement is None:
+            return None
+        if placement.moving:
+            raise ShardMoving()
+        return placement.alias
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replica_aliases()
+        # Reads inside a transaction on the primary must see its writes
+        if aliases and use_replica.get() and not connections['default'].in_atomic_block:
+            return random.choice(aliases)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+class ReplicaReadMixin:
+    """
+    Serves the safe requests of ``replica_actions`` (every action when
+    ``None``) from a replica, unless the user wrote recently.
+    """
+    replica_actions = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.previous_use_replica = use_replica.get()
+        action = getattr(self, 'action', None)
+        if (
+            replica_aliases()
+            and request.method in ('GET', 'HEAD')
+            and (self.replica_actions is None or action in self.replica_actions)
+            and request.user.is_authenticated
+            and not recently_written(request.user.id)
+        ):
+            use_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if hasattr(self, 'previous_use_replica'):
+            use_replica.set(self.previous_use_replica)
+        return super().finalize_response(request, response, *args, **kwargs)
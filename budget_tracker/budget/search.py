@@ -0,0 +1,165 @@
+"""
+Full-text search over transaction descriptions.
+
+SQLite keeps an FTS5 index (``budget_transaction_fts``) over the
+description column, and PostgreSQL a ``tsvector`` column with a GIN
+index. On both, triggers in the database keep the index in step with
+every insert, update and delete, including bulk writes and raw SQL.
+Other databases fall back to a substring match.
+
+``install_search_index`` creates the index and its triggers on a
+connection and fills it from the existing rows; it is safe to run again.
+Migrations keep their own copies of this SQL, and the ones that make
+SQLite rebuild the transaction table (which drops its triggers) recreate
+the triggers from those copies.
+"""
+import re
+import sqlite3
+from functools import lru_cache
+
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'budget_transaction_fts'
+MAX_TERMS = 16
+TERM = re.compile(r'\w+')
+
+SQLITE_INSTALL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        description, content='budget_transaction', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON budget_transaction BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON budget_transaction BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF description ON budget_transaction BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_INSTALL = [
+    "ALTER TABLE budget_transaction ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """CREATE OR REPLACE FUNCTION budget_transaction_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('pg_catalog.english', coalesce(NEW.description, ''));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS budget_transaction_search_vector ON budget_transaction",
+    """CREATE TRIGGER budget_transaction_search_vector
+        BEFORE INSERT OR UPDATE OF description ON budget_transaction
+        FOR EACH ROW EXECUTE FUNCTION budget_transaction_search_vector()""",
+    """UPDATE budget_transaction SET search_vector = to_tsvector('pg_catalog.english', coalesce(description, ''))
+        WHERE search_vector IS NULL""",
+    """CREATE INDEX IF NOT EXISTS budget_txn_search_idx ON budget_transaction USING GIN (search_vector)""",
+]
+POSTGRES_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS budget_transaction_search_vector ON budget_transaction",
+    "DROP FUNCTION IF EXISTS budget_transaction_search_vector()",
+    "DROP INDEX IF EXISTS budget_txn_search_idx",
+    "ALTER TABLE budget_transaction DROP COLUMN IF EXISTS search_vector",
+]
+
+
+@lru_cache(maxsize=None)
+def sqlite_has_fts5():
+    # A property of the SQLite library Django's backend is linked against
+    connection = sqlite3.connect(':memory:')
+    try:
+        connection.execute('CREATE VIRTUAL TABLE probe USING fts5(text)')
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        connection.close()
+
+
+def search_backend(connection):
+    """``'fts5'``, ``'postgres'`` or ``None`` when ``connection`` has no full-text index."""
+    if connection.vendor == 'postgresql':
+        return 'postgres'
+    if connection.vendor == 'sqlite' and sqlite_has_fts5():
+        return 'fts5'
+    return None
+
+
+def install_search_index(connection):
+    """Create the full-text index and its triggers on ``connection`` and index existing rows."""
+    backend = search_backend(connection)
+    statements = {'fts5': SQLITE_INSTALL, 'postgres': POSTGRES_INSTALL}.get(backend, [])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def uninstall_search_index(connection):
+    backend = search_backend(connection)
+    statements = {'fts5': SQLITE_UNINSTALL, 'postgres': POSTGRES_UNINSTALL}.get(backend, [])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def search_terms(text):
+    """The words of a search box entry, lower cased, at most ``MAX_TERMS`` of them."""
+    return TERM.findall((text or '').lower())[:MAX_TERMS]
+
+
+# Every term must match as a word prefix, so partial words find results too
+def fts5_query(terms):
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def tsquery(terms):
+    return ' & '.join(f"'{term}':*" for term in terms)
+
+
+def search_transactions(queryset, text, connection):
+    """
+    Filter ``queryset`` to transactions matching ``text`` and annotate
+    ``search_rank``, lower for better matches. An entry with no words
+    matches nothing.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset.annotate(search_rank=Value(0.0)).none()
+
+    backend = search_backend(connection)
+    if backend == 'fts5':
+        query = fts5_query(terms)
+        # Join the index so it drives the query: every match costs one primary
+        # key lookup, and bm25() is already lower-is-better. The unary + keeps
+        # SQLite from probing the index by rowid once per row of the user's
+        # index instead, which it picks when its statistics are stale or missing
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'budget_transaction.id = +{FTS_TABLE}.rowid', f'{FTS_TABLE} MATCH %s'],
+            params=[query],
+            select={'search_rank': f'{FTS_TABLE}.rank'},
+        )
+    if backend == 'postgres':
+        query = tsquery(terms)
+        matches = RawSQL(
+            "budget_transaction.search_vector @@ to_tsquery('pg_catalog.english', %s)", [query],
+            output_field=BooleanField()
+        )
+        return queryset.filter(matches).annotate(search_rank=RawSQL(
+            "-ts_rank(budget_transaction.search_vector, to_tsquery('pg_catalog.english', %s))", [query],
+            output_field=FloatField()
+        ))
+
+    queryset = queryset.annotate(search_rank=Value(0.0))
+    for term in terms:
+        queryset = queryset.filter(description__icontains=term)
+    return queryset
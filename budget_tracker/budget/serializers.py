@@ -1,6 +1,8 @@
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 from django.contrib.auth.models import User
-from .models import Category, Transaction, Budget, UserProfile
+from .importers import validate_rules
+from .models import Category, Transaction, Budget, UserProfile, ImportJob, Job
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,6 +19,7 @@ class CategorySerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 class TransactionSerializer(serializers.ModelSerializer):
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
     category_name = serializers.ReadOnlyField(source='category.name')
     category_type = serializers.ReadOnlyField(source='category.type')
     
@@ -29,6 +32,7 @@ class TransactionSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 class BudgetSerializer(serializers.ModelSerializer):
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
     category_name = serializers.ReadOnlyField(source='category.name')
     
     class Meta:
@@ -39,6 +43,140 @@ class BudgetSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
+class ValuesSerializer:
+    """
+    Read-only serializer for rows fetched with ``QuerySet.values()``.
+
+    Produces the same output as the matching ``ModelSerializer`` for list
+    responses without building model instances or running per-field DRF
+    machinery. ``fields`` maps each output name to its ``values()`` lookup;
+    ``formatters`` convert the raw value where DRF would.
+    """
+    fields = {}
+    formatters = {}
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @classmethod
+    def values(cls):
+        return tuple(cls.fields.values())
+
+    @property
+    def data(self):
+        fields = tuple(self.fields.items())
+        formatters = self.formatters
+        return [
+            {
+                name: formatters[name](row[lookup]) if name in formatters and row[lookup] is not None else row[lookup]
+                for name, lookup in fields
+            }
+            for row in self.rows
+        ]
+
+def format_money(value):
+    return f'{value:.2f}'
+
+class TransactionValuesSerializer(ValuesSerializer):
+    fields = {
+        'id': 'id',
+        'amount': 'amount',
+        'category': 'category_id',
+        'category_name': 'category__name',
+        'category_type': 'category__type',
+        'description': 'description',
+        'date': 'date',
+    }
+    formatters = {'amount': format_money, 'date': lambda value: value.isoformat()}
+
+class BudgetValuesSerializer(ValuesSerializer):
+    fields = {
+        'id': 'id',
+        'category': 'category_id',
+        'category_name': 'category__name',
+        'amount': 'amount',
+        'month': 'month',
+        'year': 'year',
+    }
+    formatters = {'amount': format_money}
+
+class TransactionBulkItemSerializer(serializers.Serializer):
+    """Validates one item of a bulk write; categories are resolved by the caller."""
+    id = serializers.IntegerField(required=False)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    category = serializers.IntegerField()
+    description = serializers.CharField(max_length=255, allow_blank=True, required=False)
+    date = serializers.DateField(required=False)
+
+class TransactionBulkSerializer(serializers.Serializer):
+    create = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    update = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    file = serializers.FileField(write_only=True)
+    format = serializers.ChoiceField(choices=ImportJob.FORMAT_CHOICES, required=False)
+    rules = serializers.JSONField(binary=True, required=False)
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'file', 'source_name', 'format', 'rules', 'default_category', 'date_format',
+            'status', 'rows_processed', 'rows_imported', 'rows_duplicate', 'rows_unmatched',
+            'rows_invalid', 'error', 'created_at', 'finished_at'
+        ]
+        read_only_fields = [
+            'source_name', 'status', 'rows_processed', 'rows_imported', 'rows_duplicate',
+            'rows_unmatched', 'rows_invalid', 'error', 'created_at', 'finished_at'
+        ]
+
+    def validate_rules(self, value):
+        try:
+            validate_rules(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+    def validate_default_category(self, value):
+        if value is not None and value.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError("Category not found.")
+        return value
+
+    def validate(self, attrs):
+        if 'format' not in attrs:
+            name = attrs['file'].name.lower()
+            if name.endswith(('.ofx', '.qfx')):
+                attrs['format'] = 'ofx'
+            elif name.endswith('.csv'):
+                attrs['format'] = 'csv'
+            else:
+                raise serializers.ValidationError({'format': "Could not tell the format from the file name."})
+        return attrs
+
+    def create(self, validated_data):
+        validated_data['user'] = self.context['request'].user
+        validated_data['source_name'] = validated_data['file'].name
+        return super().create(validated_data)
+
+class JobSerializer(serializers.ModelSerializer):
+    params = serializers.JSONField(required=False, default=dict)
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'params', 'status', 'progress', 'result', 'error', 'attempts',
+            'created_at', 'started_at', 'finished_at', 'download'
+        ]
+        read_only_fields = [
+            'status', 'progress', 'result', 'error', 'attempts', 'created_at', 'started_at', 'finished_at'
+        ]
+
+    def get_download(self, job):
+        if not job.file:
+            return None
+        return reverse('job-download', args=[job.pk], request=self.context.get('request'))
+
 class FinancialSummarySerializer(serializers.Serializer):
     total_income = serializers.DecimalField(max_digits=10, decimal_places=2)
     total_expenses = serializers.DecimalField(max_digits=10, decimal_places=2)
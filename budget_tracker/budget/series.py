@@ -0,0 +1,179 @@
+"""
+Income and expense time series for charts.
+
+A series covers any date range bucketed by day, week, month, quarter or
+year, with every bucket present (zero when nothing happened) and returned
+column by column::
+
+    {"granularity": "month", "start_date": "2025-01-01", "end_date": "2025-03-31",
+     "buckets": ["2025-01-01", "2025-02-01", "2025-03-01"],
+     "income": ["3000.00", "3000.00", "0.00"], "expenses": ["812.40", "0.00", "640.00"]}
+
+Day and week buckets come from one grouped query over the transactions. Month, quarter and year buckets read whole months from
+``MonthlyRollup`` and only the partial months at the ends of the range
+from the transactions, so their cost doesn't grow with the number of
+transactions.
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import connections
+from django.db.models import DateField, F, Func, Sum, Value
+from django.db.models.functions import Trunc
+
+from .models import Category, MonthlyRollup, Transaction
+from .rollups import month_range_filter
+from .serializers import format_money
+from .summary import full_month_bounds, month_span
+
+GRANULARITIES = ('day', 'week', 'month', 'quarter', 'year')
+DEFAULT_GRANULARITY = 'month'
+MAX_BUCKETS = 4000
+ZERO = Decimal('0.00')
+
+
+def bucket_start(day, granularity):
+    """First day of the ``granularity`` bucket holding ``day``; weeks start on Monday."""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    return date(day.year, 1, 1)
+
+
+def bucket_count(start_date, end_date, granularity):
+    first = bucket_start(start_date, granularity)
+    last = bucket_start(end_date, granularity)
+    if granularity == 'day':
+        return (last - first).days + 1
+    if granularity == 'week':
+        return (last - first).days // 7 + 1
+    months = month_span(first, last)
+    return {'month': months, 'quarter': (months - 1) // 3 + 1, 'year': last.year - first.year + 1}[granularity]
+
+
+def bucket_starts(start_date, end_date, granularity):
+    """Start dates of every bucket touching the range, in order."""
+    first = bucket_start(start_date, granularity)
+    count = bucket_count(start_date, end_date, granularity)
+    if granularity in ('day', 'week'):
+        step = timedelta(days=1 if granularity == 'day' else 7)
+        return [first + step * i for i in range(count)]
+    months = {'month': 1, 'quarter': 3, 'year': 12}[granularity]
+    return [first + relativedelta(months=months * i) for i in range(count)]
+
+
+def parse_date(params, name, default):
+    value = params.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+
+def series_params(params, today):
+    """Validate the request's parameters, raising ``ValueError`` on bad input."""
+    granularity = params.get('granularity') or DEFAULT_GRANULARITY
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    # The last twelve months unless requested otherwise
+    end_date = parse_date(params, 'end_date', today)
+    start_date = parse_date(params, 'start_date', end_date.replace(day=1) - relativedelta(months=11))
+    if start_date > end_date:
+        raise ValueError("start_date must not be after end_date")
+    if bucket_count(start_date, end_date, granularity) > MAX_BUCKETS:
+        raise ValueError(f"The range may cover at most {MAX_BUCKETS} {granularity} buckets")
+    by_category = params.get('by_category', '').lower() in ('1', 'true', 'yes')
+    return {'granularity': granularity, 'start_date': start_date, 'end_date': end_date, 'by_category': by_category}
+
+
+def bucket_expression(granularity, vendor):
+    # Django truncates dates on SQLite with a Python function called per row;
+    # days need no truncation and weeks have a native equivalent
+    if granularity == 'day':
+        return F('date')
+    if granularity == 'week' and vendor == 'sqlite':
+        return Func(F('date'), Value('weekday 0'), Value('-6 days'), function='DATE', output_field=DateField())
+    return Trunc('date', granularity, output_field=DateField())
+
+
+def transaction_rows(user, start_date, end_date, granularity, group):
+    """``(bucket, *group, total)`` from the raw transactions, one grouped query."""
+    queryset = Transaction.objects.filter(user=user, category__user=user, date__range=(start_date, end_date))
+    return queryset.annotate(
+        bucket=bucket_expression(granularity, connections[queryset.db].vendor)
+    ).values_list('bucket', *group).annotate(total=Sum('amount')).order_by()
+
+
+def rollup_rows(user, first_month, last_month, group):
+    rows = MonthlyRollup.objects.filter(
+        month_range_filter(first_month, last_month),
+        user=user,
+        category__user=user
+    ).values_list('year', 'month', *group).annotate(total=Sum('total')).order_by()
+    for year, month, *rest in rows:
+        yield (date(year, month, 1), *rest)
+
+
+def series_rows(user, start_date, end_date, granularity, group):
+    """``(bucket start, *group, total)`` rows, possibly several per bucket and group."""
+    if granularity in ('day', 'week'):
+        return list(transaction_rows(user, start_date, end_date, granularity, group))
+
+    first_month, last_month, edges = full_month_bounds(start_date, end_date)
+    rows = list(rollup_rows(user, first_month, last_month, group)) if first_month else []
+    for edge_start, edge_end in edges:
+        rows += transaction_rows(user, edge_start, edge_end, 'month', group)
+    # Months fold into their quarter or year
+    return [(bucket_start(row[0], granularity), *row[1:]) for row in rows]
+
+
+def build_series(user, start_date, end_date, granularity=DEFAULT_GRANULARITY, by_category=False):
+    buckets = bucket_starts(start_date, end_date, granularity)
+    index = {bucket: i for i, bucket in enumerate(buckets)}
+    income = [ZERO] * len(buckets)
+    expenses = [ZERO] * len(buckets)
+    per_category = {}
+
+    # Grouping by type alone keeps the row count down when categories aren't needed
+    group = ('category__type', 'category_id') if by_category else ('category__type',)
+    for bucket, category_type, *category, total in series_rows(user, start_date, end_date, granularity, group):
+        i = index[bucket]
+        if category_type == 'income':
+            income[i] += total
+        elif category_type == 'expense':
+            expenses[i] += total
+        if by_category:
+            amounts = per_category.setdefault(category[0], [ZERO] * len(buckets))
+            amounts[i] += total
+
+    result = {
+        'granularity': granularity,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'buckets': [bucket.isoformat() for bucket in buckets],
+        'income': [format_money(amount) for amount in income],
+        'expenses': [format_money(amount) for amount in expenses],
+    }
+    if by_category:
+        zeros = [format_money(ZERO)] * len(buckets)
+        result['categories'] = [
+            {
+                'id': category_id,
+                'name': name,
+                'type': category_type,
+                'amounts': [format_money(amount) for amount in per_category[category_id]]
+                if category_id in per_category else zeros,
+            }
+            for category_id, name, category_type in Category.objects.filter(user=user).order_by('id').values_list(
+                'id', 'name', 'type'
+            )
+        ]
+    return result
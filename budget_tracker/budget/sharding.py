@@ -0,0 +1,265 @@
+"""
+User sharding.
+
+Each user's categories, transactions, budgets, rollups, import jobs and
+profile live together on one database, their shard. Users, tokens and
+everything else stay on the default database, which is also the first
+shard. ``UserShard`` rows on the default database record where a user's
+data is; new users are spread over ``BUDGET_SHARD_ALIASES`` by id when
+they sign up, and users without a row (those from before sharding was
+turned on) stay on the default database, so adding a shard never moves
+anyone.
+
+``ShardRouter`` (in ``budget.routers``) sends a query to the shard of the
+user it is about: the user on the instance hint when Django gives one,
+otherwise the shard pinned with ``use_shard`` or the shard of the
+authenticated user of the current request. Code running outside a request
+for a given user, like commands and background jobs, pins the shard.
+
+``move_user`` relocates a user while they keep using the app: their
+writes are refused (503) while the rows are copied, reads carry on from
+the old shard until the directory points at the new one. Rows keep their
+primary keys, so links to them and ids in queued jobs stay valid: each
+shard hands out keys from its own range of ``SHARD_ID_RANGE`` ids (set
+up by ``reserve_id_range`` when the shard is migrated), and a key that
+is taken anyway makes the move fail before anything changes. SQLite
+hands out keys past the largest one in a table, so there a shard that
+received rows from a shard with a higher range carries on in that range.
+Placements are cached per process for ``BUDGET_SHARD_CACHE_TIMEOUT``
+seconds, which is how long a move waits for every process to notice each
+change; it waits twice, so moving a user takes at least twice that long.
+"""
+import time
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count
+from rest_framework import exceptions
+
+from .authentication import LRUCache
+from .cache import bump_data_version
+from .models import Budget, Category, ImportJob, MonthlyRollup, Transaction, UserProfile, UserShard
+
+# Copied in this order so that foreign keys point at copied rows, deleted in reverse
+SHARDED_MODELS = (Category, Transaction, Budget, MonthlyRollup, ImportJob, UserProfile)
+BATCH_SIZE = 1000
+# Keys of rows created on the shard at index i of BUDGET_SHARD_ALIASES start at i * SHARD_ID_RANGE
+SHARD_ID_RANGE = 2 ** 40
+PLACEMENT_CACHE_SIZE = 10000
+
+Placement = namedtuple('Placement', ['alias', 'moving'])
+DEFAULT_PLACEMENT = Placement(DEFAULT_DB_ALIAS, False)
+
+active_request = ContextVar('budget_shard_request', default=None)
+pinned_shard = ContextVar('budget_pinned_shard', default=None)
+placements = LRUCache()
+
+
+class ShardMoving(exceptions.APIException):
+    status_code = 503
+    default_detail = 'Your data is being moved, please try again shortly.'
+    default_code = 'shard_moving'
+
+
+def shard_aliases():
+    return getattr(settings, 'BUDGET_SHARD_ALIASES', [DEFAULT_DB_ALIAS])
+
+
+def is_sharded():
+    return len(shard_aliases()) > 1
+
+
+def placement_timeout():
+    return getattr(settings, 'BUDGET_SHARD_CACHE_TIMEOUT', 30)
+
+
+def user_placement(user_id):
+    if not is_sharded():
+        return DEFAULT_PLACEMENT
+    placement = placements.get(user_id)
+    if placement is None:
+        row = UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).values_list('alias', 'moving').first()
+        placement = Placement(*row) if row else DEFAULT_PLACEMENT
+        placements.set(user_id, placement, placement_timeout(), PLACEMENT_CACHE_SIZE)
+    return placement
+
+
+def shard_for_user(user_id):
+    return user_placement(user_id).alias
+
+
+def forget_placement(user_id):
+    placements.delete(user_id)
+
+
+def assign_shard(user_id):
+    """Record the shard of a new user."""
+    aliases = shard_aliases()
+    UserShard.objects.using(DEFAULT_DB_ALIAS).get_or_create(
+        user_id=user_id, defaults={'alias': aliases[user_id % len(aliases)]}
+    )
+    forget_placement(user_id)
+
+
+def request_placement():
+    request = active_request.get()
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return user_placement(user.id)
+
+
+def current_placement():
+    """Placement of the pinned shard or of the request's user, ``None`` outside of both."""
+    alias = pinned_shard.get()
+    if alias is not None:
+        return Placement(alias, False)
+    return request_placement()
+
+
+@contextmanager
+def use_shard(alias):
+    """Send queries without an instance hint to ``alias``."""
+    token = pinned_shard.set(alias)
+    try:
+        yield
+    finally:
+        pinned_shard.reset(token)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def reserve_id_range(alias):
+    """Make the sharded tables on ``alias`` hand out keys from the shard's own range."""
+    aliases = shard_aliases()
+    if alias not in aliases or aliases.index(alias) == 0:
+        return
+    start = aliases.index(alias) * SHARD_ID_RANGE
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for model in SHARDED_MODELS:
+            table = model._meta.db_table
+            if connection.vendor == 'sqlite':
+                cursor.execute('UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s', [start, table])
+                if not cursor.rowcount:
+                    cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, start])
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, model._meta.pk.column])
+                sequence = cursor.fetchone()[0]
+                cursor.execute(f'SELECT setval(%s, GREATEST(last_value, %s)) FROM {sequence}', [sequence, start])
+
+
+def copy_rows(queryset, target):
+    """Insert the rows of ``queryset`` on ``target`` under the same primary keys, returning how many."""
+    model = queryset.model
+    # bulk_create would stamp these with the current time
+    auto_now_add = [field.name for field in model._meta.concrete_fields if getattr(field, 'auto_now_add', False)]
+    copied = 0
+    for batch in batches(queryset.order_by('pk').iterator(chunk_size=BATCH_SIZE), BATCH_SIZE):
+        stamps = [[getattr(row, name) for name in auto_now_add] for row in batch]
+        model.objects.using(target).bulk_create(batch)
+        if auto_now_add:
+            for row, values in zip(batch, stamps):
+                for name, value in zip(auto_now_add, values):
+                    setattr(row, name, value)
+            model.objects.using(target).bulk_update(batch, auto_now_add)
+        copied += len(batch)
+    return copied
+
+
+def delete_user_data(user_id, alias):
+    with transaction.atomic(using=alias):
+        for model in reversed(SHARDED_MODELS):
+            model.objects.using(alias).filter(user_id=user_id).delete()
+
+
+def copy_user_data(user_id, source, target):
+    """Copy a user's rows from ``source`` to ``target``, returning the number copied per model."""
+    counts = {}
+    with transaction.atomic(using=target):
+        # Leftovers of an interrupted move
+        delete_user_data(user_id, target)
+        for model in SHARDED_MODELS:
+            counts[model._meta.model_name] = copy_rows(model.objects.using(source).filter(user_id=user_id), target)
+    return counts
+
+
+def move_user(user_id, target, wait=None):
+    """
+    Move a user's data to the ``target`` shard and return the number of
+    rows copied per model. ``wait`` defaults to ``BUDGET_SHARD_CACHE_TIMEOUT``;
+    the call blocks for twice that plus the copy, so run it from a command
+    or a worker rather than a request.
+    """
+    if target not in shard_aliases():
+        raise ValueError(f"Unknown shard '{target}'")
+    if wait is None:
+        wait = placement_timeout()
+    forget_placement(user_id)
+    source = user_placement(user_id).alias
+    if source == target:
+        return {}
+
+    UserShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        user_id=user_id, defaults={'alias': source, 'moving': True}
+    )
+    forget_placement(user_id)
+    # Let every process see the flag and writes already under way finish
+    time.sleep(wait)
+    try:
+        counts = copy_user_data(user_id, source, target)
+    except Exception:
+        UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).update(moving=False)
+        forget_placement(user_id)
+        raise
+
+    UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).update(alias=target, moving=False)
+    forget_placement(user_id)
+    bump_data_version(user_id)
+    # Processes still reading the old shard keep seeing the same data until they catch up
+    time.sleep(wait)
+    delete_user_data(user_id, source)
+    return counts
+
+
+def shard_loads():
+    """``{alias: {user_id: transaction count}}`` over every shard."""
+    loads = {}
+    for alias in shard_aliases():
+        rows = Transaction.objects.using(alias).values_list('user_id').annotate(rows=Count('id')).order_by()
+        loads[alias] = dict(rows)
+    return loads
+
+
+def plan_rebalance(loads):
+    """
+    Moves, as ``(user_id, source, target)``, that even out the transaction
+    counts in ``loads``. Users go from the fullest shard to the emptiest one
+    for as long as some user's move narrows the gap between the two.
+    """
+    loads = {alias: dict(users) for alias, users in loads.items()}
+    totals = defaultdict(int, {alias: sum(users.values()) for alias, users in loads.items()})
+    moves = []
+    while len(loads) > 1:
+        fullest = max(loads, key=lambda alias: totals[alias])
+        emptiest = min(loads, key=lambda alias: totals[alias])
+        gap = totals[fullest] - totals[emptiest]
+        candidates = [(rows, user_id) for user_id, rows in loads[fullest].items() if 0 < rows < gap]
+        if not candidates:
+            break
+        # Moving rows closest to half the gap narrows it the most
+        rows, user_id = min(candidates, key=lambda candidate: (abs(gap - 2 * candidate[0]), candidate[1]))
+        del loads[fullest][user_id]
+        loads[emptiest][user_id] = rows
+        totals[fullest] -= rows
+        totals[emptiest] += rows
+        moves.append((user_id, fullest, emptiest))
+    return moves
@@ -0,0 +1,58 @@
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user_tokens
+from .cache import schedule_version_bump
+from .metrics import install_query_timer
+from .models import Budget, Category, Transaction
+from .sharding import assign_shard, delete_user_data, is_sharded, reserve_id_range, shard_for_user
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Transaction)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_delete, sender=Budget)
+def bump_user_data_version(sender, instance, using, **kwargs):
+    schedule_version_bump(instance.user_id, using=using)
+
+
+@receiver(post_delete, sender=Token)
+def drop_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+# Deleting a user cascades to the token, which is handled above
+@receiver(post_save, sender=User)
+def drop_cached_user_tokens(sender, instance, **kwargs):
+    invalidate_user_tokens(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def place_new_user(sender, instance, created, **kwargs):
+    if created and is_sharded():
+        assign_shard(instance.pk)
+
+
+# Deletion only cascades on the database the user is deleted from
+@receiver(pre_delete, sender=User)
+def delete_sharded_data(sender, instance, **kwargs):
+    alias = shard_for_user(instance.pk)
+    if alias != DEFAULT_DB_ALIAS:
+        delete_user_data(instance.pk, alias)
+
+
+@receiver(post_migrate)
+def reserve_shard_ids(sender, using, **kwargs):
+    if sender.name == 'budget':
+        reserve_id_range(using)
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    install_query_timer(connection)
@@ -0,0 +1,272 @@
+"""
+Aggregation engine behind the reporting endpoints.
+
+Every figure is computed with grouped queries so the number of round trips
+stays fixed no matter how many categories or months a user has. Whole
+months are read from ``MonthlyRollup`` rather than the raw transactions.
+"""
+from datetime import date, datetime
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Q, Sum
+
+from .models import Budget, Category, MonthlyRollup, Transaction
+from .rollups import month_range_filter
+
+DEFAULT_TREND_MONTHS = 6
+MAX_TREND_MONTHS = 120
+MAX_COMPARISON_MONTHS = 36
+
+
+def summary_params(params, today):
+    """Validate summary query parameters, raising ``ValueError`` on bad input."""
+    # Default to the current month
+    start_date_str = params.get('start_date')
+    end_date_str = params.get('end_date')
+    if start_date_str and end_date_str:
+        try:
+            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError("Invalid date format. Use YYYY-MM-DD")
+    else:
+        start_date = today.replace(day=1)
+        end_date = today
+
+    # Length of the monthly trend, six months unless requested otherwise
+    trend_months = params.get('trend_months')
+    if trend_months:
+        try:
+            trend_months = int(trend_months)
+        except ValueError:
+            trend_months = 0
+        if not 1 <= trend_months <= MAX_TREND_MONTHS:
+            raise ValueError(f"trend_months must be between 1 and {MAX_TREND_MONTHS}")
+    else:
+        trend_months = DEFAULT_TREND_MONTHS
+
+    return {'start_date': start_date, 'end_date': end_date, 'today': today, 'trend_months': trend_months}
+
+
+def comparison_params(params, today):
+    """Validate budget comparison query parameters, raising ``ValueError`` on bad input."""
+    # Accept a single month or a from/to month range, default to current month
+    month_param = params.get('month')
+    from_param = params.get('from') or params.get('to')
+    to_param = params.get('to') or from_param
+    try:
+        if from_param:
+            first_month = datetime.strptime(from_param, '%Y-%m').date()
+            last_month = datetime.strptime(to_param, '%Y-%m').date()
+        elif month_param:
+            first_month = last_month = datetime.strptime(month_param, '%Y-%m').date()
+        else:
+            first_month = last_month = today.replace(day=1)
+    except ValueError:
+        raise ValueError("Invalid month format. Use YYYY-MM")
+
+    if not 1 <= month_span(first_month, last_month) <= MAX_COMPARISON_MONTHS:
+        raise ValueError(f"Month range must cover between 1 and {MAX_COMPARISON_MONTHS} months")
+
+    return {'from': first_month, 'to': last_month}
+
+
+def month_starts(first_month, count):
+    """Return ``count`` consecutive first-of-month dates starting at ``first_month``."""
+    return [first_month + relativedelta(months=i) for i in range(count)]
+
+
+def month_span(first_month, last_month):
+    """Number of months from ``first_month`` to ``last_month`` inclusive."""
+    return (last_month.year - first_month.year) * 12 + last_month.month - first_month.month + 1
+
+
+def full_month_bounds(start_date, end_date):
+    """
+    Split a date range into the whole calendar months it covers and the
+    partial days left over at either end.
+
+    Returns ``(first_month, last_month, edges)`` where the months are
+    first-of-month dates (``None`` when no whole month is covered) and
+    ``edges`` is a list of ``(start, end)`` date ranges to read from the
+    raw transactions.
+    """
+    first_month = start_date if start_date.day == 1 else start_date.replace(day=1) + relativedelta(months=1)
+    after_end = end_date + relativedelta(days=1)
+    last_month = end_date.replace(day=1) if after_end.day == 1 else end_date.replace(day=1) - relativedelta(months=1)
+    if first_month > last_month:
+        return None, None, [(start_date, end_date)]
+
+    edges = []
+    if start_date < first_month:
+        edges.append((start_date, first_month - relativedelta(days=1)))
+    if after_end.day != 1:
+        edges.append((end_date.replace(day=1), end_date))
+    return first_month, last_month, edges
+
+
+def category_totals(user, start_date, end_date):
+    """
+    Per-category sums for ``user`` between two dates (inclusive), in category order.
+
+    Whole months are read from the monthly rollups, so only the partial
+    months at the edges of the range touch the raw transactions.
+    """
+    first_month, last_month, edges = full_month_bounds(start_date, end_date)
+    totals = {}
+
+    def merge(rows):
+        for row in rows:
+            key = (row['category_id'], row['category__name'], row['category__type'])
+            totals[key] = totals.get(key, 0) + (row['total'] or 0)
+
+    if first_month:
+        merge(
+            MonthlyRollup.objects.filter(
+                month_range_filter(first_month, last_month),
+                user=user,
+                category__user=user
+            ).values('category_id', 'category__name', 'category__type')
+            .annotate(total=Sum('total'))
+            .order_by()
+        )
+    if edges:
+        in_edges = Q()
+        for edge in edges:
+            in_edges |= Q(date__range=edge)
+        merge(
+            Transaction.objects.filter(
+                in_edges,
+                user=user,
+                category__user=user
+            ).values('category_id', 'category__name', 'category__type')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+
+    return [
+        {'category_id': category_id, 'category__name': name, 'category__type': type, 'total': total}
+        for (category_id, name, type), total in sorted(totals.items())
+    ]
+
+
+def monthly_trend(user, today, months=DEFAULT_TREND_MONTHS):
+    """Income and expenses for the ``months`` months ending with the month of ``today``."""
+    first_month = (today - relativedelta(months=months - 1)).replace(day=1)
+
+    rows = MonthlyRollup.objects.filter(
+        month_range_filter(first_month, today.replace(day=1)),
+        user=user,
+        category__user=user
+    ).values('year', 'month').annotate(
+        income=Sum('total', filter=Q(category__type='income')),
+        expenses=Sum('total', filter=Q(category__type='expense')),
+    ).order_by()
+    by_month = {date(row['year'], row['month'], 1): row for row in rows}
+
+    # Zero-fill months without any transactions
+    trend = []
+    for month_start in month_starts(first_month, months):
+        row = by_month.get(month_start, {})
+        trend.append({
+            'month': month_start.strftime('%Y-%m'),
+            'income': row.get('income') or 0,
+            'expenses': row.get('expenses') or 0,
+        })
+    return trend
+
+
+def summarize(category_rows, trend):
+    """Build the payload rendered by ``FinancialSummarySerializer`` from ``category_totals`` rows and a trend."""
+    total_income = 0
+    total_expenses = 0
+    expenses_by_category = []
+    for row in category_rows:
+        amount = row['total'] or 0
+        if row['category__type'] == 'income':
+            total_income += amount
+        elif row['category__type'] == 'expense':
+            total_expenses += amount
+            if amount > 0:
+                expenses_by_category.append({
+                    'category': row['category__name'],
+                    'amount': amount
+                })
+
+    return {
+        'total_income': total_income,
+        'total_expenses': total_expenses,
+        'net_balance': total_income - total_expenses,
+        'expenses_by_category': expenses_by_category,
+        'monthly_trend': trend
+    }
+
+
+def build_financial_summary(user, start_date, end_date, today, trend_months=DEFAULT_TREND_MONTHS):
+    """Build the payload rendered by ``FinancialSummarySerializer``."""
+    return summarize(category_totals(user, start_date, end_date), monthly_trend(user, today, trend_months))
+
+
+def expense_categories(user):
+    return list(
+        Category.objects.filter(user=user, type='expense').order_by('id').values_list('id', 'name')
+    )
+
+
+def budget_amounts(user, first_month, last_month):
+    """Budgeted amounts keyed by ``(category_id, year, month)``, for whole years covering the range."""
+    return {
+        (category_id, year, int(month)): amount
+        for category_id, year, month, amount in Budget.objects.filter(
+            user=user,
+            category__type='expense',
+            year__range=[first_month.year, last_month.year]
+        ).values_list('category_id', 'year', 'month', 'amount')
+    }
+
+
+def actual_amounts(user, first_month, last_month):
+    """Spending keyed by ``(category_id, first-of-month date)`` from the monthly rollups."""
+    return {
+        (category_id, date(year, month, 1)): total
+        for category_id, year, month, total in MonthlyRollup.objects.filter(
+            month_range_filter(first_month, last_month),
+            user=user,
+            category__user=user,
+            category__type='expense'
+        ).values_list('category_id', 'year', 'month', 'total')
+    }
+
+
+def compare_budgets(first_month, last_month, categories, budgets, actuals):
+    result = []
+    for month_start in month_starts(first_month, month_span(first_month, last_month)):
+        for category_id, category_name in categories:
+            budget_amount = budgets.get((category_id, month_start.year, month_start.month), 0)
+            actual_amount = actuals.get((category_id, month_start), 0)
+            result.append({
+                'category_id': category_id,
+                'category_name': category_name,
+                'budget_amount': budget_amount,
+                'actual_amount': actual_amount,
+                'difference': budget_amount - actual_amount,
+                'year': month_start.year,
+                'month': month_start.month
+            })
+    return result
+
+
+def budget_comparison(user, first_month, last_month):
+    """
+    Budget vs. actual spending for every expense category and every month
+    from ``first_month`` to ``last_month`` (both first-of-month dates).
+
+    Runs three queries regardless of category count or range length:
+    the categories, the budgets in range and the monthly rollups.
+    """
+    return compare_budgets(
+        first_month, last_month,
+        expense_categories(user),
+        budget_amounts(user, first_month, last_month),
+        actual_amounts(user, first_month, last_month)
+    )
@@ -1,3 +1,1698 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from dateutil.relativedelta import relativedelta
+
+import brotli
+import msgpack
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from . import async_views, jobs, rollups, views
+from .authentication import CachedTokenAuthentication, LRUCache, local_tokens
+from .benchmarks.endpoints import endpoint_calls, find_regressions, run_endpoint_benchmarks
+from .benchmarks.money import bench_money
+from .benchmarks.seed import seed_user
+from .cache import VERSION_KEY, cache_stats, get_cache, get_data_version
+from .filters import filter_transactions
+from .importers import run_import
+from .metrics import LATENCY, QUERIES, REQUESTS
+from .middleware import choose_encoding
+from .models import Budget, Category, ImportJob, Job, MonthlyRollup, Transaction, UserProfile, UserShard
+from .pagination import TransactionKeysetPagination
+from .query_plans import QueryPlanAssertionsMixin, full_table_scans
+from .renderers import decode_ext, encode_ext
+from .routers import ReplicaRouter, use_replica
+from .search import fts5_query, search_backend, search_terms
+from .series import bucket_starts
+from .serializers import BudgetSerializer, TransactionSerializer
+from .sharding import SHARD_ID_RANGE, move_user, placements, plan_rebalance, shard_for_user
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, BUDGET_RESPONSE_CACHE_TIMEOUT=0)
+class BudgetAPITestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def make_category(self, name, type='expense', user=None):
+        return Category.objects.create(name=name, type=type, user=user or self.user)
+
+    def make_transaction(self, category, amount, day, description=''):
+        instance = Transaction.objects.create(
+            user=category.user, category=category, amount=Decimal(amount),
+            date=day, description=description
+        )
+        rollups.record_created(instance)
+        return instance
+
+
+class FinancialSummaryViewTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.salary = self.make_category('Salary', 'income')
+        self.rent = self.make_category('Rent')
+        self.food = self.make_category('Food')
+        self.make_transaction(self.salary, '3000.00', date(2025, 3, 1))
+        self.make_transaction(self.rent, '1200.00', date(2025, 3, 2))
+        self.make_transaction(self.food, '45.50', date(2025, 3, 10))
+        self.make_transaction(self.food, '20.00', date(2025, 2, 10))
+
+    def get_summary(self, **params):
+        params.setdefault('start_date', '2025-03-01')
+        params.setdefault('end_date', '2025-03-31')
+        return self.client.get(reverse('financial-summary'), params)
+
+    def test_totals_and_categories(self):
+        response = self.get_summary()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_income'], '3000.00')
+        self.assertEqual(response.data['total_expenses'], '1245.50')
+        self.assertEqual(response.data['net_balance'], '1754.50')
+        self.assertEqual(response.data['expenses_by_category'], [
+            {'category': 'Rent', 'amount': Decimal('1200.00')},
+            {'category': 'Food', 'amount': Decimal('45.50')},
+        ])
+
+    def test_monthly_trend_is_zero_filled_and_chronological(self):
+        response = self.get_summary()
+        trend = response.data['monthly_trend']
+        self.assertEqual(len(trend), 6)
+        self.assertEqual(trend, sorted(trend, key=lambda row: row['month']))
+        self.assertTrue(all(set(row) == {'month', 'income', 'expenses'} for row in trend))
+
+    def test_trend_months_parameter(self):
+        response = self.get_summary(trend_months=24)
+        self.assertEqual(len(response.data['monthly_trend']), 24)
+        self.assertEqual(self.get_summary(trend_months=0).status_code, 400)
+        self.assertEqual(self.get_summary(trend_months='x').status_code, 400)
+
+    def test_query_count_does_not_grow_with_categories(self):
+        with self.assertNumQueries(2):
+            self.get_summary()
+        for i in range(40):
+            category = self.make_category(f'Extra {i}')
+            self.make_transaction(category, '1.00', date(2025, 3, 15))
+        with self.assertNumQueries(2):
+            response = self.get_summary()
+        self.assertEqual(len(response.data['expenses_by_category']), 42)
+
+    def test_ignores_other_users(self):
+        bob = User.objects.create_user(username='bob', password='secret')
+        self.make_transaction(self.make_category('Bob food', user=bob), '99.00', date(2025, 3, 5))
+        response = self.get_summary()
+        self.assertEqual(response.data['total_expenses'], '1245.50')
+
+
+class BudgetComparisonViewTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.rent = self.make_category('Rent')
+        self.food = self.make_category('Food')
+        self.make_category('Salary', 'income')
+        Budget.objects.create(user=self.user, category=self.rent, amount=Decimal('1200.00'), month='03', year=2025)
+        Budget.objects.create(user=self.user, category=self.food, amount=Decimal('300.00'), month='04', year=2025)
+        self.make_transaction(self.rent, '1200.00', date(2025, 3, 1))
+        self.make_transaction(self.food, '80.25', date(2025, 3, 20))
+        self.make_transaction(self.food, '50.00', date(2025, 4, 2))
+
+    def get_comparison(self, **params):
+        return self.client.get(reverse('budget-comparison'), params)
+
+    def test_single_month(self):
+        response = self.get_comparison(month='2025-03')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [
+            {'category_id': self.rent.id, 'category_name': 'Rent', 'budget_amount': Decimal('1200.00'),
+             'actual_amount': Decimal('1200.00'), 'difference': Decimal('0.00'), 'year': 2025, 'month': 3},
+            {'category_id': self.food.id, 'category_name': 'Food', 'budget_amount': 0,
+             'actual_amount': Decimal('80.25'), 'difference': Decimal('-80.25'), 'year': 2025, 'month': 3},
+        ])
+
+    def test_month_range(self):
+        response = self.get_comparison(**{'from': '2025-01', 'to': '2025-12'})
+        self.assertEqual(len(response.data), 24)
+        april_food = [row for row in response.data if row['month'] == 4 and row['category_id'] == self.food.id]
+        self.assertEqual(april_food[0]['budget_amount'], Decimal('300.00'))
+        self.assertEqual(april_food[0]['difference'], Decimal('250.00'))
+
+    def test_invalid_ranges(self):
+        self.assertEqual(self.get_comparison(month='2025/03').status_code, 400)
+        self.assertEqual(self.get_comparison(**{'from': '2025-05', 'to': '2025-01'}).status_code, 400)
+        self.assertEqual(self.get_comparison(**{'from': '2020-01', 'to': '2025-01'}).status_code, 400)
+
+    def test_query_count_does_not_grow_with_categories(self):
+        for i in range(30):
+            self.make_category(f'Extra {i}')
+        with self.assertNumQueries(3):
+            response = self.get_comparison(**{'from': '2025-01', 'to': '2025-12'})
+        self.assertEqual(len(response.data), 32 * 12)
+
+
+class MonthlyRollupTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.rent = self.make_category('Rent')
+        self.food = self.make_category('Food')
+
+    def rollup(self, category, year, month):
+        return MonthlyRollup.objects.filter(
+            user=self.user, category=category, year=year, month=month
+        ).values_list('total', 'count').first()
+
+    def test_viewset_writes_maintain_rollups(self):
+        url = reverse('transaction-list')
+        response = self.client.post(url, {'amount': '10.00', 'category': self.food.id, 'date': '2025-03-05'})
+        self.assertEqual(response.status_code, 201)
+        self.client.post(url, {'amount': '5.50', 'category': self.food.id, 'date': '2025-03-09'})
+        self.assertEqual(self.rollup(self.food, 2025, 3), (Decimal('15.50'), 2))
+
+        # Move the first transaction to another category and month
+        detail = reverse('transaction-detail', args=[response.data['id']])
+        self.client.put(detail, {'amount': '12.00', 'category': self.rent.id, 'date': '2025-04-01'})
+        self.assertEqual(self.rollup(self.food, 2025, 3), (Decimal('5.50'), 1))
+        self.assertEqual(self.rollup(self.rent, 2025, 4), (Decimal('12.00'), 1))
+
+        self.client.delete(detail)
+        self.assertEqual(self.rollup(self.rent, 2025, 4), (Decimal('0.00'), 0))
+        self.assertEqual(rollups.verify(), [])
+
+    def test_partial_months_read_raw_transactions(self):
+        self.make_transaction(self.food, '10.00', date(2025, 1, 20))
+        self.make_transaction(self.food, '20.00', date(2025, 2, 14))
+        self.make_transaction(self.food, '40.00', date(2025, 3, 3))
+        self.make_transaction(self.food, '80.00', date(2025, 3, 25))
+        response = self.client.get(reverse('financial-summary'), {'start_date': '2025-01-15', 'end_date': '2025-03-10'})
+        self.assertEqual(response.data['total_expenses'], '70.00')
+
+    def test_rebuild_and_verify_command(self):
+        self.make_transaction(self.food, '10.00', date(2025, 1, 20))
+        Transaction.objects.create(user=self.user, category=self.rent, amount=Decimal('7.00'), date=date(2025, 1, 2))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', verify=True, stdout=StringIO())
+        call_command('rebuild_rollups', stdout=StringIO())
+        call_command('rebuild_rollups', verify=True, stdout=StringIO())
+        self.assertEqual(self.rollup(self.rent, 2025, 1), (Decimal('7.00'), 1))
+
+
+class QueryPlanTests(QueryPlanAssertionsMixin, BudgetAPITestCase):
+    def test_hot_queries_use_indexes(self):
+        category = self.make_category('Food')
+        user = self.user
+        querysets = [
+            Transaction.objects.filter(user=user).order_by('-date'),
+            Transaction.objects.filter(user=user, date__gte='2025-01-01', date__lte='2025-03-31').order_by('-date'),
+            Transaction.objects.filter(user=user, category=category, date__gte='2025-01-01').order_by('-date'),
+            Transaction.objects.filter(user=user, amount__gte=10, amount__lte=50).order_by('-date'),
+            Transaction.objects.filter(user=user, category__type='income').order_by('-date'),
+            Transaction.objects.filter(
+                Q(date__lt='2025-03-01') | Q(date='2025-03-01', id__lt=100), user=user, date__lte='2025-03-01'
+            ).order_by('-date', '-id'),
+            Budget.objects.filter(user=user, month='03', year=2025),
+            Budget.objects.filter(user=user, category=category, month='03', year=2025),
+            MonthlyRollup.objects.filter(user=user, year=2025, month__gte=1),
+        ]
+        for queryset in querysets:
+            with self.subTest(query=str(queryset.query)):
+                self.assertNoFullTableScan(queryset)
+
+    def test_detects_full_scan(self):
+        self.assertEqual(full_table_scans(Transaction.objects.filter(description='rent')), ['budget_transaction'])
+
+
+class TransactionKeysetPaginationTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.food = self.make_category('Food')
+        self.salary = self.make_category('Salary', 'income')
+        # Several rows share a date so the id tie-breaker matters
+        self.transactions = [
+            self.make_transaction(self.food if i % 3 else self.salary, f'{i}.00', date(2025, 1, 1 + i // 4))
+            for i in range(1, 26)
+        ]
+
+    def walk(self, **params):
+        ids = []
+        response = self.client.get(reverse('transaction-list'), {'pagination': 'cursor', **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def expected_ids(self, transactions):
+        return [t.id for t in sorted(transactions, key=lambda t: (t.date, t.id), reverse=True)]
+
+    def test_walks_every_row_once_in_order(self):
+        self.assertEqual(self.walk(page_size=4), self.expected_ids(self.transactions))
+
+    def test_respects_filters(self):
+        expected = self.expected_ids([t for t in self.transactions if t.category == self.food and t.date >= date(2025, 1, 3)])
+        self.assertEqual(self.walk(page_size=3, category=self.food.id, start_date='2025-01-03'), expected)
+
+    def test_page_size_is_capped_and_no_count_query(self):
+        for i in range(250):
+            self.make_transaction(self.food, '1.00', date(2024, 1, 1))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('transaction-list'), {'pagination': 'cursor', 'page_size': 1000})
+        self.assertEqual(len(queries), 1)
+        sql = queries.captured_queries[0]['sql']
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+        self.assertEqual(len(response.data['results']), TransactionKeysetPagination.max_page_size)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('transaction-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_pagination_is_still_the_default(self):
+        response = self.client.get(reverse('transaction-list'))
+        self.assertEqual(response.data['count'], 25)
+
+
+class ListSerializationTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.categories = [self.make_category(f'Category {i}', 'income' if i % 2 else 'expense') for i in range(5)]
+        for i in range(60):
+            category = self.categories[i % 5]
+            self.make_transaction(category, f'{i}.5', date(2025, 1 + i % 12, 1 + i % 28), f'Row {i}')
+            if i < 12:
+                Budget.objects.create(user=self.user, category=category, amount=Decimal(f'{i}00.1'), month=f'{i + 1:02d}', year=2025)
+
+    def test_matches_model_serializer_output(self):
+        cases = (
+            ('transaction-list', Transaction, TransactionSerializer),
+            ('budget-list', Budget, BudgetSerializer),
+        )
+        for name, model, serializer_class in cases:
+            with self.subTest(endpoint=name):
+                response = self.client.get(reverse(name))
+                rows = {row['id']: row for row in response.json()['results']}
+                expected = serializer_class(model.objects.filter(pk__in=rows), many=True).data
+                self.assertEqual(len(rows), len(expected))
+                for row in expected:
+                    self.assertEqual(rows[row['id']], json.loads(json.dumps(row)))
+
+    def test_query_count_per_page_does_not_depend_on_rows(self):
+        # One COUNT and one joined page query, however many rows or categories
+        for name in ('transaction-list', 'budget-list'):
+            with self.subTest(endpoint=name), self.assertNumQueries(2):
+                self.client.get(reverse(name))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('transaction-list'), {'pagination': 'cursor'})
+
+
+class TransactionBulkTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.food = self.make_category('Food')
+        self.rent = self.make_category('Rent')
+        self.url = reverse('transaction-bulk')
+
+    def test_create_update_delete_in_one_request(self):
+        keep = self.make_transaction(self.food, '10.00', date(2025, 3, 1))
+        gone = self.make_transaction(self.food, '20.00', date(2025, 3, 2))
+        response = self.client.post(self.url, {
+            'create': [
+                {'amount': '5.00', 'category': self.rent.id, 'date': '2025-03-03', 'description': 'a'},
+                {'amount': '7.25', 'category': str(self.food.id), 'date': '2025-04-01'},
+            ],
+            'update': [{'id': keep.id, 'amount': '11.00', 'category': self.rent.id}],
+            'delete': [gone.id],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['status'] for row in response.data['create']], ['created', 'created'])
+        self.assertEqual(response.data['update'], [{'index': 0, 'id': keep.id, 'status': 'updated'}])
+        self.assertEqual(response.data['delete'], [{'index': 0, 'id': gone.id, 'status': 'deleted'}])
+
+        keep.refresh_from_db()
+        self.assertEqual((keep.amount, keep.category_id), (Decimal('11.00'), self.rent.id))
+        self.assertFalse(Transaction.objects.filter(id=gone.id).exists())
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(rollups.verify(), [])
+
+    def test_rejects_whole_batch_with_per_item_errors(self):
+        other = self.make_category('Other', user=User.objects.create_user(username='bob'))
+        response = self.client.post(self.url, {
+            'create': [
+                {'amount': '5.00', 'category': self.food.id},
+                {'amount': 'abc', 'category': self.food.id},
+                {'amount': '1.00', 'category': other.id},
+            ],
+            'delete': [999999],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']['create']], [1, 2])
+        self.assertEqual(response.data['errors']['delete'][0]['index'], 0)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_query_count_is_independent_of_batch_size(self):
+        creates = [
+            {'amount': '1.00', 'category': self.food.id if i % 2 else self.rent.id, 'date': f'2025-{1 + i % 12:02d}-01'}
+            for i in range(1000)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'create': creates}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(len(queries), 15)
+        self.assertEqual(Transaction.objects.count(), 1000)
+        self.assertEqual(rollups.verify(), [])
+
+
+STATEMENT_CSV = """Date,Description,Amount,Category
+2025-03-01,ACME PAYROLL,2500.00,Salary
+2025-03-02,Uber trip 123,-18.40,
+2025-03-02,Corner shop,-4.10,Food
+2025-03-03,Mystery,-9.99,
+not-a-date,Broken,-1.00,
+"""
+
+STATEMENT_OFX = """OFXHEADER:100
+DATA:OFXSGML
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20250305120000[-5:EST]
+<TRNAMT>-42.00
+<FITID>1
+<NAME>UBER EATS
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250306<TRNAMT>100.00<FITID>2<NAME>Refund</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+@override_settings(BUDGET_IMPORT_IN_BACKGROUND=False)
+class StatementImportTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.food = self.make_category('Food')
+        self.transport = self.make_category('Transport')
+        self.salary = self.make_category('Salary', 'income')
+        self.rules = [{'contains': 'uber', 'category': 'Transport', 'direction': 'out'}]
+
+    def upload(self, name, content, **data):
+        data.setdefault('rules', json.dumps(self.rules))
+        statement = SimpleUploadedFile(name, content.encode())
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('import-list'), {'file': statement, **data}, format='multipart')
+
+    def test_csv_import_maps_categories_and_records_progress(self):
+        response = self.upload('march.csv', STATEMENT_CSV)
+        self.assertEqual(response.status_code, 202)
+        job = ImportJob.objects.get(pk=response.data['id'])
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(
+            (job.rows_processed, job.rows_imported, job.rows_unmatched, job.rows_invalid),
+            (5, 3, 1, 1)
+        )
+        uber = Transaction.objects.get(description='Uber trip 123')
+        self.assertEqual((uber.category, uber.amount), (self.transport, Decimal('18.40')))
+        self.assertEqual(rollups.verify(), [])
+
+        status_response = self.client.get(reverse('import-detail', args=[job.pk]))
+        self.assertEqual(status_response.data['rows_imported'], 3)
+
+    def test_reimport_skips_existing_rows(self):
+        self.make_transaction(self.food, '4.10', date(2025, 3, 2), 'corner  SHOP')
+        self.upload('march.csv', STATEMENT_CSV, default_category=self.food.id)
+        response = self.upload('march-again.csv', STATEMENT_CSV, default_category=self.food.id)
+        job = ImportJob.objects.get(pk=response.data['id'])
+        self.assertEqual((job.rows_imported, job.rows_duplicate), (0, 4))
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 4)
+
+    def test_retried_import_resumes_after_the_processed_rows(self):
+        self.make_transaction(self.food, '4.10', date(2025, 3, 2), 'corner  SHOP')
+        job = ImportJob.objects.create(user=self.user, format='csv', rules=self.rules, default_category=self.food)
+
+        def worker_dies():
+            # Escapes run_import the way a killed worker would
+            raise SystemExit(1)
+
+        with self.assertRaises(SystemExit):
+            run_import(job, BytesIO(STATEMENT_CSV.encode()), chunk_size=2, on_chunk=worker_dies)
+        job = ImportJob.objects.get(pk=job.pk)
+        self.assertEqual((job.status, job.rows_processed), ('running', 2))
+
+        # Rows imported by the first attempt are neither imported again nor counted as duplicates
+        job = run_import(job, BytesIO(STATEMENT_CSV.encode()), chunk_size=2)
+        self.assertEqual(
+            (job.status, job.rows_processed, job.rows_imported, job.rows_duplicate, job.rows_invalid),
+            ('completed', 5, 3, 1, 1)
+        )
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(rollups.verify(), [])
+
+    def test_ofx_import(self):
+        response = self.upload('bank.ofx', STATEMENT_OFX, default_category=self.salary.id)
+        job = ImportJob.objects.get(pk=response.data['id'])
+        self.assertEqual((job.format, job.rows_imported), ('ofx', 2))
+        self.assertEqual(
+            sorted(Transaction.objects.values_list('description', 'category__name', 'date')),
+            [('Refund', 'Salary', date(2025, 3, 6)), ('UBER EATS', 'Transport', date(2025, 3, 5))]
+        )
+
+    def test_rejects_bad_rules(self):
+        response = self.upload('march.csv', STATEMENT_CSV, rules=json.dumps([{'category': 'Food'}]))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ImportJob.objects.exists())
+
+    def test_management_command_streams_in_chunks(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as statement:
+            statement.write('date,amount,description\n')
+            for i in range(250):
+                statement.write(f'2025-01-{1 + i % 28:02d},-{i}.50,Row {i}\n')
+        self.addCleanup(os.unlink, statement.name)
+
+        out = StringIO()
+        call_command('import_statement', 'alice', statement.name, default_category='Food', chunk_size=100, stdout=out)
+        self.assertIn('250 imported', out.getvalue())
+        self.assertEqual(Transaction.objects.filter(category=self.food).count(), 250)
+        self.assertEqual(rollups.verify(), [])
+
+
+class TransactionExportTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.food = self.make_category('Food')
+        self.salary = self.make_category('Salary', 'income')
+        self.make_transaction(self.food, '4.10', date(2025, 3, 2), 'Corner, "shop"')
+        self.make_transaction(self.salary, '2500.00', date(2025, 3, 1), 'Payroll')
+        self.make_transaction(self.food, '12.00', date(2025, 2, 1), 'Café')
+
+    def export(self, **params):
+        response = self.client.get(reverse('transaction-export'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        rows = list(csv.reader(StringIO(self.export())))
+        self.assertEqual(rows[0], ['id', 'date', 'amount', 'category', 'category_name', 'category_type', 'description'])
+        self.assertEqual([row[6] for row in rows[1:]], ['Corner, "shop"', 'Payroll', 'Café'])
+        self.assertEqual(rows[2][1:3], ['2025-03-01', '2500.00'])
+
+    def test_ndjson_with_filters(self):
+        lines = self.export(export_format='ndjson', transaction_type='expense', start_date='2025-03-01').splitlines()
+        self.assertEqual([json.loads(line)['description'] for line in lines], ['Corner, "shop"'])
+        self.assertEqual(json.loads(lines[0])['amount'], '4.10')
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('transaction-export'), {'export_format': 'xls'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(BUDGET_RESPONSE_CACHE_TIMEOUT=60)
+class ResponseCacheTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        get_cache().clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = self.make_category('Food')
+            self.make_transaction(self.food, '10.00', date(2025, 3, 5))
+        self.params = {'start_date': '2025-03-01', 'end_date': '2025-03-31'}
+
+    def get_summary(self):
+        return self.client.get(reverse('financial-summary'), self.params)
+
+    def test_repeat_requests_skip_the_database(self):
+        first = self.get_summary()
+        self.client.get(reverse('budget-comparison'), {'month': '2025-03'})
+        with self.assertNumQueries(0):
+            second = self.get_summary()
+            self.client.get(reverse('budget-comparison'), {'month': '2025-03'})
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(cache_stats()['hits'], 2)
+
+    def test_writes_invalidate_after_commit(self):
+        self.get_summary()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('transaction-list'), {
+                'amount': '5.00', 'category': self.food.id, 'date': '2025-03-06'
+            })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_summary().data['total_expenses'], '15.00')
+
+    def test_version_bump_waits_for_commit_and_is_registered_once(self):
+        version = get_data_version(self.user.id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.make_transaction(self.food, '1.00', date(2025, 3, 7))
+            self.make_transaction(self.food, '2.00', date(2025, 3, 8))
+            Budget.objects.create(user=self.user, category=self.food, amount=Decimal('50.00'), month='03', year=2025)
+        self.assertEqual(get_data_version(self.user.id), version)
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertNotEqual(get_data_version(self.user.id), version)
+
+    def test_users_do_not_share_entries(self):
+        self.get_summary()
+        bob = User.objects.create_user(username='bob', password='secret')
+        self.client.force_authenticate(user=bob)
+        self.assertEqual(self.get_summary().data['total_expenses'], '0.00')
+
+
+@override_settings(BUDGET_CONDITIONAL_GET=True)
+class ConditionalGetTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        get_cache().clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = self.make_category('Food')
+            self.make_transaction(self.food, '10.00', date(2025, 3, 5))
+
+    def test_list_endpoints_answer_if_none_match_without_queries(self):
+        for name in ('category-list', 'transaction-list', 'budget-list', 'financial-summary', 'budget-comparison'):
+            with self.subTest(endpoint=name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Last-Modified', response)
+                self.assertIn('Authorization', response['Vary'])
+                etag = response['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+
+    def test_writes_change_the_etag(self):
+        url = reverse('transaction-list')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'amount': '1.00', 'category': self.food.id, 'date': '2025-03-06'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @override_settings(BUDGET_CONDITIONAL_GET=False)
+    def test_off_without_shared_data_versions(self):
+        url = reverse('transaction-list')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_etag_depends_on_user_and_query(self):
+        url = reverse('transaction-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, {'category': self.food.id}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.client.force_authenticate(user=User.objects.create_user(username='bob'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_date_defaults_change_the_etag(self):
+        # New Year's Eve after the data was written
+        midnight = datetime(timezone.now().year + 1, 1, 1, tzinfo=dt_timezone.utc)
+        before = midnight - timedelta(minutes=30)
+        after = midnight + timedelta(minutes=30)
+        for name in ('financial-summary', 'budget-comparison'):
+            with self.subTest(endpoint=name):
+                with mock.patch('django.utils.timezone.now', return_value=before):
+                    response = self.client.get(reverse(name))
+                    self.assertEqual(
+                        self.client.get(reverse(name), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304
+                    )
+                # No writes since, but the defaults now cover another month
+                with mock.patch('django.utils.timezone.now', return_value=after):
+                    revalidated = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(revalidated.status_code, 200)
+                self.assertNotEqual(revalidated['ETag'], response['ETag'])
+                self.assertEqual(revalidated['Last-Modified'], midnight.strftime('%a, %d %b %Y %H:%M:%S GMT'))
+
+
+class CachedTokenAuthenticationTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        local_tokens.clear()
+        get_cache().clear()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_warm_requests_skip_the_token_query(self):
+        url = reverse('category-list')
+        with CaptureQueriesContext(connection) as cold:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as warm:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(warm), len(cold) - 1)
+        self.assertFalse(any('authtoken_token' in query['sql'] for query in warm.captured_queries))
+
+    def test_deleted_token_is_rejected(self):
+        url = reverse('category-list')
+        self.client.get(url)
+        self.token.delete()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        url = reverse('category-list')
+        self.client.get(url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_saving_the_cached_user_only_writes_loaded_fields(self):
+        User.objects.filter(pk=self.user.pk).update(first_name='Alice')
+        user, token = CachedTokenAuthentication().authenticate(self.request)
+        self.assertEqual(token.key, self.token.key)
+        user.email = 'new@example.com'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.email, self.user.first_name), ('new@example.com', 'Alice'))
+        self.assertTrue(self.user.check_password('secret'))
+
+    @override_settings(BUDGET_TOKEN_CACHE_SHARED=True)
+    def test_shared_tier_fills_other_processes(self):
+        CachedTokenAuthentication().authenticate(self.request)
+        local_tokens.clear()
+        with self.assertNumQueries(0):
+            user, _ = CachedTokenAuthentication().authenticate(self.request)
+        self.assertEqual(user.pk, self.user.pk)
+        self.token.delete()
+        local_tokens.clear()
+        with self.assertRaises(AuthenticationFailed):
+            CachedTokenAuthentication().authenticate(self.request)
+
+    @override_settings(BUDGET_TOKEN_CACHE_TIMEOUT=0)
+    def test_timeout_zero_disables_the_cache(self):
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                CachedTokenAuthentication().authenticate(self.request)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('run_benchmarks', 'token-auth', iterations=5, stdout=out)
+        self.assertIn('CachedTokenAuthentication', out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='benchmark-').exists())
+
+    def test_lru_is_bounded(self):
+        cache = LRUCache()
+        for key in 'abc':
+            cache.set(key, key, timeout=60, max_size=2)
+        cache.get('b')
+        cache.set('d', 'd', timeout=60, max_size=2)
+        self.assertEqual((cache.get('a'), cache.get('c'), cache.get('b')), (None, None, 'b'))
+        cache.set('e', 'e', timeout=-1, max_size=2)
+        self.assertIsNone(cache.get('e'))
+
+
+class AsyncReportingViewMixin:
+    def make_fixtures(self):
+        self.user = User.objects.create_user(username='carol')
+        salary = Category.objects.create(name='Salary', type='income', user=self.user)
+        food = Category.objects.create(name='Food', type='expense', user=self.user)
+        for category, amount, day in ((salary, '3000.00', date(2025, 3, 1)), (food, '45.50', date(2025, 3, 10)),
+                                      (food, '20.00', date(2025, 2, 10))):
+            rollups.record_created(Transaction.objects.create(
+                user=self.user, category=category, amount=Decimal(amount), date=day
+            ))
+        Budget.objects.create(user=self.user, category=food, amount=Decimal('100.00'), month='03', year=2025)
+
+    def request(self, method='get', data=None, **params):
+        factory = APIRequestFactory()
+        request = factory.put('/', data, format='json') if method == 'put' else factory.get('/', params)
+        force_authenticate(request, user=self.user)
+        return request
+
+    async def assert_same_response(self, sync_view, async_view, **params):
+        expected = await sync_to_async(sync_view.as_view())(self.request(**params))
+        response = await async_view.as_view()(self.request(**params))
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.render().content, expected.render().content)
+        return response
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, BUDGET_RESPONSE_CACHE_TIMEOUT=0, BUDGET_ASYNC_CONCURRENT_QUERIES=False)
+class AsyncReportingViewTests(AsyncReportingViewMixin, TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.make_fixtures()
+
+    async def test_summary_matches_sync_view(self):
+        response = await self.assert_same_response(
+            views.FinancialSummaryView, async_views.AsyncFinancialSummaryView,
+            start_date='2025-03-01', end_date='2025-03-31', trend_months=3
+        )
+        self.assertEqual(json.loads(response.content)['net_balance'], '2954.50')
+        await self.assert_same_response(
+            views.FinancialSummaryView, async_views.AsyncFinancialSummaryView, trend_months='nope'
+        )
+
+    async def test_budget_comparison_matches_sync_view(self):
+        await self.assert_same_response(
+            views.BudgetComparisonView, async_views.AsyncBudgetComparisonView, **{'from': '2025-02', 'to': '2025-03'}
+        )
+
+    async def test_profile(self):
+        await self.assert_same_response(views.ProfileView, async_views.AsyncProfileView)
+        response = await async_views.AsyncProfileView.as_view()(self.request('put', {'email': 'carol@example.com'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await User.objects.aget(pk=self.user.pk)).email, 'carol@example.com')
+
+    @override_settings(BUDGET_RESPONSE_CACHE_TIMEOUT=60, BUDGET_CONDITIONAL_GET=True)
+    async def test_conditional_get(self):
+        response = await async_views.AsyncFinancialSummaryView.as_view()(self.request())
+        request = self.request()
+        request.META['HTTP_IF_NONE_MATCH'] = response['ETag']
+        self.assertEqual((await async_views.AsyncFinancialSummaryView.as_view()(request)).status_code, 304)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, BUDGET_RESPONSE_CACHE_TIMEOUT=0, BUDGET_ASYNC_CONCURRENT_QUERIES=True)
+class ConcurrentQueryTests(AsyncReportingViewMixin, TransactionTestCase):
+    def setUp(self):
+        self.make_fixtures()
+
+    async def test_concurrent_queries_match_sync_views(self):
+        await self.assert_same_response(
+            views.FinancialSummaryView, async_views.AsyncFinancialSummaryView,
+            start_date='2025-02-15', end_date='2025-03-31'
+        )
+        await self.assert_same_response(
+            views.BudgetComparisonView, async_views.AsyncBudgetComparisonView, **{'from': '2025-01', 'to': '2025-03'}
+        )
+
+
+class ExpenseForecastTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        get_cache().clear()
+        self.this_month = timezone.now().date().replace(day=1)
+        self.months = [self.this_month - relativedelta(months=i) for i in range(24, 0, -1)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flat = self.make_category('Rent')
+            self.growing = self.make_category('Groceries')
+            self.seasonal = self.make_category('Heating')
+            self.make_category('Salary', 'income')
+        for i, month in enumerate(self.months):
+            for category, total in ((self.flat, 500), (self.growing, 100 + 10 * i),
+                                    (self.seasonal, (month.month * 37) % 11 * 10)):
+                MonthlyRollup.objects.create(
+                    user=self.user, category=category, year=month.year, month=month.month,
+                    total=Decimal(total), count=1
+                )
+
+    def forecast(self, **params):
+        response = self.client.get(reverse('predict-expenses'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_picks_the_model_that_fits_each_category(self):
+        data = self.forecast(months=3)
+        self.assertEqual(data['months'], [(self.this_month + relativedelta(months=i)).strftime('%Y-%m') for i in range(3)])
+        self.assertEqual(data['history']['months'], 24)
+        by_name = {row['category_name']: row for row in data['categories']}
+        self.assertNotIn('Salary', by_name)
+
+        rent = by_name['Rent']
+        self.assertEqual(rent['forecast'][0], {'month': data['months'][0], 'amount': '500.00', 'lower': '500.00', 'upper': '500.00'})
+
+        groceries = by_name['Groceries']
+        self.assertEqual(groceries['model'], 'linear_trend')
+        self.assertEqual([point['amount'] for point in groceries['forecast']], ['340.00', '350.00', '360.00'])
+
+        heating = by_name['Heating']
+        self.assertEqual(heating['model'], 'seasonal_naive')
+        expected = [f"{(month.month * 37) % 11 * 10:.2f}" for month in self.months[-12:-9]]
+        self.assertEqual([point['amount'] for point in heating['forecast']], expected)
+
+        self.assertEqual(data['total'][0]['amount'], f"{500 + 340 + float(expected[0]):.2f}")
+
+    def test_bands_widen_with_the_horizon(self):
+        data = self.forecast(months=6, method='exponential_smoothing', confidence=0.8)
+        groceries = next(row for row in data['categories'] if row['category_name'] == 'Groceries')
+        widths = [Decimal(point['upper']) - Decimal(point['lower']) for point in groceries['forecast']]
+        self.assertGreater(widths[0], 0)
+        self.assertEqual(widths, sorted(widths))
+        self.assertTrue(all(row['model'] == 'exponential_smoothing' for row in data['categories']))
+
+    def test_short_history_falls_back_to_smoothing(self):
+        data = self.forecast(history_months=6, method='seasonal_naive')
+        self.assertTrue(all(row['model'] == 'exponential_smoothing' for row in data['categories']))
+
+    def test_user_without_history(self):
+        self.client.force_authenticate(user=User.objects.create_user(username='bob'))
+        data = self.forecast()
+        self.assertEqual(data['categories'], [])
+        self.assertEqual([row['amount'] for row in data['total']], ['0.00'] * 3)
+
+    def test_invalid_parameters(self):
+        for params in ({'months': 0}, {'months': 'x'}, {'history_months': 500}, {'method': 'magic'}, {'confidence': 1}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('predict-expenses'), params)
+                self.assertEqual(response.status_code, 400)
+
+    @override_settings(BUDGET_RESPONSE_CACHE_TIMEOUT=60)
+    def test_fitted_models_are_cached_per_data_version(self):
+        self.forecast(months=3)
+        with self.assertNumQueries(0):
+            self.forecast(months=12, confidence=0.5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_transaction(self.flat, '10.00', self.months[-1])
+        with self.assertNumQueries(1):
+            self.forecast(months=3)
+
+
+class RecordsQueryTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.food = self.make_category('Food')
+        self.rent = self.make_category('Rent')
+        self.salary = self.make_category('Salary', 'income')
+        self.make_transaction(self.food, '10.00', date(2025, 1, 6), 'Coffee beans')
+        self.make_transaction(self.food, '30.00', date(2025, 1, 8), 'Groceries')
+        self.make_transaction(self.rent, '900.00', date(2025, 1, 1), 'January rent')
+        self.make_transaction(self.food, '25.50', date(2025, 2, 3), 'Coffee shop')
+        self.make_transaction(self.salary, '3000.00', date(2025, 2, 1), 'Payroll')
+        self.make_transaction(self.make_category('Other', user=User.objects.create_user(username='bob')),
+                              '1.00', date(2025, 1, 1))
+
+    def records(self, **params):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('get-records'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_totals_without_grouping(self):
+        data = self.records()
+        self.assertEqual(data, {'fields': ['sum', 'count'], 'columns': {'sum': ['3965.50'], 'count': [5]}, 'rows': 1})
+
+    def test_group_by_month_and_category(self):
+        data = self.records(group_by='month,category', type='expense', aggregates='sum,avg,max')
+        self.assertEqual(data['fields'], ['month', 'category', 'category_name', 'sum', 'avg', 'max'])
+        self.assertEqual(data['columns'], {
+            'month': ['2025-01-01', '2025-01-01', '2025-02-01'],
+            'category': [self.food.id, self.rent.id, self.food.id],
+            'category_name': ['Food', 'Rent', 'Food'],
+            'sum': ['40.00', '900.00', '25.50'],
+            'avg': ['20.00', '900.00', '25.50'],
+            'max': ['30.00', '900.00', '25.50'],
+        })
+
+    def test_group_by_week_with_filters(self):
+        data = self.records(group_by='week', q='coffee', min_amount='5', end_date='2025-02-28', aggregates='count,min')
+        self.assertEqual(data['columns'], {'week': ['2025-01-06', '2025-02-03'], 'count': [1, 1], 'min': ['10.00', '25.50']})
+        data = self.records(group_by='day', category=f'{self.food.id},{self.rent.id}', start_date='2025-01-07')
+        self.assertEqual(data['columns']['day'], ['2025-01-08', '2025-02-03'])
+
+    def test_invalid_parameters(self):
+        for params in ({'group_by': 'year'}, {'aggregates': 'median'}, {'start_date': '01/02/2025'},
+                       {'category': 'food'}, {'type': 'transfer'}, {'max_amount': 'lots'}, {'min_amount': 'NaN'},
+                       {'max_amount': '-Infinity'}, {'min_amount': '1e30'}, {'max_amount': '1e999999'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('get-records'), params).status_code, 400)
+
+
+class MessagePackTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.food = self.make_category('Food')
+        self.make_transaction(self.food, '12.50', date(2025, 3, 5), 'Lunch')
+        Budget.objects.create(user=self.user, category=self.food, amount=Decimal('100.10'), month='03', year=2025)
+
+    def unpack(self, response):
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        return msgpack.unpackb(response.content, ext_hook=decode_ext, raw=False)
+
+    def test_renders_the_same_data_as_json(self):
+        url = reverse('transaction-list')
+        expected = self.client.get(url).json()
+        self.assertEqual(self.unpack(self.client.get(url, HTTP_ACCEPT='application/msgpack')), expected)
+
+    def test_decimals_and_dates_round_trip_exactly(self):
+        response = self.client.get(reverse('budget-comparison'), {'month': '2025-03'}, HTTP_ACCEPT='application/msgpack')
+        row = self.unpack(response)[0]
+        self.assertEqual((row['budget_amount'], row['actual_amount'], row['difference']),
+                         (Decimal('100.10'), Decimal('12.50'), Decimal('87.60')))
+        value = {'when': date(2025, 3, 5), 'amount': Decimal('0.10')}
+        packed = msgpack.packb(value, default=encode_ext, use_bin_type=True)
+        self.assertEqual(msgpack.unpackb(packed, ext_hook=decode_ext, raw=False), value)
+
+    def test_parses_request_bodies(self):
+        body = msgpack.packb(
+            {'amount': Decimal('7.25'), 'category': self.food.id, 'date': date(2025, 3, 9), 'description': 'Snack'},
+            default=encode_ext, use_bin_type=True
+        )
+        response = self.client.post(reverse('transaction-list'), body, content_type='application/msgpack')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['amount'], '7.25')
+        self.assertEqual(response.data['date'], '2025-03-09')
+        response = self.client.post(reverse('transaction-list'), b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(BUDGET_CONDITIONAL_GET=True)
+class CompressionTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        get_cache().clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            food = self.make_category('Food')
+            for i in range(40):
+                self.make_transaction(food, f'{i}.99', date(2025, 1, 1 + i % 28), f'Weekly groceries #{i}')
+
+    def test_negotiates_the_encoding(self):
+        self.assertEqual(choose_encoding('gzip, deflate, br'), 'br')
+        self.assertEqual(choose_encoding('gzip;q=1.0, br;q=0.5'), 'gzip')
+        self.assertEqual(choose_encoding('br;q=0, *'), 'gzip')
+        self.assertIsNone(choose_encoding('identity'))
+        self.assertIsNone(choose_encoding(''))
+
+    def test_compresses_large_responses(self):
+        url = reverse('transaction-list')
+        plain = self.client.get(url)
+        for encoding, decompress in (('gzip', gzip.decompress), ('br', brotli.decompress)):
+            with self.subTest(encoding=encoding):
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+                self.assertEqual(response['Content-Encoding'], encoding)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertLess(len(response.content), len(plain.content))
+                self.assertEqual(decompress(response.content), plain.content)
+                self.assertEqual(response['ETag'], plain['ETag'][:-1] + f'-{encoding}"')
+                # The compressed ETag still validates
+                etag = response['ETag']
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING=encoding, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    @override_settings(BUDGET_COMPRESSION_MIN_SIZE=100000)
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get(reverse('transaction-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streams_compressed_exports(self):
+        url = reverse('transaction-export')
+        plain = b''.join(self.client.get(url).streaming_content)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class EndpointBenchmarkTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        # The export job's file
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.media_root = media_root.name
+        self.seeded = seed_user(200, years=2)
+
+    def test_seeds_the_requested_size(self):
+        self.assertEqual(Transaction.objects.filter(user=self.seeded).count(), 200)
+        self.assertEqual(Category.objects.filter(user=self.seeded).count(), 40)
+        # Reused rather than recreated
+        self.assertEqual(seed_user(200, years=2).pk, self.seeded.pk)
+        self.assertFalse(self.seeded.has_usable_password())
+        self.assertFalse(Token.objects.filter(user=self.seeded).exists())
+
+    def test_covers_every_named_route(self):
+        resolver = get_resolver('budget.urls')
+        names = {name for name in resolver.reverse_dict if isinstance(name, str)}
+        covered = {call.url_name for call in endpoint_calls(self.seeded, 'password')}
+        self.assertEqual(names - covered, set())
+
+    def test_runs_every_endpoint_without_changing_data(self):
+        results = run_endpoint_benchmarks(self.seeded, iterations=1)
+        # The export file it wrote went with the rollback
+        self.assertEqual([files for _, _, files in os.walk(self.media_root) if files], [])
+        self.assertEqual(set(results), {call.label for call in endpoint_calls(self.seeded, 'password')})
+        self.assertGreater(results['transaction-list']['queries'], 0)
+        self.assertEqual(Transaction.objects.filter(user=self.seeded).count(), 200)
+        seeded = User.objects.get(pk=self.seeded.pk)
+        self.assertFalse(seeded.is_staff)
+        # The password and token it signed in with are gone
+        self.assertFalse(seeded.has_usable_password())
+        self.assertFalse(Token.objects.filter(user=seeded).exists())
+
+    def test_finds_regressions(self):
+        baseline = {'a': {'median_ms': 10.0, 'queries': 2}, 'b': {'median_ms': 0.2, 'queries': 1}}
+        results = {'a': {'median_ms': 30.0, 'queries': 3}, 'b': {'median_ms': 0.6, 'queries': 1}}
+        regressions = find_regressions(results, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(regression.startswith('a:') for regression in regressions))
+        self.assertEqual(find_regressions(results, baseline, latency_threshold=4, query_slack=1), [])
+
+    def test_command_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baselines.json')
+            args = ['--size', '200', '--only', 'category-list', '--iterations', '1', '--baseline', path]
+            # Refuses to seed the configured database unless asked to
+            with self.assertRaisesMessage(CommandError, '--allow-write'):
+                call_command('benchmark_endpoints', *args, stdout=StringIO())
+            args.append('--allow-write')
+            call_command('benchmark_endpoints', *args, '--save-baseline', stdout=StringIO())
+            with open(path) as f:
+                baselines = json.load(f)
+            baselines['200']['category-list']['queries'] = 0
+            with open(path, 'w') as f:
+                json.dump(baselines, f)
+            with self.assertRaises(CommandError):
+                call_command('benchmark_endpoints', *args, stdout=StringIO(), stderr=StringIO())
+
+
+class RequestMetricsTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        food = self.make_category('Food')
+        self.make_transaction(food, '12.50', date(2025, 1, 5), 'Lunch')
+
+    def test_records_route_status_and_queries(self):
+        labels = ('GET', 'transaction-list')
+        requests = REQUESTS.values.get(labels + ('200',), 0)
+        queries = QUERIES.values.get(labels, [[0], 0])[1]
+        self.client.get(reverse('transaction-list'))
+        self.assertEqual(REQUESTS.values[labels + ('200',)], requests + 1)
+        self.assertGreater(QUERIES.values[labels][1], queries)
+
+        self.client.get('/api/no-such-route/')
+        self.assertIn(('GET', 'unmatched', '404'), REQUESTS.values)
+
+    @override_settings(BUDGET_METRICS_TOKEN='scrape-secret')
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('transaction-list'))
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE budget_http_request_duration_seconds histogram', body)
+        self.assertIn('budget_http_requests_total{method="GET",route="transaction-list",status="200"}', body)
+        self.assertIn(
+            'budget_http_request_duration_seconds_bucket{method="GET",route="transaction-list",le="+Inf"}', body
+        )
+        self.assertIn('budget_response_cache_hits_total', body)
+        counts = LATENCY.values[('GET', 'transaction-list')][0]
+        self.assertIn(
+            f'budget_http_request_duration_seconds_count{{method="GET",route="transaction-list"}} {sum(counts)}', body
+        )
+
+    @override_settings(BUDGET_METRICS_TOKEN='scrape-secret')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret-')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(BUDGET_METRICS_TOKEN='')
+    def test_metrics_without_a_token_need_staff(self):
+        # API authentication does not reach the plain Django view
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    @override_settings(BUDGET_SLOW_REQUEST_MS=0.001)
+    def test_logs_slow_requests_with_their_sql(self):
+        with self.assertLogs('budget.slow_requests', 'WARNING') as logs:
+            self.client.get(reverse('transaction-list'))
+        self.assertIn('GET /api/transactions/ -> 200', logs.output[0])
+        self.assertIn('FROM "budget_transaction"', logs.output[0])
+
+    def test_slow_log_is_off_by_default(self):
+        with self.assertNoLogs('budget.slow_requests'):
+            self.client.get(reverse('transaction-list'))
+
+
+class TransactionSearchTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        food = self.make_category('Food')
+        self.coffee = self.make_transaction(food, '4.50', date(2025, 1, 3), 'Blue Bottle coffee')
+        self.beans = self.make_transaction(food, '18.00', date(2025, 1, 9), 'Coffee beans from the coffee roaster')
+        self.market = self.make_transaction(food, '62.10', date(2025, 1, 12), 'Corner Market groceries')
+        other = User.objects.create_user(username='other', password='pass')
+        Transaction.objects.create(
+            user=other, category=Category.objects.create(name='Food', type='expense', user=other),
+            amount=Decimal('3.00'), date=date(2025, 1, 4), description='Coffee'
+        )
+
+    def search(self, text, **params):
+        response = self.client.get(reverse('transaction-list'), {'search': text, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_builds_safe_queries(self):
+        self.assertEqual(search_terms('  "Coffee" AND (beans*  '), ['coffee', 'and', 'beans'])
+        self.assertEqual(fts5_query(['coffee', 'be']), '"coffee"* "be"*')
+
+    def test_ranks_matches(self):
+        self.assertEqual(self.search('coffee'), [self.beans.id, self.coffee.id])
+        self.assertEqual(self.search('corner mark'), [self.market.id])
+        self.assertEqual(self.search('roast'), [self.beans.id])
+        self.assertEqual(self.search('tea'), [])
+        self.assertEqual(self.search('!!'), [])
+
+    def test_combines_with_filters_and_cursor_pages(self):
+        self.assertEqual(self.search('coffee', min_amount='10'), [self.beans.id])
+        self.assertEqual(self.search('coffee', pagination='cursor'), [self.beans.id, self.coffee.id])
+
+    def test_index_follows_writes(self):
+        response = self.client.patch(
+            reverse('transaction-detail', args=[self.market.id]), {'description': 'Farmers market'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.search('corner'), [])
+        self.assertEqual(self.search('farmer'), [self.market.id])
+
+        self.client.delete(reverse('transaction-detail', args=[self.coffee.id]))
+        self.assertEqual(self.search('bottle'), [])
+
+        Transaction.objects.bulk_create([Transaction(
+            user=self.user, category=self.market.category, amount=Decimal('1.00'), date=date(2025, 2, 1),
+            description='Bottle deposit'
+        )])
+        self.assertEqual(len(self.search('bottle')), 1)
+
+    def test_uses_the_index(self):
+        if search_backend(connections['default']) != 'fts5':
+            self.skipTest('SQLite without FTS5')
+        with CaptureQueriesContext(connection) as queries:
+            self.search('coffee')
+        self.assertTrue(any('budget_transaction_fts MATCH' in query['sql'] for query in queries.captured_queries))
+
+    def test_match_drives_the_plan(self):
+        if search_backend(connections['default']) != 'fts5':
+            self.skipTest('SQLite without FTS5')
+        queryset = filter_transactions(Transaction.objects.filter(user=self.user), {'search': 'coffee'})
+        # Whether or not the planner has statistics
+        for analyze in (False, True):
+            if analyze:
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            plan = queryset.explain()
+            self.assertIn('SCAN budget_transaction_fts', plan.splitlines()[0])
+            self.assertIn('SEARCH budget_transaction USING INTEGER PRIMARY KEY', plan)
+
+
+class SeriesTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.salary = self.make_category('Salary', 'income')
+        self.food = self.make_category('Food')
+        self.rent = self.make_category('Rent')
+        self.make_transaction(self.salary, '3000.00', date(2025, 1, 31), 'Salary')
+        self.make_transaction(self.food, '12.50', date(2025, 1, 6), 'Lunch')
+        self.make_transaction(self.food, '7.50', date(2025, 1, 12), 'Coffee')
+        self.make_transaction(self.rent, '900.00', date(2025, 3, 1), 'Rent')
+
+    def series(self, **params):
+        response = self.client.get(reverse('series'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_bucket_starts(self):
+        self.assertEqual(bucket_starts(date(2025, 1, 8), date(2025, 1, 20), 'week'),
+                         [date(2025, 1, 6), date(2025, 1, 13), date(2025, 1, 20)])
+        self.assertEqual(bucket_starts(date(2024, 11, 15), date(2025, 4, 1), 'quarter'),
+                         [date(2024, 10, 1), date(2025, 1, 1), date(2025, 4, 1)])
+
+    def test_zero_fills_months(self):
+        data = self.series(granularity='month', start_date='2025-01-01', end_date='2025-04-30')
+        self.assertEqual(data['buckets'], ['2025-01-01', '2025-02-01', '2025-03-01', '2025-04-01'])
+        self.assertEqual(data['income'], ['3000.00', '0.00', '0.00', '0.00'])
+        self.assertEqual(data['expenses'], ['20.00', '0.00', '900.00', '0.00'])
+
+    def test_weeks_start_on_monday(self):
+        data = self.series(granularity='week', start_date='2025-01-01', end_date='2025-01-19')
+        self.assertEqual(data['buckets'], ['2024-12-30', '2025-01-06', '2025-01-13'])
+        self.assertEqual(data['expenses'], ['0.00', '20.00', '0.00'])
+
+    def test_granularities_agree(self):
+        totals = {}
+        for granularity in ('day', 'week', 'month', 'quarter', 'year'):
+            data = self.series(granularity=granularity, start_date='2025-01-10', end_date='2025-03-01')
+            totals[granularity] = (sum(map(Decimal, data['income'])), sum(map(Decimal, data['expenses'])))
+        self.assertEqual(set(totals.values()), {(Decimal('3000.00'), Decimal('907.50'))})
+        self.assertEqual(len(self.series(granularity='day', start_date='2025-01-10', end_date='2025-03-01')['buckets']), 51)
+
+    def test_by_category(self):
+        data = self.series(granularity='quarter', start_date='2025-01-01', end_date='2025-06-30', by_category='true')
+        amounts = {row['name']: row['amounts'] for row in data['categories']}
+        self.assertEqual(amounts, {
+            'Salary': ['3000.00', '0.00'], 'Food': ['20.00', '0.00'], 'Rent': ['900.00', '0.00']
+        })
+
+    def test_fixed_query_count(self):
+        # Authentication is forced, so these are the series queries alone; month
+        # ranges read the rollups plus the partial months at either end
+        with self.assertNumQueries(2):
+            self.series(granularity='day', start_date='2020-01-01', end_date='2025-12-31', by_category='true')
+        with self.assertNumQueries(3):
+            self.series(granularity='month', start_date='2020-01-15', end_date='2025-12-15')
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'granularity': 'hour'}, {'start_date': '2025-13-01'},
+                       {'start_date': '2025-02-01', 'end_date': '2025-01-01'},
+                       {'granularity': 'day', 'start_date': '1990-01-01', 'end_date': '2025-01-01'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('series'), params).status_code, 400)
+
+
+class SQLiteProfileTests(TestCase):
+    def test_connections_use_the_production_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Not using SQLite')
+        expected = {'busy_timeout': 5000, 'cache_size': -32000, 'synchronous': 1, 'temp_store': 2}
+        with connection.cursor() as cursor:
+            for pragma, value in expected.items():
+                cursor.execute(f'PRAGMA {pragma}')
+                self.assertEqual(cursor.fetchone()[0], value, pragma)
+        # Writers take the lock up front instead of upgrading mid-transaction
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False, BUDGET_RESPONSE_CACHE_TIMEOUT=0,
+    BUDGET_REPLICA_ALIASES=['replica'], BUDGET_REPLICA_STICKINESS=5
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    A second SQLite file stands in for the replica; nothing copies rows to it.
+    It is added once the test runner has set up its databases, so it is
+    covered by ``__all__`` without being created as a test database.
+    """
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = {
+            **connections.settings['default'], 'NAME': os.path.join(cls.directory.name, 'replica.sqlite3')
+        }
+        call_command('migrate', database='replica', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.directory.cleanup()
+
+    def setUp(self):
+        get_cache().clear()
+        local_tokens.clear()
+        self.user = User.objects.create_user(username='reader', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        Category.objects.create(user=self.user, name='Primary', type='expense')
+        # The same user on the replica, with rows the primary doesn't have
+        User.objects.using('replica').create(id=self.user.id, username='reader')
+        Category.objects.using('replica').create(user_id=self.user.id, name='Replica', type='expense')
+
+    def settle(self):
+        """Pretend the user's last write was a minute ago."""
+        get_cache().set(VERSION_KEY.format(user_id=self.user.id), time.time_ns() - 60 * 10 ** 9, timeout=None)
+
+    def category_names(self):
+        return [row['name'] for row in self.client.get(reverse('category-list')).data['results']]
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Category), 'default')
+        self.assertEqual(router.db_for_write(Category), 'default')
+        use_replica.set(True)
+        try:
+            self.assertEqual(router.db_for_read(Category), 'replica')
+            self.assertEqual(router.db_for_write(Category), 'default')
+        finally:
+            use_replica.set(False)
+
+    def test_reads_from_the_replica_once_writes_settle(self):
+        self.settle()
+        self.assertEqual(self.category_names(), ['Replica'])
+        self.assertFalse(use_replica.get())
+
+    def test_sticks_to_the_primary_after_a_write(self):
+        self.settle()
+        response = self.client.post(reverse('category-list'), {'name': 'New', 'type': 'expense'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Category.objects.filter(name='New').exists())
+        self.assertFalse(Category.objects.using('replica').filter(name='New').exists())
+        self.assertEqual(self.category_names(), ['Primary', 'New'])
+        with override_settings(BUDGET_REPLICA_STICKINESS=0):
+            self.assertEqual(self.category_names(), ['Replica'])
+
+    def test_reporting_views_read_from_the_replica(self):
+        MonthlyRollup.objects.using('replica').create(
+            user_id=self.user.id, category=Category.objects.using('replica').get(name='Replica'),
+            year=2025, month=3, total=Decimal('42.00'), count=1
+        )
+        self.settle()
+        response = self.client.get(reverse('financial-summary'), {'start_date': '2025-03-01', 'end_date': '2025-03-31'})
+        self.assertEqual(response.data['total_expenses'], '42.00')
+
+    @override_settings(BUDGET_REPLICA_ALIASES=[])
+    def test_without_replicas_everything_reads_the_primary(self):
+        self.settle()
+        self.assertEqual(self.category_names(), ['Primary'])
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False, BUDGET_RESPONSE_CACHE_TIMEOUT=0,
+    BUDGET_SHARD_ALIASES=['default', 'shard1', 'shard2']
+)
+class ShardingTests(TransactionTestCase):
+    """Two more SQLite files, added like the replica above, act as shards."""
+    databases = '__all__'
+    shards = ('shard1', 'shard2')
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        for alias in cls.shards:
+            connections.settings[alias] = {
+                **connections.settings['default'], 'NAME': os.path.join(cls.directory.name, f'{alias}.sqlite3')
+            }
+        super().setUpClass()
+        # After the class settings apply, so that each shard gets its own range of keys
+        for alias in cls.shards:
+            call_command('migrate', database=alias, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in cls.shards:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        cls.directory.cleanup()
+
+    def setUp(self):
+        get_cache().clear()
+        placements.clear()
+        self.user = self.make_user('sharded', 'shard1')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def make_user(self, username, alias):
+        user = User.objects.create_user(username=username, password='pass')
+        UserShard.objects.filter(user=user).update(alias=alias)
+        placements.clear()
+        return user
+
+    def create_data(self):
+        category = self.client.post(reverse('category-list'), {'name': 'Food', 'type': 'expense'}, format='json')
+        for day, description in ((3, 'Corner bakery'), (9, 'Farmers market')):
+            response = self.client.post(reverse('transaction-list'), {
+                'amount': '12.50', 'category': category.data['id'], 'date': f'2025-03-{day:02d}',
+                'description': description
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+
+    def test_new_users_are_spread_over_the_shards(self):
+        aliases = {shard_for_user(User.objects.create_user(username=f'user{i}').id) for i in range(3)}
+        self.assertEqual(aliases, {'default', 'shard1', 'shard2'})
+
+    def test_requests_use_the_users_shard(self):
+        self.create_data()
+        self.assertEqual(Transaction.objects.using('shard1').filter(user=self.user).count(), 2)
+        self.assertFalse(Transaction.objects.using('default').exists())
+        self.assertEqual(MonthlyRollup.objects.using('shard1').get().count, 2)
+
+        response = self.client.get(reverse('transaction-list'), {'search': 'bakery'})
+        self.assertEqual([row['description'] for row in response.data['results']], ['Corner bakery'])
+        response = self.client.get(reverse('financial-summary'), {'start_date': '2025-03-01', 'end_date': '2025-03-31'})
+        self.assertEqual(response.data['total_expenses'], '25.00')
+
+    def test_signup_creates_the_profile_on_the_users_shard(self):
+        response = APIClient().post(reverse('signup'), {
+            'username': 'newcomer', 'email': 'newcomer@example.com', 'password': 'a-long-password'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(username='newcomer')
+        self.assertTrue(UserProfile.objects.using(shard_for_user(user.id)).filter(user=user).exists())
+
+    def test_move_user(self):
+        self.create_data()
+        keys = sorted(Transaction.objects.using('shard1').values_list('id', 'category_id'))
+        self.assertTrue(all(SHARD_ID_RANGE <= key < 2 * SHARD_ID_RANGE for key, _ in keys))
+        counts = move_user(self.user.id, 'shard2', wait=0)
+        self.assertEqual(counts['transaction'], 2)
+        self.assertEqual(shard_for_user(self.user.id), 'shard2')
+        self.assertFalse(Category.objects.using('shard1').exists())
+        category = Category.objects.using('shard2').get()
+        self.assertEqual(Transaction.objects.using('shard2').filter(category=category).count(), 2)
+        # Rows keep their keys, so links to them still work
+        self.assertEqual(sorted(Transaction.objects.using('shard2').values_list('id', 'category_id')), keys)
+        response = self.client.get(reverse('transaction-detail', args=[keys[0][0]]))
+        self.assertEqual(response.data['description'], 'Corner bakery')
+
+        # The search index of the new shard picked the rows up
+        response = self.client.get(reverse('transaction-list'), {'search': 'market'})
+        self.assertEqual([row['description'] for row in response.data['results']], ['Farmers market'])
+        response = self.client.get(reverse('financial-summary'), {'start_date': '2025-03-01', 'end_date': '2025-03-31'})
+        self.assertEqual(response.data['total_expenses'], '25.00')
+
+    def test_export_reads_the_users_shard(self):
+        self.create_data()
+        response = self.client.get(reverse('transaction-export'))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('Farmers market', lines[1])
+
+    def test_queued_imports_follow_a_moved_user(self):
+        self.create_data()
+        category = Category.objects.using('shard1').get()
+        statement = SimpleUploadedFile('march.csv', b'date,amount,description\n2025-03-20,-9.99,Lunch\n')
+        response = self.client.post(
+            reverse('import-list'), {'file': statement, 'default_category': category.id}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Job.objects.get(kind='import').params, {'import_job': response.data['id']})
+
+        move_user(self.user.id, 'shard2', wait=0)
+        call_command('runworker', processes=1, burst=True, stdout=StringIO())
+        import_job = ImportJob.objects.using('shard2').get(pk=response.data['id'])
+        self.assertEqual((import_job.status, import_job.rows_imported), ('completed', 1))
+        # New rows get keys from the range of the shard they are created on
+        created = Transaction.objects.using('shard2').get(description='Lunch')
+        self.assertEqual(created.category_id, category.id)
+        self.assertGreaterEqual(created.id, 2 * SHARD_ID_RANGE)
+
+    def test_writes_are_refused_while_moving(self):
+        self.create_data()
+        UserShard.objects.filter(user=self.user).update(moving=True)
+        placements.clear()
+        response = self.client.post(reverse('category-list'), {'name': 'Rent', 'type': 'expense'}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.client.get(reverse('category-list')).data['count'], 1)
+
+    def test_deleting_a_user_deletes_their_sharded_data(self):
+        self.create_data()
+        self.user.delete()
+        self.assertFalse(Transaction.objects.using('shard1').exists())
+        self.assertFalse(Category.objects.using('shard1').exists())
+
+    def test_plan_rebalance(self):
+        loads = {'default': {1: 50, 2: 40, 3: 10}, 'shard1': {4: 20}, 'shard2': {}}
+        self.assertEqual(plan_rebalance(loads), [(1, 'default', 'shard2'), (3, 'default', 'shard1')])
+        self.assertEqual(plan_rebalance({'default': {1: 100}, 'shard1': {}}), [])
+
+    def test_reshard_command(self):
+        self.create_data()
+        out = StringIO()
+        call_command('reshard', user='sharded', to='default', wait=0, stdout=out)
+        self.assertIn('2 transaction', out.getvalue())
+        self.assertEqual(Transaction.objects.using('default').count(), 2)
+        with self.assertRaises(CommandError):
+            call_command('reshard', user='sharded', to='elsewhere')
+
+
+class JobQueueTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.food = self.make_category('Food')
+        self.make_transaction(self.food, '40.00', date(2025, 3, 4), 'Groceries')
+        self.make_transaction(self.food, '12.50', date(2025, 4, 9), 'Bakery')
+
+    def submit(self, kind, **params):
+        return self.client.post(reverse('job-list'), {'kind': kind, 'params': params}, format='json')
+
+    def run_jobs(self):
+        return jobs.work(threading.Event(), burst=True)
+
+    def test_summary_job(self):
+        params = {'start_date': '2025-01-01', 'end_date': '2025-12-31', 'trend_months': 12}
+        response = self.submit('summary', **params)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'pending')
+
+        self.assertEqual(self.run_jobs(), 1)
+        job = self.client.get(reverse('job-detail', args=[response.data['id']])).data
+        self.assertEqual((job['status'], job['progress'], job['attempts']), ('completed', 1, 1))
+        self.assertEqual(job['result'], self.client.get(reverse('financial-summary'), params).json())
+
+    def test_export_job_file_can_be_downloaded(self):
+        response = self.submit('export', export_format='csv', start_date='2025-04-01')
+        self.run_jobs()
+        job = self.client.get(reverse('job-detail', args=[response.data['id']])).data
+        self.assertEqual(job['result'], {'rows': 1, 'export_format': 'csv'})
+        download = self.client.get(job['download'])
+        lines = b''.join(download.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Bakery', lines[1])
+
+    def test_rejects_bad_submissions(self):
+        self.assertEqual(self.submit('import').status_code, 400)
+        response = self.submit('forecast', months=99)
+        self.assertEqual(response.data, {'error': 'months must be between 1 and 24'})
+        with override_settings(BUDGET_JOB_USER_QUEUE_LIMIT=1):
+            self.assertEqual(self.submit('forecast').status_code, 202)
+            self.assertEqual(self.submit('forecast').status_code, 429)
+
+    def test_failed_jobs_are_retried_then_fail(self):
+        def flaky(job, progress):
+            raise RuntimeError('boom')
+
+        job = jobs.enqueue(self.user.id, 'flaky')
+        with mock.patch.dict(jobs.KINDS, {'flaky': jobs.JobKind(jobs.no_params, flaky, False)}), \
+                override_settings(BUDGET_JOB_RETRY_DELAY=0):
+            self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), ('failed', 3, 'boom'))
+
+    @override_settings(BUDGET_JOB_USER_CONCURRENCY=1)
+    def test_per_user_concurrency_limit(self):
+        running = jobs.enqueue(self.user.id, 'summary')
+        waiting = jobs.enqueue(self.user.id, 'summary')
+        other = jobs.enqueue(User.objects.create_user(username='bob').id, 'summary')
+        first = jobs.claim('one')
+        self.assertEqual(first, running)
+        # The user's second job waits for the first, another user's doesn't
+        self.assertEqual(jobs.claim('two'), other)
+        self.assertIsNone(jobs.claim('three'))
+
+        jobs.execute(first)
+        self.assertEqual(jobs.claim('three'), waiting)
+
+    def test_expired_leases_are_reclaimed(self):
+        job = jobs.enqueue(self.user.id, 'summary')
+        claimed = jobs.claim('crashed')
+        Job.objects.filter(pk=job.pk).update(lease_expires=timezone.now() - timedelta(seconds=1))
+        reclaimed = jobs.claim('healthy')
+        self.assertEqual((reclaimed.pk, reclaimed.worker, reclaimed.attempts), (job.pk, 'healthy', 2))
+        # The first worker's late result is dropped
+        jobs.execute(claimed)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'running')
+
+    @override_settings(BUDGET_JOB_LEASE=0.3)
+    def test_lease_is_renewed_while_a_job_runs(self):
+        def slow(job, progress):
+            # Never reports progress
+            time.sleep(0.5)
+            return {}
+
+        jobs.enqueue(self.user.id, 'slow')
+        claimed = jobs.claim('worker')
+        with mock.patch.dict(jobs.KINDS, {'slow': jobs.JobKind(jobs.no_params, slow, False)}), \
+                mock.patch.object(jobs, 'update_claimed', return_value=1) as update_claimed:
+            jobs.execute(claimed)
+        renewals = [call for call in update_claimed.call_args_list if set(call.kwargs) == {'lease_expires'}]
+        self.assertGreaterEqual(len(renewals), 2)
+        self.assertEqual(update_claimed.call_args.kwargs['status'], 'completed')
+
+    @override_settings(BUDGET_IMPORT_IN_BACKGROUND=True)
+    def test_imports_run_on_the_queue(self):
+        statement = SimpleUploadedFile('march.csv', b'date,amount,description\n2025-03-01,-9.99,Lunch\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('import-list'), {'file': statement, 'default_category': self.food.id}, format='multipart'
+            )
+        self.assertEqual(ImportJob.objects.get(pk=response.data['id']).status, 'pending')
+        out = StringIO()
+        call_command('runworker', processes=1, burst=True, stdout=out)
+        self.assertIn('Ran 1 job(s)', out.getvalue())
+        self.assertEqual(ImportJob.objects.get(pk=response.data['id']).rows_imported, 1)
+        self.assertEqual(Job.objects.get(kind='import').status, 'completed')
+
+    def test_worker_needs_a_shared_cache_for_cached_responses(self):
+        for overrides in ({'BUDGET_RESPONSE_CACHE_TIMEOUT': 60}, {'BUDGET_CONDITIONAL_GET': True}):
+            with self.subTest(**overrides), override_settings(**overrides):
+                with self.assertRaisesMessage(CommandError, 'REDIS_URL'):
+                    call_command('runworker', processes=1, burst=True, stdout=StringIO())
+
+
+class IntegerCentsTests(BudgetAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.food = self.make_category('Food')
+
+    def test_amounts_are_stored_as_cents(self):
+        instance = self.make_transaction(self.food, '12.34', date(2025, 3, 5))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT amount FROM budget_transaction WHERE id = %s', [instance.id])
+            self.assertEqual(cursor.fetchone()[0], 1234)
+        self.assertEqual(Transaction.objects.get(pk=instance.pk).amount, Decimal('12.34'))
+        self.assertEqual(MonthlyRollup.objects.get(category=self.food).total, Decimal('12.34'))
+
+        response = self.client.get(reverse('transaction-detail', args=[instance.id]))
+        self.assertEqual(response.data['amount'], '12.34')
+        response = self.client.post(reverse('transaction-list'), {
+            'amount': '0.10', 'category': self.food.id, 'date': '2025-03-06'
+        })
+        self.assertEqual(response.data['amount'], '0.10')
+        self.assertEqual(Transaction.objects.get(pk=response.data['id']).amount, Decimal('0.10'))
+
+    def test_filters_and_aggregates_use_cents(self):
+        for amount in ('0.10', '0.15', '0.20'):
+            self.make_transaction(self.food, amount, date(2025, 3, 31))
+        response = self.client.get(reverse('transaction-list'), {'min_amount': '0.15'})
+        self.assertEqual(sorted(row['amount'] for row in response.data['results']), ['0.15', '0.20'])
+
+        response = self.client.get(reverse('get-records'), {'aggregates': 'sum,avg,min,max', 'max_amount': '0.15'})
+        self.assertEqual(response.data['columns'], {
+            'sum': ['0.25'], 'avg': ['0.12'], 'min': ['0.10'], 'max': ['0.15']
+        })
+        # The end of March is a partial month, summed from the transactions
+        response = self.client.get(reverse('financial-summary'), {'start_date': '2025-03-31', 'end_date': '2025-03-31'})
+        self.assertEqual(response.data['total_expenses'], '0.45')
+
+    def test_benchmark_sums_exactly(self):
+        results = bench_money(iterations=1, rows=1000)
+        self.assertEqual(len(results), 4)
+        self.assertIn('aggregate cents (0 of 120 sums off)', [result.name for result in results])
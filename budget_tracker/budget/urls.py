@@ -1,19 +1,34 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'categories', views.CategoryViewSet, basename='category')
 router.register(r'transactions', views.TransactionViewSet, basename='transaction')
 router.register(r'budgets', views.BudgetViewSet, basename='budget')
+router.register(r'imports', views.ImportJobViewSet, basename='import')
+router.register(r'jobs', views.JobViewSet, basename='job')
+
+# Under ASGI the reporting views run their queries concurrently
+if settings.BUDGET_ASYNC_VIEWS:
+    summary_view = async_views.AsyncFinancialSummaryView
+    comparison_view = async_views.AsyncBudgetComparisonView
+    profile_view = async_views.AsyncProfileView
+else:
+    summary_view = views.FinancialSummaryView
+    comparison_view = views.BudgetComparisonView
+    profile_view = views.ProfileView
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('summary/', views.FinancialSummaryView.as_view(), name='financial-summary'),
-    path('budget-comparison/', views.BudgetComparisonView.as_view(), name='budget-comparison'),
+    path('summary/', summary_view.as_view(), name='financial-summary'),
+    path('budget-comparison/', comparison_view.as_view(), name='budget-comparison'),
+    path('cache-stats/', views.CacheStatsView.as_view(), name='cache-stats'),
     path('signup/', views.signup, name='signup'),
     path('login/', views.login_view, name='login'),
-    path('profile/', views.ProfileView.as_view(), name='profile'),
+    path('profile/', profile_view.as_view(), name='profile'),
     path('predict-expenses/', views.predict_expenses, name='predict-expenses'),
     path('get-records/', views.get_records, name='get-records'),
+    path('series/', views.get_series, name='series'),
 ]
\ No newline at end of file
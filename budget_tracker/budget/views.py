@@ -1,23 +1,52 @@
-from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework import mixins, viewsets, permissions, status
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.db.models import Sum
+from django.db import router, transaction
+from django.http import FileResponse, StreamingHttpResponse
 from django.utils import timezone
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
-from .models import Category, Transaction, Budget, UserProfile
+from . import rollups
+from .bulk import MAX_BULK_ITEMS, BulkTransactionWriter
+from .cache import cache_stats, cached_response
+from .conditional import ConditionalGetMixin
+from .exporters import EXPORT_FORMATS, stream_export
+from .filters import filter_transactions
+from .forecasting import expense_forecast, forecast_params
+from .jobs import QueueFull, start_import, submit as submit_job
+from .models import Category, Transaction, Budget, UserProfile, ImportJob, Job
+from .pagination import TransactionKeysetPagination
+from .records import query_records
+from .routers import ReplicaReadMixin
+from .series import build_series, series_params
+from .sharding import shard_for_user
 from .serializers import (
     CategorySerializer, TransactionSerializer, BudgetSerializer,
-    FinancialSummarySerializer, UserSerializer, UserProfileSerializer
+    FinancialSummarySerializer, UserSerializer, UserProfileSerializer,
+    TransactionBulkSerializer, ImportJobSerializer, JobSerializer,
+    TransactionValuesSerializer, BudgetValuesSerializer
 )
+from .summary import budget_comparison, build_financial_summary, comparison_params, summary_params
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class ValuesListMixin:
+    """Serves ``list`` from ``values()`` rows through ``values_serializer_class``."""
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.values_serializer_class
+        queryset = self.filter_queryset(self.get_queryset()).values(*serializer_class.values())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer_class(page).data)
+        return Response(serializer_class(queryset).data)
+
+class CategoryViewSet(ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_actions = ('list', 'retrieve')
     
     def get_queryset(self):
         queryset = Category.objects.filter(user=self.request.user)
@@ -34,47 +63,90 @@ class CategoryViewSet(viewsets.ModelViewSet):
             
         return queryset
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ReplicaReadMixin, ConditionalGetMixin, ValuesListMixin, viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
+    values_serializer_class = TransactionValuesSerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_actions = ('list', 'retrieve')
     
     def get_queryset(self):
-        queryset = Transaction.objects.filter(user=self.request.user)
-        
-        # Filter by date range if provided
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        if start_date:
-            queryset = queryset.filter(date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(date__lte=end_date)
-            
-        # Filter by category if provided
-        category_id = self.request.query_params.get('category')
-        if category_id:
-            queryset = queryset.filter(category_id=category_id)
-            
-        # Filter by amount range if provided
-        min_amount = self.request.query_params.get('min_amount')
-        max_amount = self.request.query_params.get('max_amount')
-        if min_amount:
-            queryset = queryset.filter(amount__gte=min_amount)
-        if max_amount:
-            queryset = queryset.filter(amount__lte=max_amount)
-            
-        # Filter by transaction type if provided
-        transaction_type = self.request.query_params.get('transaction_type')
-        if transaction_type:
-            queryset = queryset.filter(category__type=transaction_type)
-            
-        return queryset.order_by('-date')
+        queryset = Transaction.objects.filter(user=self.request.user).select_related('category')
+        # Search results come best first unless paging by cursor
+        return filter_transactions(
+            queryset, self.request.query_params,
+            rank_search=not TransactionKeysetPagination.is_requested(self.request)
+        )
 
-class BudgetViewSet(viewsets.ModelViewSet):
+    @property
+    def paginator(self):
+        # Keyset pagination is opt-in, page numbers stay the default
+        if not hasattr(self, '_paginator'):
+            if TransactionKeysetPagination.is_requested(self.request):
+                self._paginator = TransactionKeysetPagination()
+            else:
+                self._paginator = self.pagination_class() if self.pagination_class else None
+        return self._paginator
+
+    # Keep the monthly rollups in step with every write
+    def perform_create(self, serializer):
+        with transaction.atomic(using=router.db_for_write(Transaction)):
+            instance = serializer.save()
+            rollups.record_created(instance)
+
+    def perform_update(self, serializer):
+        with transaction.atomic(using=router.db_for_write(Transaction)):
+            previous = Transaction.objects.select_for_update().values_list(
+                'user_id', 'category_id', 'date', 'amount'
+            ).get(pk=serializer.instance.pk)
+            instance = serializer.save()
+            rollups.record_updated(previous, instance)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic(using=router.db_for_write(Transaction)):
+            instance.delete()
+            rollups.record_deleted(instance)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        serializer = TransactionBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        writer = BulkTransactionWriter(request.user, **serializer.validated_data)
+        if len(writer) > MAX_BULK_ITEMS:
+            return Response(
+                {"error": f"A bulk request may contain at most {MAX_BULK_ITEMS} items"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not writer.validate():
+            return Response({'errors': writer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(writer.save())
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # Takes the list filters; `format` is reserved by DRF so the file type is `export_format`
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"export_format must be one of {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # The body is read after the middleware has forgotten the request, so
+        # fix the database (the user's shard or a replica) while it is known
+        queryset = self.get_queryset()
+        response = StreamingHttpResponse(
+            stream_export(queryset.using(queryset.db), export_format),
+            content_type=EXPORT_FORMATS[export_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="transactions.{export_format}"'
+        return response
+
+class BudgetViewSet(ReplicaReadMixin, ConditionalGetMixin, ValuesListMixin, viewsets.ModelViewSet):
     serializer_class = BudgetSerializer
+    values_serializer_class = BudgetValuesSerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_actions = ('list', 'retrieve')
     
     def get_queryset(self):
-        queryset = Budget.objects.filter(user=self.request.user)
+        queryset = Budget.objects.filter(user=self.request.user).select_related('category')
         
         # Filter by category if provided
         category = self.request.query_params.get('category')
@@ -92,156 +164,106 @@ class BudgetViewSet(viewsets.ModelViewSet):
             
         return queryset
 
-class FinancialSummaryView(APIView):
+class ImportJobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
+                       mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    serializer_class = ImportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(user=self.request.user).order_by('-created_at')
+
+    def create(self, request, *args, **kwargs):
+        # The statement is processed in the background, poll the job for progress
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = serializer.save()
+        transaction.on_commit(lambda: start_import(job), using=job._state.db)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+class JobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
+                 mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user).order_by('-created_at', '-id')
+
+    def create(self, request, *args, **kwargs):
+        # Runs on a worker, poll the job for its progress and result
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            job = submit_job(request.user, serializer.validated_data['kind'], serializer.validated_data['params'])
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except QueueFull as e:
+            return Response({"error": str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'completed' or not job.file:
+            return Response({"error": "This job has no file to download"}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.file.name.rsplit('/', 1)[-1])
+
+class FinancialSummaryView(ReplicaReadMixin, ConditionalGetMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
     
+    def parse_params(self, request):
+        """Return the summary parameters, or an error ``Response``."""
+        try:
+            return summary_params(request.query_params, timezone.now().date())
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def conditional_params(self, request):
+        params = self.parse_params(request)
+        return None if isinstance(params, Response) else params
+
     def get(self, request):
-        # Get date range parameters or default to current month
-        today = timezone.now().date()
-        
-        start_date_str = request.query_params.get('start_date')
-        end_date_str = request.query_params.get('end_date')
-
-        if start_date_str and end_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            except ValueError:
-                return Response(
-                    {"error": "Invalid date format. Use YYYY-MM-DD"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        else:
-            start_date = today.replace(day=1)
-            end_date = today
-        
-        # Calculate income
-        income_categories = Category.objects.filter(user=request.user, type='income')
-        total_income = Transaction.objects.filter(
-            user=request.user,
-            category__in=income_categories,
-            date__range=[start_date, end_date]
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Calculate expenses
-        expense_categories = Category.objects.filter(user=request.user, type='expense')
-        total_expenses = Transaction.objects.filter(
-            user=request.user,
-            category__in=expense_categories,
-            date__range=[start_date, end_date]
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Calculate balance
-        balance = total_income - total_expenses
-        
-        # Calculate expenses by category
-        expenses_by_category = []
-        for category in expense_categories:
-            category_expenses = Transaction.objects.filter(
-                user=request.user,
-                category=category,
-                date__range=[start_date, end_date]
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            if category_expenses > 0:
-                expenses_by_category.append({
-                    'category': category.name,
-                    'amount': category_expenses
-                })
-
-        # Calculate monthly trend for the last 6 months
-        monthly_trend = []
-        for i in range(6):
-            month_start = (today - relativedelta(months=i)).replace(day=1)
-            month_end = month_start + relativedelta(months=1) - relativedelta(days=1)
-
-            monthly_income = Transaction.objects.filter(
-                user=request.user,
-                category__in=income_categories,
-                date__range=[month_start, month_end]
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            monthly_expenses = Transaction.objects.filter(
-                user=request.user,
-                category__in=expense_categories,
-                date__range=[month_start, month_end]
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            monthly_trend.append({
-                'month': month_start.strftime('%Y-%m'),
-                'income': monthly_income,
-                'expenses': monthly_expenses
-            })
-        monthly_trend.reverse() # Show in chronological order
-
-        summary = {
-            'total_income': total_income,
-            'total_expenses': total_expenses,
-            'net_balance': balance,
-            'expenses_by_category': expenses_by_category,
-            'monthly_trend': monthly_trend
-        }
-        
-        serializer = FinancialSummarySerializer(summary)
-        return Response(serializer.data)
+        params = self.parse_params(request)
+        if isinstance(params, Response):
+            return params
 
-class BudgetComparisonView(APIView):
+        def compute():
+            summary = build_financial_summary(
+                request.user, params['start_date'], params['end_date'], params['today'], params['trend_months']
+            )
+            return FinancialSummarySerializer(summary).data
+
+        return Response(cached_response('summary', request.user.id, params, compute))
+
+class BudgetComparisonView(ReplicaReadMixin, ConditionalGetMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
     
+    def parse_params(self, request):
+        """Return the first and last month of the comparison, or an error ``Response``."""
+        try:
+            return comparison_params(request.query_params, timezone.now().date())
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def conditional_params(self, request):
+        params = self.parse_params(request)
+        return None if isinstance(params, Response) else params
+
     def get(self, request):
-        # Get month parameter or default to current month
-        month_param = request.query_params.get('month')
-        if month_param:
-            try:
-                month_date = datetime.strptime(month_param, '%Y-%m').date()
-            except ValueError:
-                return Response(
-                    {"error": "Invalid month format. Use YYYY-MM"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        else:
-            today = timezone.now().date()
-            month_date = today.replace(day=1)
-        
-        # Get next month for date range
-        next_month = month_date + relativedelta(months=1)
-        
-        # Get all expense categories
-        expense_categories = Category.objects.filter(user=request.user, type='expense')
-        
-        # Initialize result
-        result = []
-        
-        for category in expense_categories:
-            # Get budget for this category and month
-            print(f"Filtering budget for user: {request.user.id}, category: {category.id}, month: {month_date.strftime('%m')}, year: {month_date.year}")
-            budget = Budget.objects.filter(
-                user=request.user,
-                category=category,
-                month=month_date.strftime('%m'),  # Use two-digit string month to match CharField
-                year=month_date.year
-            ).first()
-            
-            # Get actual expenses for this category and month
-            actual_expenses = Transaction.objects.filter(
-                user=request.user,
-                category=category,
-                date__gte=month_date,
-                date__lt=next_month
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            print(f"Calculated actual expenses for category {category.name}: {actual_expenses}")
-            
-            # Add to result
-            result.append({
-                'category_id': category.id,
-                'category_name': category.name,
-                'budget_amount': budget.amount if budget else 0,
-                'actual_amount': actual_expenses,
-                'difference': (budget.amount if budget else 0) - actual_expenses,
-                'year': month_date.year,
-                'month': int(month_date.strftime('%m'))
-            })
-        
-        return Response(result)
+        params = self.parse_params(request)
+        if isinstance(params, Response):
+            return params
+
+        return Response(cached_response(
+            'budget-comparison', request.user.id, params,
+            lambda: budget_comparison(request.user, params['from'], params['to'])
+        ))
+
+class CacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
 
 class ProfileView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -252,6 +274,9 @@ class ProfileView(APIView):
         return Response(serializer.data)
 
     def put(self, request):
+        return self.update_profile(request)
+
+    def update_profile(self, request):
         user_profile = request.user.userprofile
         serializer = UserProfileSerializer(user_profile, data=request.data, partial=True)
         if serializer.is_valid():
@@ -297,7 +322,7 @@ def signup(request):
             email=email,
             password=password
         )
-        UserProfile.objects.create(user=user)
+        UserProfile.objects.db_manager(shard_for_user(user.id)).create(user=user)
 
         authenticated_user = authenticate(request, username=username, password=password)
 
@@ -324,8 +349,6 @@ def signup(request):
 def login_view(request):
     email = request.data.get('email')
     password = request.data.get('password')
-    print(email, password)
-
 
     if not email or not password:
         return Response({'error': 'Email and password are required'}, status=status.HTTP_400_BAD_REQUEST)
@@ -346,9 +369,26 @@ def login_view(request):
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def predict_expenses(request):
-    return Response({"message": "Predict expenses endpoint (placeholder)"}, status=status.HTTP_200_OK)
+    try:
+        params = forecast_params(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(expense_forecast(request.user, timezone.now().date(), **params))
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_records(request):
-    return Response({"message": "Get records endpoint (placeholder)"}, status=status.HTTP_200_OK)
+    try:
+        records = query_records(Transaction.objects.filter(user=request.user), request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(records)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_series(request):
+    try:
+        params = series_params(request.query_params, timezone.now().date())
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(cached_response('series', request.user.id, params, lambda: build_series(request.user, **params)))
@@ -47,8 +47,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'budget.middleware.MetricsMiddleware',  # Times everything below it
+    'budget.middleware.ShardMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Should be at the top
     'django.middleware.security.SecurityMiddleware',
+    'budget.middleware.CompressionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -125,17 +128,114 @@ WSGI_APPLICATION = 'budget_tracker.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# SQLite set up for several worker processes: WAL lets readers run alongside the
+# writer, and writes take the write lock when their transaction begins, so two
+# transactions never deadlock upgrading from read to write (which fails at once
+# with "database is locked" instead of waiting out busy_timeout).
+# BUDGET_SQLITE_PROFILE=plain keeps SQLite's defaults.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # Durable in WAL mode except on power loss
+    'busy_timeout': 5000,  # Milliseconds to wait for the write lock
+    'cache_size': -32000,  # KiB per connection
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+
+SQLITE_OPTIONS = {}
+if os.environ.get('BUDGET_SQLITE_PROFILE', 'production') == 'production':
+    SQLITE_OPTIONS = {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        'transaction_mode': 'IMMEDIATE',
+    }
+    DATABASES['default']['OPTIONS'] = SQLITE_OPTIONS
+
 # Render PostgreSQL database (live)
 if 'DATABASE_URL' in os.environ:
     DATABASES['default'] = dj_database_url.config(
         default=os.environ.get('DATABASE_URL'),
         conn_max_age=600,
-        ssl_require=True
+        ssl_require=not os.environ['DATABASE_URL'].startswith('sqlite')
+    )
+
+# Read replicas, comma separated. Reporting views and list/retrieve requests read
+# from them unless the user's data changed within BUDGET_REPLICA_STICKINESS seconds.
+# Two SQLite files work locally: copy the database (or `migrate --database replica`).
+BUDGET_REPLICA_ALIASES = []
+for index, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URL', '').split(','))):
+    alias = 'replica' if index == 0 else f'replica{index + 1}'
+    DATABASES[alias] = dj_database_url.parse(
+        url.strip(), conn_max_age=600, ssl_require=not url.strip().startswith('sqlite')
+    )
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    BUDGET_REPLICA_ALIASES.append(alias)
+
+BUDGET_REPLICA_STICKINESS = float(os.environ.get('BUDGET_REPLICA_STICKINESS', 5))
+
+# Extra shards for user data, comma separated; the default database is the first.
+# New users are spread over the shards, existing ones stay where they are until
+# moved with `manage.py reshard`. Each shard is migrated on its own
+# (`migrate --database shard1`); replicas only serve the default shard.
+BUDGET_SHARD_ALIASES = ['default']
+for index, url in enumerate(filter(None, os.environ.get('DATABASE_SHARD_URLS', '').split(','))):
+    alias = f'shard{index + 1}'
+    DATABASES[alias] = dj_database_url.parse(
+        url.strip(), conn_max_age=600, ssl_require=not url.strip().startswith('sqlite')
     )
+    if url.strip().startswith('sqlite'):
+        DATABASES[alias]['OPTIONS'] = dict(SQLITE_OPTIONS)
+    BUDGET_SHARD_ALIASES.append(alias)
+
+# Seconds each process caches where a user's data lives; moves wait this long
+BUDGET_SHARD_CACHE_TIMEOUT = int(os.environ.get('BUDGET_SHARD_CACHE_TIMEOUT', 30))
+
+DATABASE_ROUTERS = ['budget.routers.ShardRouter', 'budget.routers.ReplicaRouter']
+
+
+# Cache
+# Local memory is per process; point REDIS_URL at a shared server when running
+# more than one worker so every process sees the same data versions.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'budget-tracker',
+    }
+}
+
+if 'REDIS_URL' in os.environ:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+# Summary and budget comparison responses, keyed by per-user data version (0 disables),
+# and ETags derived from the same versions. A write only bumps the version in the cache
+# of the process that made it, so both are off unless the cache is shared.
+BUDGET_CACHE_ALIAS = 'default'
+BUDGET_RESPONSE_CACHE_TIMEOUT = int(
+    os.environ.get('BUDGET_RESPONSE_CACHE_TIMEOUT', 3600 if 'REDIS_URL' in os.environ else 0)
+)
+BUDGET_CONDITIONAL_GET = os.environ.get('BUDGET_CONDITIONAL_GET', str('REDIS_URL' in os.environ)).lower() == 'true'
+
+# Token -> user records for CachedTokenAuthentication. Entries live in a per-process
+# LRU and, when shared, in the cache above too; the timeout bounds how long another
+# process can keep accepting a deleted token (0 disables caching).
+BUDGET_TOKEN_CACHE_TIMEOUT = int(os.environ.get('BUDGET_TOKEN_CACHE_TIMEOUT', 60))
+BUDGET_TOKEN_CACHE_MAX_SIZE = int(os.environ.get('BUDGET_TOKEN_CACHE_MAX_SIZE', 10000))
+BUDGET_TOKEN_CACHE_SHARED = 'REDIS_URL' in os.environ
+
+# Request metrics served at /metrics/ to 'Authorization: Bearer <BUDGET_METRICS_TOKEN>'
+# and staff sessions; with no token set only staff (or anyone, when DEBUG is on) can
+# read them. Requests slower than BUDGET_SLOW_REQUEST_MS are logged to
+# budget.slow_requests with their slowest statements (0 disables).
+BUDGET_METRICS_TOKEN = os.environ.get('BUDGET_METRICS_TOKEN', '')
+BUDGET_SLOW_REQUEST_MS = int(os.environ.get('BUDGET_SLOW_REQUEST_MS', 0))
+BUDGET_SLOW_REQUEST_QUERIES = int(os.environ.get('BUDGET_SLOW_REQUEST_QUERIES', 5))
 
 
 # Password validation
@@ -193,7 +293,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'budget.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -203,9 +303,40 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
+        'budget.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'budget.parsers.MessagePackParser',
     ],
 }
 
+# Responses smaller than this many bytes are not compressed
+BUDGET_COMPRESSION_MIN_SIZE = int(os.environ.get('BUDGET_COMPRESSION_MIN_SIZE', 1024))
+
+# Async reporting views; asgi.py turns them on. Their independent queries run
+# concurrently on separate connections unless BUDGET_ASYNC_CONCURRENT_QUERIES is off.
+BUDGET_ASYNC_VIEWS = os.environ.get('BUDGET_ASYNC_VIEWS', 'False').lower() == 'true'
+BUDGET_ASYNC_CONCURRENT_QUERIES = os.environ.get('BUDGET_ASYNC_CONCURRENT_QUERIES', 'True').lower() == 'true'
+
+# Statement imports are queued for the job workers so uploads return immediately
+BUDGET_IMPORT_IN_BACKGROUND = os.environ.get('BUDGET_IMPORT_IN_BACKGROUND', 'True').lower() == 'true'
+
+# Background jobs, run by `manage.py runworker` in BUDGET_JOB_WORKERS processes.
+# A user has at most BUDGET_JOB_USER_CONCURRENCY jobs running and
+# BUDGET_JOB_USER_QUEUE_LIMIT unfinished. Failed jobs are retried after
+# BUDGET_JOB_RETRY_DELAY seconds, doubling each time; a job whose worker hasn't
+# reported in BUDGET_JOB_LEASE seconds goes to another worker. Workers bump data
+# versions in their own cache, so runworker refuses to start with response caching
+# or ETags on unless the cache is shared with the web workers (REDIS_URL).
+BUDGET_JOB_WORKERS = int(os.environ.get('BUDGET_JOB_WORKERS', 2))
+BUDGET_JOB_USER_CONCURRENCY = int(os.environ.get('BUDGET_JOB_USER_CONCURRENCY', 2))
+BUDGET_JOB_USER_QUEUE_LIMIT = int(os.environ.get('BUDGET_JOB_USER_QUEUE_LIMIT', 20))
+BUDGET_JOB_RETRY_DELAY = int(os.environ.get('BUDGET_JOB_RETRY_DELAY', 30))
+BUDGET_JOB_LEASE = int(os.environ.get('BUDGET_JOB_LEASE', 300))
+
 # Add this to see more details
 if DEBUG:
     # These help with debugging
@@ -218,7 +349,7 @@ if not DEBUG:
     SECURE_CONTENT_TYPE_NOSNIFF = True
     SESSION_COOKIE_SECURE = True
     CSRF_COOKIE_SECURE = True
-    SECURE_SSL_REDIRECT = True
+    SECURE_SSL_REDIRECT = os.environ.get('SECURE_SSL_REDIRECT', 'True').lower() == 'true'
     
     # More restrictive CORS in production
     CORS_ALLOW_ALL_ORIGINS = True
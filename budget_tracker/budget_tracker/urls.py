@@ -22,6 +22,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.authtoken.views import obtain_auth_token
 
+from budget.metrics import metrics_view
+
 # Health check view
 def health_check(request):
     return HttpResponse("✅ Budget Tracker API is running!")
@@ -42,6 +44,7 @@ urlpatterns = [
     # Root and health endpoints
     path('', health_check, name='home'),
     path('health/', health_check, name='health'),
+    path('metrics/', metrics_view, name='metrics'),
     path('debug/', debug_info, name='debug'),
     
     # Admin
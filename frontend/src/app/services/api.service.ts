@@ -102,6 +102,41 @@ export class ApiService {
       );
   }
 
+  // Keyset pagination: pass the `cursor` parameter of the previous page's `next` link to continue
+  public getTransactionPage(params?: any, cursor?: string): Observable<any> {
+    let httpParams = new HttpParams().set('pagination', 'cursor');
+    if (params) {
+      for (const key in params) {
+        if (params.hasOwnProperty(key)) {
+          httpParams = httpParams.set(key, params[key]);
+        }
+      }
+    }
+    if (cursor) {
+      httpParams = httpParams.set('cursor', cursor);
+    }
+    return this.http.get(`${this.baseUrl}transactions/`, { headers: this.getHeaders(), params: httpParams })
+      .pipe(
+        catchError(this.handleError.bind(this))
+      );
+  }
+
+  // Downloads every transaction matching `params` as CSV or NDJSON
+  exportTransactions(exportFormat: 'csv' | 'ndjson' = 'csv', params?: any): Observable<Blob> {
+    let httpParams = new HttpParams().set('export_format', exportFormat);
+    if (params) {
+      for (const key in params) {
+        if (params.hasOwnProperty(key)) {
+          httpParams = httpParams.set(key, params[key]);
+        }
+      }
+    }
+    return this.http.get(`${this.baseUrl}transactions/export/`, { headers: this.getHeaders(), params: httpParams, responseType: 'blob' })
+      .pipe(
+        catchError(this.handleError.bind(this))
+      );
+  }
+
   addTransaction(transaction: any): Observable<any> {
     return this.http.post(`${this.baseUrl}transactions/`, transaction, { headers: this.getHeaders() })
       .pipe(
@@ -123,6 +158,14 @@ export class ApiService {
       );
   }
 
+  // Accepts { create: [...], update: [{ id, ... }], delete: [ids] } and returns per-item results
+  bulkTransactions(payload: { create?: any[]; update?: any[]; delete?: number[] }): Observable<any> {
+    return this.http.post(`${this.baseUrl}transactions/bulk/`, payload, { headers: this.getHeaders() })
+      .pipe(
+        catchError(this.handleError.bind(this))
+      );
+  }
+
   updateUserProfile(profile: any): Observable<any> {
     return this.http.put(`${this.baseUrl}profile/`, profile, { headers: this.getHeaders() })
       .pipe(
@@ -160,6 +203,63 @@ public getBudgetComparison(month: string, params?: any): Observable<any> {
       );
   }
 
+  public getBudgetComparisonRange(from: string, to: string): Observable<any> {
+    const httpParams = new HttpParams().set('from', from).set('to', to);
+    return this.http.get(`${this.baseUrl}budget-comparison/`, { headers: this.getHeaders(), params: httpParams })
+      .pipe(
+        catchError(this.handleError.bind(this))
+      );
+  }
+
+  // Aggregates come back column by column: { fields, columns: { [field]: values[] }, rows }
+  public getRecords(params?: any): Observable<any> {
+    let httpParams = new HttpParams();
+    if (params) {
+      for (const key in params) {
+        if (params.hasOwnProperty(key)) {
+          httpParams = httpParams.set(key, params[key]);
+        }
+      }
+    }
+    return this.http.get(`${this.baseUrl}get-records/`, { headers: this.getHeaders(), params: httpParams })
+      .pipe(
+        catchError(this.handleError.bind(this))
+      );
+  }
+
+  // Zero-filled buckets: { granularity, buckets: [start dates], income: [], expenses: [], categories? }
+  public getSeries(params?: any): Observable<any> {
+    let httpParams = new HttpParams();
+    if (params) {
+      for (const key in params) {
+        if (params.hasOwnProperty(key)) {
+          httpParams = httpParams.set(key, params[key]);
+        }
+      }
+    }
+    return this.http.get(`${this.baseUrl}series/`, { headers: this.getHeaders(), params: httpParams })
+      .pipe(
+        catchError(this.handleError.bind(this))
+      );
+  }
+
+  // Background jobs: kind is summary, budget-comparison, series, forecast or export,
+  // params are the query parameters of the matching endpoint. Poll getJob until
+  // status is completed (result, or download for exports) or failed (error).
+  public submitJob(kind: string, params?: any): Observable<any> {
+    return this.http.post(`${this.baseUrl}jobs/`, { kind, params: params || {} }, { headers: this.getHeaders() })
+      .pipe(
+        catchError(this.handleError.bind(this))
+      );
+  }
+
+  public getJob(id: number): Observable<any> {
+    return this.http.get(`${this.baseUrl}jobs/${id}/`, { headers: this.getHeaders() })
+      .pipe(
+        catchError(this.handleError.bind(this))
+      );
+  }
+
   public deleteBudget(id: number): Observable<any> {
     return this.http.delete(`${this.baseUrl}budgets/${id}/`, { headers: this.getHeaders() })
       .pipe(